@@ -2,7 +2,6 @@
 import logging
 import json
 from typing import Dict, List, Any
-from google import genai
 from google.genai import types
 from google.genai import errors
 from bson.objectid import ObjectId
@@ -12,16 +11,23 @@ import re
 try:
     from .principle_evaluator import PrincipleEvaluator
     from .constitution_evolution import ConstitutionEvolution
+    from .llm_gateway import get_llm_gateway
+    from .llm_cache import get_llm_cache
+    from .constitution_versions import get_constitution_versions
 except ImportError:
     from principle_evaluator import PrincipleEvaluator
     from constitution_evolution import ConstitutionEvolution
+    from llm_gateway import get_llm_gateway
+    from llm_cache import get_llm_cache
+    from constitution_versions import get_constitution_versions
 
 logger = logging.getLogger(__name__)
 
 class AIAgent:
     """
     Represents an AI agent that learns and evolves its ethical constitution.
-    This version is corrected to use the genai.Client pattern.
+    LLM calls go through the process-wide gateway, so constructing an agent per
+    learning cycle does not create a new Gemini client.
     """
     def __init__(self, agent_id: str, db, initial_constitution: List[str] = None):
         self.agent_id = agent_id
@@ -40,30 +46,24 @@ class AIAgent:
         elif initial_constitution:
             self.constitution = initial_constitution
             self.version = 1
-            self.save_state()
+            self.save_state(strategy="initial", reasoning="Initial constitution")
             logger.info(f"Created new agent {self.agent_id} with initial constitution.")
         else:
             raise ValueError(f"Agent with ID {agent_id} not found and no initial constitution provided.")
 
     def _initialize_llm_client(self):
-        """Initializes the Gemini API client."""
+        """Returns the shared LLM gateway, or None if no Gemini client is available."""
         try:
-            if not Config.GEMINI_API_KEY:
-                logger.error("GEMINI_API_KEY not found in environment variables.")
-                return None
-            
-            # CORRECTED: Using the Client pattern as in the user's app.py
-            client = genai.Client(api_key=Config.GEMINI_API_KEY)
-            # Return client without testing - we'll test it when actually using it
-            logger.info("Gemini API client initialized successfully for AI Agent.")
-            return client
+            gateway = get_llm_gateway()
+            return gateway if gateway.available else None
         except Exception as e:
             logger.error(f"Failed to initialize Gemini client for Agent: {e}", exc_info=True)
             return None
 
-    def _call_llm(self, prompt: str, is_json_output: bool = False) -> str:
+    def _call_llm(self, prompt: str, is_json_output: bool = False, use_cache: bool = True) -> str:
         """
         Helper function to call the generative AI model using the streaming pattern.
+        Identical prompts are answered from the LLM response cache unless `use_cache` is False.
         """
         if not self.llm_client:
             raise ConnectionError("LLM client not initialized.")
@@ -72,42 +72,54 @@ class AIAgent:
         
         contents = [types.Content(role="user", parts=[types.Part.from_text(text=prompt)])]
         request_config = types.GenerateContentConfig(response_mime_type=mime_type)
+        model_name = Config.GENERATIVE_MODEL_NAME
+        cache = get_llm_cache(self.db) if use_cache else None
+        cache_config = {"response_mime_type": mime_type}
 
         llm_response_parts = []
         try:
-            # CORRECTED: Using the streaming call pattern with timeout
-            stream = self.llm_client.models.generate_content_stream(
-                model=Config.GENERATIVE_MODEL_NAME,
-                contents=contents,
-                config=request_config,
-            )
-            
-            # Add timeout protection for streaming
-            import time
-            start_time = time.time()
-            timeout_seconds = 60  # 60 second timeout
-            
-            for chunk in stream:
-                # Check for timeout
-                if time.time() - start_time > timeout_seconds:
-                    error_msg = "LLM streaming call timed out after 60 seconds"
-                    logger.error(error_msg)
-                    return json.dumps({"error": error_msg}) if is_json_output else error_msg
-                    
-                if chunk.text:
-                    llm_response_parts.append(chunk.text)
-                if hasattr(chunk, 'prompt_feedback') and chunk.prompt_feedback and chunk.prompt_feedback.block_reason:
-                    error_msg = f"Content generation blocked by API. Reason: {chunk.prompt_feedback.block_reason}"
-                    logger.error(error_msg)
-                    return json.dumps({"error": error_msg}) if is_json_output else error_msg
+            cached_response = cache.get(model_name, prompt, cache_config) if cache else None
+            if cached_response is not None:
+                logger.info(f"LLM response cache hit for agent {self.agent_id}")
+                llm_response_parts.append(cached_response)
+            else:
+                # The gateway enforces concurrency and rate limits for the streaming call
+                stream = self.llm_client.stream(
+                    model=model_name,
+                    contents=contents,
+                    config=request_config,
+                )
+                
+                # Add timeout protection for streaming
+                import time
+                start_time = time.time()
+                timeout_seconds = 60  # 60 second timeout
+                
+                for chunk in stream:
+                    # Check for timeout
+                    if time.time() - start_time > timeout_seconds:
+                        error_msg = "LLM streaming call timed out after 60 seconds"
+                        logger.error(error_msg)
+                        return json.dumps({"error": error_msg}) if is_json_output else error_msg
+                        
+                    if chunk.text:
+                        llm_response_parts.append(chunk.text)
+                    if hasattr(chunk, 'prompt_feedback') and chunk.prompt_feedback and chunk.prompt_feedback.block_reason:
+                        error_msg = f"Content generation blocked by API. Reason: {chunk.prompt_feedback.block_reason}"
+                        logger.error(error_msg)
+                        return json.dumps({"error": error_msg}) if is_json_output else error_msg
 
             full_response = "".join(llm_response_parts)
+            # Only responses that pass the checks below are cached
+            store_in_cache = cache is not None and cached_response is None and bool(full_response)
             # Clean the response if it's meant to be JSON
             if is_json_output:
                 json_match = re.search(r'\{.*\}', full_response, re.DOTALL)
                 if json_match:
                     try:
                         match = json.loads(json_match.group(0))
+                        if store_in_cache:
+                            cache.put(model_name, prompt, cache_config, full_response)
                         return json.dumps(match)
                     except json.JSONDecodeError as e:
                         error_msg = f"Invalid JSON in LLM response: {e}"
@@ -117,6 +129,8 @@ class AIAgent:
                     error_msg = "No JSON found in LLM response"
                     logger.error(error_msg)
                     return json.dumps({"error": error_msg})
+            if store_in_cache:
+                cache.put(model_name, prompt, cache_config, full_response)
             return full_response
 
         except Exception as e:
@@ -251,15 +265,15 @@ Return your response as a valid JSON object with keys: "analysis_of_critique", "
                 elif 'RECONSIDER' in evaluation['recommendation']:
                     # For reconsideration, we'll update but log warnings
                     logger.warning(f"Constitution change for agent {self.agent_id} has warnings: {evaluation['warnings']}")
-                    self.constitution = new_constitution
+                    previous_constitution, self.constitution = self.constitution, new_constitution
                     self.version += 1
-                    self.save_state()
+                    self.save_state(previous_constitution, strategy_used, correction_plan["reasoning_for_change"], scenario.get('title'))
                     logger.info(f"Agent {self.agent_id} constitution updated to version {self.version} with warnings.")
                 else:
                     # Approved or neutral - proceed with update
-                    self.constitution = new_constitution
+                    previous_constitution, self.constitution = self.constitution, new_constitution
                     self.version += 1
-                    self.save_state()
+                    self.save_state(previous_constitution, strategy_used, correction_plan["reasoning_for_change"], scenario.get('title'))
                     logger.info(f"Agent {self.agent_id} constitution updated to version {self.version}.")
             else:
                 if new_constitution == self.constitution:
@@ -288,15 +302,16 @@ Return your response as a valid JSON object with keys: "analysis_of_critique", "
             }
             
             # Apply the change
-            self.constitution = new_constitution
+            previous_constitution, self.constitution = self.constitution, new_constitution
             self.version += 1
-            self.save_state()
+            self.save_state(previous_constitution, strategy_used, correction_plan["reasoning_for_change"], scenario.get('title'))
             logger.info(f"Agent {self.agent_id} constitution evolved to version {self.version} using {strategy_used}.")
             
             return correction_plan
 
-    def save_state(self):
-        """Saves the agent's current state to the database."""
+    def save_state(self, previous_constitution: List[str] = None, strategy: str = None,
+                   reasoning: str = None, scenario_title: str = None):
+        """Saves the agent's current state to the database and appends it to the constitution version history."""
         self.agents_collection.update_one(
             {"agent_id": self.agent_id},
             {
@@ -309,4 +324,11 @@ Return your response as a valid JSON object with keys: "analysis_of_critique", "
             },
             upsert=True
         )
-        logger.info(f"Saved state for agent {self.agent_id} version {self.version}.")
\ No newline at end of file
+        logger.info(f"Saved state for agent {self.agent_id} version {self.version}.")
+        try:
+            get_constitution_versions(self.db).record(
+                self.agent_id, self.version, self.constitution, previous_constitution,
+                strategy=strategy, reasoning=reasoning, scenario_title=scenario_title
+            )
+        except Exception as e:
+            logger.error(f"Failed to record constitution version {self.version} for agent {self.agent_id}: {e}")
\ No newline at end of file
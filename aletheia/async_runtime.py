@@ -0,0 +1,106 @@
+# async_runtime.py
+import asyncio
+import concurrent.futures
+import logging
+import threading
+from typing import Any, Coroutine, Optional
+
+from aletheia.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Optional async I/O dependencies - fall back to running the blocking client in a thread
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+    MOTOR_AVAILABLE = True
+except ImportError:
+    MOTOR_AVAILABLE = False
+
+
+class AsyncRuntime:
+    """
+    A single long-lived event loop running on a daemon thread.
+
+    Flask request threads hand coroutines to it with `run()` and block only on
+    the result, so every in-flight query shares one loop, one pooled async HTTP
+    client and one Motor client. `limiter` caps how many pipelines run at once.
+    """
+    def __init__(self, max_concurrency: int = 32):
+        self.max_concurrency = max_concurrency
+        self.loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, name="async-runtime", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        self.limiter = self.run(self._make_semaphore())
+        self._http_client = None
+        self._motor_client = None
+        self._clients_lock = threading.Lock()
+        logger.info(f"Async runtime started (max concurrency: {max_concurrency})")
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self._ready.set)
+        self.loop.run_forever()
+
+    async def _make_semaphore(self):
+        return asyncio.Semaphore(self.max_concurrency)
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Runs `coro` on the shared loop and blocks the calling thread until it finishes.
+
+        On timeout the coroutine is cancelled, so it stops holding loop-side resources.
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    @property
+    def http(self):
+        """Pooled async HTTP client, or None when httpx is not installed."""
+        if not HTTPX_AVAILABLE:
+            return None
+        with self._clients_lock:
+            if self._http_client is None:
+                self._http_client = httpx.AsyncClient(
+                    timeout=30,
+                    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+                )
+            return self._http_client
+
+    def motor_db(self, database_name: str):
+        """Motor database handle sharing the runtime loop, or None when motor is not installed."""
+        if not MOTOR_AVAILABLE or not Config.MONGODB_URI:
+            return None
+        with self._clients_lock:
+            if self._motor_client is None:
+                self._motor_client = AsyncIOMotorClient(Config.MONGODB_URI, io_loop=self.loop)
+            return self._motor_client[database_name]
+
+
+async def to_thread(func, *args, **kwargs):
+    """Runs a blocking call off the event loop."""
+    return await asyncio.to_thread(func, *args, **kwargs)
+
+
+_runtime = None
+_runtime_lock = threading.Lock()
+
+
+def get_async_runtime() -> AsyncRuntime:
+    """Returns the process-wide async runtime, starting it on first use."""
+    global _runtime
+    if _runtime is None:
+        with _runtime_lock:
+            if _runtime is None:
+                _runtime = AsyncRuntime(max_concurrency=Config.QUERY_MAX_CONCURRENCY)
+    return _runtime
@@ -18,6 +18,8 @@ class Config:
     SCENARIOS_COLLECTION = os.getenv('SCENARIOS_COLLECTION', 'ethical_scenarios')
     AGENTS_COLLECTION = os.getenv('AGENTS_COLLECTION', 'ai_agents')
     LEARNING_HISTORY_COLLECTION = os.getenv('LEARNING_HISTORY_COLLECTION', 'learning_history')
+    AGENT_PERFORMANCE_COLLECTION = os.getenv('AGENT_PERFORMANCE_COLLECTION', 'agent_performance')
+    CONSTITUTION_VERSIONS_COLLECTION = os.getenv('CONSTITUTION_VERSIONS_COLLECTION', 'constitution_versions')
 
     # Google AI
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
@@ -26,4 +28,80 @@ class Config:
     
     # LLM Models
     GENERATIVE_MODEL_NAME = "gemini-1.5-flash-latest"
-    EMBEDDING_MODEL_NAME = "bert-base-uncased" # Using local model
\ No newline at end of file
+    EMBEDDING_MODEL_NAME = "bert-base-uncased" # Using local model
+
+    # Embedding cache
+    EMBEDDING_CACHE_BACKEND = os.getenv('EMBEDDING_CACHE_BACKEND', 'file')  # file | mongo | memory
+    EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', '.cache/embedding_cache.sqlite3')
+    EMBEDDING_CACHE_COLLECTION = os.getenv('EMBEDDING_CACHE_COLLECTION', 'embedding_cache')
+    EMBEDDING_CACHE_LRU_SIZE = int(os.getenv('EMBEDDING_CACHE_LRU_SIZE', 2048))
+    EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', 200_000))
+    EMBEDDING_CACHE_TTL_SECONDS = int(os.getenv('EMBEDDING_CACHE_TTL_SECONDS', 30 * 24 * 3600))
+
+    # Retrieval backend
+    RETRIEVAL_BACKEND = os.getenv('RETRIEVAL_BACKEND', 'atlas')  # atlas | local
+    LOCAL_INDEX_DIR = os.getenv('LOCAL_INDEX_DIR', '.cache/vector_index')
+    LOCAL_INDEX_DTYPE = os.getenv('LOCAL_INDEX_DTYPE', 'float32')  # float32 | float16
+    LOCAL_INDEX_HNSW_THRESHOLD = int(os.getenv('LOCAL_INDEX_HNSW_THRESHOLD', 200_000))
+
+    # Semantic wisdom cache
+    WISDOM_CACHE_SIMILARITY_THRESHOLD = float(os.getenv('WISDOM_CACHE_SIMILARITY_THRESHOLD', 0.92))
+    WISDOM_CACHE_TOP_K = int(os.getenv('WISDOM_CACHE_TOP_K', 3))
+
+    # Query pipeline execution
+    QUERY_EXECUTION_MODE = os.getenv('QUERY_EXECUTION_MODE', 'sync')  # sync | async
+    QUERY_MAX_CONCURRENCY = int(os.getenv('QUERY_MAX_CONCURRENCY', 32))
+    QUERY_TIMEOUT_SECONDS = float(os.getenv('QUERY_TIMEOUT_SECONDS', 120))
+
+    # Write-behind persistence for traces and wisdom cache entries
+    WRITE_BEHIND_ENABLED = os.getenv('WRITE_BEHIND_ENABLED', 'true').lower() == 'true'
+    WRITE_BEHIND_MAX_PENDING = int(os.getenv('WRITE_BEHIND_MAX_PENDING', 10_000))
+    WRITE_BEHIND_BATCH_SIZE = int(os.getenv('WRITE_BEHIND_BATCH_SIZE', 100))
+    WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv('WRITE_BEHIND_FLUSH_INTERVAL', 0.5))
+    WRITE_BEHIND_MAX_RETRIES = int(os.getenv('WRITE_BEHIND_MAX_RETRIES', 3))
+    WRITE_BEHIND_DEAD_LETTER_PATH = os.getenv('WRITE_BEHIND_DEAD_LETTER_PATH', '.cache/write_behind_dead_letter.jsonl')
+
+    # Shared outbound HTTP client
+    HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', 20))  # connections kept per host
+    HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 2))
+    HTTP_BACKOFF_BASE = float(os.getenv('HTTP_BACKOFF_BASE', 0.2))
+    HTTP_BREAKER_THRESHOLD = int(os.getenv('HTTP_BREAKER_THRESHOLD', 5))
+    HTTP_BREAKER_COOLDOWN = float(os.getenv('HTTP_BREAKER_COOLDOWN', 30))
+
+    # LLM gateway
+    LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 16))
+    LLM_RATE_LIMITS = os.getenv('LLM_RATE_LIMITS', '')  # e.g. "gemini-1.5-pro-latest=60,gemini-1.5-flash-latest=300"
+    LLM_DEFAULT_RPM = float(os.getenv('LLM_DEFAULT_RPM', 0))  # 0 = unlimited
+    LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', 60))
+
+    # LLM response cache
+    LLM_CACHE_BACKEND = os.getenv('LLM_CACHE_BACKEND', 'file')  # file | mongo | off
+    LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', '.cache/llm_cache.sqlite3')
+    LLM_CACHE_COLLECTION = os.getenv('LLM_CACHE_COLLECTION', 'llm_response_cache')
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', 50_000))
+    LLM_CACHE_TTL_SECONDS = int(os.getenv('LLM_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+
+    # Local embedding runtime (torch | int8 | onnx | onnx-int8)
+    EMBEDDING_RUNTIME = os.getenv('EMBEDDING_RUNTIME', 'torch')
+    EMBEDDING_RUNTIME_CACHE_DIR = os.getenv('EMBEDDING_RUNTIME_CACHE_DIR', '.cache/embedding_runtime')
+    EMBEDDING_RUNTIME_TOLERANCE = float(os.getenv('EMBEDDING_RUNTIME_TOLERANCE', 0.99))
+
+    # In-memory scenario pool per complexity bucket (otherwise one indexed query per pick)
+    SCENARIO_POOL_ENABLED = os.getenv('SCENARIO_POOL_ENABLED', 'false').lower() == 'true'
+    SCENARIO_POOL_TTL_SECONDS = float(os.getenv('SCENARIO_POOL_TTL_SECONDS', 300))
+    SCENARIO_POOL_CHANGE_STREAMS = os.getenv('SCENARIO_POOL_CHANGE_STREAMS', 'true').lower() == 'true'
+
+    # Learning-cycle job scheduler (per-agent ordering, cross-agent parallelism)
+    LEARNING_JOBS_COLLECTION = os.getenv('LEARNING_JOBS_COLLECTION', 'learning_jobs')
+    LEARNING_AGENT_LEASES_COLLECTION = os.getenv('LEARNING_AGENT_LEASES_COLLECTION', 'learning_agent_leases')
+    LEARNING_SCHEDULER_MAX_WORKERS = int(os.getenv('LEARNING_SCHEDULER_MAX_WORKERS', 4))
+    LEARNING_JOB_LEASE_SECONDS = float(os.getenv('LEARNING_JOB_LEASE_SECONDS', 600))  # must outlast one cycle
+    LEARNING_JOB_POLL_SECONDS = float(os.getenv('LEARNING_JOB_POLL_SECONDS', 5))
+
+    # Learning progress events (SSE replay buffer per job)
+    PROGRESS_BUFFER_SIZE = int(os.getenv('PROGRESS_BUFFER_SIZE', 256))
+    PROGRESS_MAX_TOPICS = int(os.getenv('PROGRESS_MAX_TOPICS', 500))
+    PROGRESS_HEARTBEAT_SECONDS = float(os.getenv('PROGRESS_HEARTBEAT_SECONDS', 15))
+
+    # Background wisdom graph rebuilds
+    GRAPH_REBUILD_JOBS_COLLECTION = os.getenv('GRAPH_REBUILD_JOBS_COLLECTION', 'graph_rebuild_jobs')
@@ -0,0 +1,169 @@
+# constitution_versions.py
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import pymongo
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from aletheia.config import Config
+
+logger = logging.getLogger(__name__)
+
+_indexed_collections = set()
+_index_lock = threading.Lock()
+
+
+def constitution_diff(previous: Optional[List[str]], current: List[str]) -> Dict:
+    """Principles added and removed going from `previous` to `current`."""
+    previous = previous or []
+    previous_set, current_set = set(previous), set(current)
+    return {
+        "added": [principle for principle in current if principle not in previous_set],
+        "removed": [principle for principle in previous if principle not in current_set],
+        "unchanged_count": sum(1 for principle in current if principle in previous_set)
+    }
+
+
+class ConstitutionVersionStore:
+    """
+    Append-only record of every constitution an agent has held, one document per
+    (agent_id, version) with the principles, the diff against the previous version,
+    the strategy that produced it, the learning interaction behind it and when. Reads
+    are index range scans on (agent_id, version) or (agent_id, created_at), so they
+    cost O(versions returned).
+
+    Agents created before this collection existed are materialized from the learning
+    history the first time one of their versions is read or recorded.
+    """
+    def __init__(self, collection, agents_collection=None, history_collection=None):
+        self.collection = collection
+        self.agents_collection = agents_collection
+        self.history_collection = history_collection
+        with _index_lock:
+            if collection.full_name not in _indexed_collections:
+                try:
+                    collection.create_index([("agent_id", 1), ("version", 1)], unique=True, background=True)
+                    collection.create_index([("agent_id", 1), ("created_at", -1)], background=True)
+                    _indexed_collections.add(collection.full_name)
+                except Exception as e:
+                    logger.warning(f"Constitution version index creation failed: {e}")
+
+    def _principles_at(self, agent_id: str, version: int) -> Optional[List[str]]:
+        doc = self.collection.find_one({"agent_id": agent_id, "version": version}, {"principles": 1})
+        return doc["principles"] if doc else None
+
+    def build_record(self, agent_id: str, version: int, principles: List[str],
+                     previous_principles: Optional[List[str]] = None, strategy: Optional[str] = None,
+                     reasoning: Optional[str] = None, scenario_title: Optional[str] = None,
+                     interaction_id: Optional[str] = None, created_at: Optional[datetime] = None) -> Dict:
+        return {
+            "agent_id": agent_id,
+            "version": version,
+            "principles": principles,
+            "diff": constitution_diff(previous_principles, principles),
+            "strategy": strategy,
+            "reasoning": reasoning,
+            "scenario_title": scenario_title,
+            "interaction_id": interaction_id,
+            "created_at": created_at or datetime.now(timezone.utc)
+        }
+
+    def record(self, agent_id: str, version: int, principles: List[str],
+               previous_principles: Optional[List[str]] = None, **details) -> bool:
+        """
+        Appends a version. The previous version's principles are looked up when not
+        given, after materializing the agent's earlier versions if they were never
+        recorded. Returns False if the version was already recorded.
+        """
+        if version > 1:
+            self.ensure_materialized(agent_id)
+            if previous_principles is None:
+                previous_principles = self._principles_at(agent_id, version - 1)
+        try:
+            self.collection.insert_one(self.build_record(agent_id, version, principles, previous_principles, **details))
+            return True
+        except DuplicateKeyError:
+            logger.warning(f"Constitution version {version} for agent {agent_id} already recorded")
+            return False
+
+    def get_version(self, agent_id: str, version: int) -> Optional[Dict]:
+        return self.collection.find_one({"agent_id": agent_id, "version": version})
+
+    def get_as_of(self, agent_id: str, timestamp: datetime) -> Optional[Dict]:
+        """The version in force at `timestamp`."""
+        return self.collection.find_one(
+            {"agent_id": agent_id, "created_at": {"$lte": timestamp}},
+            sort=[("created_at", -1)]
+        )
+
+    def get_range(self, agent_id: str, from_version: Optional[int] = None,
+                  to_version: Optional[int] = None, limit: int = 100) -> List[Dict]:
+        """Versions in [from_version, to_version], oldest first."""
+        query = {"agent_id": agent_id}
+        bounds = {}
+        if from_version is not None:
+            bounds["$gte"] = from_version
+        if to_version is not None:
+            bounds["$lte"] = to_version
+        if bounds:
+            query["version"] = bounds
+        return list(self.collection.find(query).sort("version", pymongo.ASCENDING).limit(limit))
+
+    def link_interaction(self, agent_id: str, version: int, interaction_id):
+        """Attaches the learning interaction that produced `version`, once it has been logged."""
+        self.collection.update_one({"agent_id": agent_id, "version": version},
+                                   {"$set": {"interaction_id": str(interaction_id)}})
+
+    def ensure_materialized(self, agent_id: str, agent: Optional[Dict] = None) -> int:
+        """Materializes the agent's versions from the learning history if version 1 was never recorded."""
+        if self.history_collection is None or self.get_version(agent_id, 1) is not None:
+            return 0
+        if agent is None and self.agents_collection is not None:
+            agent = self.agents_collection.find_one({"agent_id": agent_id}, {"initial_constitution": 1,
+                                                                            "constitution": 1, "created_at": 1})
+        if agent is None:
+            return 0
+        return self.materialize_from_history(dict(agent, agent_id=agent_id), self.history_collection)
+
+    def materialize_from_history(self, agent: Dict, history_collection) -> int:
+        """
+        One-time migration for agents created before this collection existed: records the
+        initial constitution and every constitution change found in the learning history.
+        """
+        agent_id = agent["agent_id"]
+        initial = agent.get("initial_constitution", agent.get("constitution", []))
+        created_at = agent.get("created_at") or (agent["_id"].generation_time if "_id" in agent else None)
+        records = [self.build_record(agent_id, 1, initial, strategy="initial",
+                                     reasoning="Initial constitution", created_at=created_at)]
+        previous = initial
+        interactions = history_collection.find(
+            {"agent_id": agent_id, "constitution_after_reflection": {"$ne": None}},
+            {"agent_version_before_reflection": 1, "constitution_after_reflection": 1, "timestamp": 1,
+             "agent_reflection.reasoning_for_change": 1, "agent_reflection.evolution_strategy": 1, "scenario_title": 1}
+        ).sort("timestamp", 1)
+        for interaction in interactions:
+            principles = interaction["constitution_after_reflection"]
+            reflection = interaction.get("agent_reflection", {})
+            records.append(self.build_record(
+                agent_id, interaction.get("agent_version_before_reflection", 1) + 1, principles, previous,
+                strategy=reflection.get("evolution_strategy"),
+                reasoning=reflection.get("reasoning_for_change", ""),
+                scenario_title=interaction.get("scenario_title", ""),
+                interaction_id=str(interaction["_id"]),
+                created_at=interaction.get("timestamp")
+            ))
+            previous = principles
+        try:
+            inserted = len(self.collection.insert_many(records, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            # Versions already recorded (or repeated in the history) keep their first record
+            inserted = e.details.get("nInserted", 0)
+        logger.info(f"Materialized {inserted} constitution versions for agent {agent_id} from learning history")
+        return inserted
+
+
+def get_constitution_versions(db) -> ConstitutionVersionStore:
+    return ConstitutionVersionStore(db[Config.CONSTITUTION_VERSIONS_COLLECTION], db[Config.AGENTS_COLLECTION],
+                                    db[Config.LEARNING_HISTORY_COLLECTION])
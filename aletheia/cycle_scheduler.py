@@ -0,0 +1,306 @@
+# cycle_scheduler.py
+import atexit
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+import pymongo
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from aletheia.config import Config
+from aletheia.progress_bus import ProgressBus, get_progress_bus
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED = "queued", "running", "completed", "failed", "cancelled"
+FINISHED_STATUSES = (COMPLETED, FAILED, CANCELLED)
+
+
+class LearningCycleScheduler:
+    """
+    Runs learning-cycle jobs from a persistent Mongo queue on a bounded worker pool.
+
+    Cycles for one agent run strictly one at a time and in submission order, since
+    each cycle reflects on the constitution version the previous one produced. The
+    order is held across processes by a per-agent lease document. Different agents
+    run in parallel, and work is handed to the pool one cycle at a time, so a long
+    job for one agent doesn't starve the others.
+
+    Progress is written to the job after every cycle. A poller picks up jobs queued
+    by other processes, and jobs left running by a process that died once its
+    lease lapses; those resume at their next cycle.
+
+    Job lifecycle events, and whatever `run_cycle(agent_id, publish)` publishes
+    from inside a cycle, go to `bus` under the job id as topic.
+    """
+    def __init__(self, jobs_collection, leases_collection, run_cycle: Callable[[str, Callable], Optional[Dict]],
+                 max_workers: int = 4, lease_seconds: float = 600, poll_interval: float = 5,
+                 bus: Optional[ProgressBus] = None):
+        self.jobs = jobs_collection
+        self.leases = leases_collection
+        self.run_cycle = run_cycle
+        self.bus = bus or ProgressBus()
+        self.max_workers = max_workers
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="learning-cycle")
+        self._active_agents = set()
+        self._lock = threading.Lock()
+        self._job_changed = threading.Condition()
+        self._stopping = threading.Event()
+        self.stats_counters = {"cycles_run": 0, "cycles_failed": 0, "jobs_finished": 0}
+        threading.Thread(target=self._poll, name="learning-scheduler-poll", daemon=True).start()
+        atexit.register(self.close)
+
+    def ensure_indexes(self):
+        try:
+            self.jobs.create_index([("agent_id", 1), ("status", 1), ("created_at", 1)], background=True)
+            self.jobs.create_index([("status", 1), ("created_at", -1)], background=True)
+        except Exception as e:
+            logger.warning(f"Learning job index creation failed: {e}")
+
+    def submit(self, agent_id: str, cycles: int) -> Dict:
+        """Queues `cycles` learning cycles for `agent_id` and returns the job document."""
+        job = {
+            "_id": ObjectId(),
+            "agent_id": agent_id,
+            "cycles": cycles,
+            "status": QUEUED,
+            "cycles_run": 0,
+            "cycles_completed": 0,
+            "results": [],
+            "error": None,
+            "cancel_requested": False,
+            "worker": None,
+            "created_at": datetime.now(timezone.utc),
+            "started_at": None,
+            "finished_at": None
+        }
+        self.jobs.insert_one(job)
+        self.bus.publish(str(job["_id"]), "job_queued", {"job_id": str(job["_id"]), "agent_id": agent_id, "cycles": cycles})
+        logger.info(f"Queued learning job {job['_id']} for agent {agent_id} ({cycles} cycles)")
+        self._dispatch(agent_id)
+        return job
+
+    def get_job(self, job_id) -> Optional[Dict]:
+        return self.jobs.find_one({"_id": ObjectId(job_id)})
+
+    def active_job(self, agent_id: str) -> Optional[Dict]:
+        """The agent's most recently queued job that hasn't finished, if any."""
+        return self.jobs.find_one({"agent_id": agent_id, "status": {"$in": [QUEUED, RUNNING]}},
+                                  sort=[("created_at", -1)])
+
+    def list_jobs(self, agent_id: Optional[str] = None, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        """Most recent jobs first, without their per-cycle results."""
+        query = {}
+        if agent_id:
+            query["agent_id"] = agent_id
+        if status:
+            query["status"] = status
+        return list(self.jobs.find(query, {"results": 0}).sort("created_at", pymongo.DESCENDING).limit(limit))
+
+    def cancel(self, job_id) -> Optional[Dict]:
+        """Cancels a queued job now; a running job stops after its current cycle."""
+        job_id = ObjectId(job_id)
+        job = self.jobs.find_one_and_update(
+            {"_id": job_id, "status": QUEUED},
+            {"$set": {"status": CANCELLED, "finished_at": datetime.now(timezone.utc)}},
+            return_document=ReturnDocument.AFTER
+        )
+        if job is not None:
+            self.bus.publish(str(job_id), "job_cancelled", {"cycles_run": 0})
+            self.bus.close(str(job_id))
+        else:
+            job = self.jobs.find_one_and_update(
+                {"_id": job_id, "status": RUNNING},
+                {"$set": {"cancel_requested": True}},
+                return_document=ReturnDocument.AFTER
+            )
+        self._notify()
+        return job or self.jobs.find_one({"_id": job_id})
+
+    def wait(self, job_id, timeout: float) -> Optional[Dict]:
+        """Blocks until the job finishes or `timeout` passes, and returns its latest state."""
+        deadline = time.monotonic() + timeout
+        job = self.get_job(job_id)
+        while job is not None and job["status"] not in FINISHED_STATUSES:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            with self._job_changed:
+                # Bounded, so jobs advanced by another process are still seen
+                self._job_changed.wait(min(remaining, self.poll_interval))
+            job = self.get_job(job_id)
+        return job
+
+    def _acquire_lease(self, agent_id: str) -> bool:
+        """Takes or renews the agent's lease. False while another live process holds it."""
+        now = datetime.now(timezone.utc)
+        try:
+            self.leases.update_one(
+                {"_id": agent_id, "$or": [{"owner": self.worker_id}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"owner": self.worker_id, "expires_at": now + timedelta(seconds=self.lease_seconds)}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    def _release_lease(self, agent_id: str):
+        try:
+            self.leases.delete_one({"_id": agent_id, "owner": self.worker_id})
+        except Exception as e:
+            logger.warning(f"Failed to release learning lease for agent {agent_id}: {e}")
+
+    def _dispatch(self, agent_id: str):
+        with self._lock:
+            if agent_id in self._active_agents or self._stopping.is_set():
+                return
+            self._active_agents.add(agent_id)
+        self._executor.submit(self._run_next_cycle, agent_id)
+
+    def _finish_agent(self, agent_id: str):
+        self._release_lease(agent_id)
+        with self._lock:
+            self._active_agents.discard(agent_id)
+        # A job submitted between the last lookup and the discard above would otherwise wait for the poller
+        if self.jobs.find_one({"agent_id": agent_id, "status": QUEUED}, {"_id": 1}):
+            self._dispatch(agent_id)
+
+    def _run_next_cycle(self, agent_id: str):
+        """Runs one cycle of the agent's oldest unfinished job, then requeues the agent behind other agents."""
+        try:
+            if self._stopping.is_set() or not self._acquire_lease(agent_id):
+                with self._lock:
+                    self._active_agents.discard(agent_id)
+                return
+            # Holding the lease, any running job for this agent is ours or was orphaned by a dead process
+            job = self.jobs.find_one({"agent_id": agent_id, "status": {"$in": [QUEUED, RUNNING]}},
+                                     sort=[("created_at", 1)])
+            if job is None:
+                self._finish_agent(agent_id)
+                return
+            if job.get("cancel_requested"):
+                self._finish_job(job, CANCELLED)
+            elif job["cycles_run"] >= job["cycles"]:
+                # Its last cycle ran before the owning process died
+                self._finish_job(job, COMPLETED)
+            else:
+                self._run_job_cycle(job)
+            if self._stopping.is_set():
+                self._finish_agent(agent_id)
+            else:
+                self._executor.submit(self._run_next_cycle, agent_id)
+        except Exception as e:
+            logger.error(f"Learning scheduler error for agent {agent_id}: {e}", exc_info=True)
+            self._finish_agent(agent_id)
+
+    def _run_job_cycle(self, job: Dict):
+        now = datetime.now(timezone.utc)
+        update = {"status": RUNNING, "worker": self.worker_id}
+        if job["status"] == QUEUED:
+            update["started_at"] = now
+        self.jobs.update_one({"_id": job["_id"]}, {"$set": update})
+        topic = str(job["_id"])
+        cycle_number = job["cycles_run"] + 1
+        self.bus.publish(topic, "cycle_started", {"cycle": cycle_number, "cycles": job["cycles"]})
+        try:
+            result = self.run_cycle(job["agent_id"], lambda event_type, payload=None: self.bus.publish(topic, event_type, payload))
+        except Exception as e:
+            logger.error(f"Learning job {job['_id']} failed in cycle {cycle_number}: {e}", exc_info=True)
+            self.stats_counters["cycles_failed"] += 1
+            self._finish_job(job, FAILED, error=str(e), cycles_run=cycle_number)
+            return
+        self.stats_counters["cycles_run"] += 1
+        change = {"$inc": {"cycles_run": 1}}
+        if result is not None:
+            change["$inc"]["cycles_completed"] = 1
+            change["$push"] = {"results": dict(result, cycle=cycle_number)}
+        else:
+            self.bus.publish(topic, "error", {"message": f"No scenarios available for cycle {cycle_number}"})
+        self.jobs.update_one({"_id": job["_id"]}, change)
+        self.bus.publish(topic, "cycle_complete", {"cycle": cycle_number})
+        if cycle_number >= job["cycles"]:
+            self._finish_job(job, COMPLETED)
+        else:
+            self._notify()
+
+    def _finish_job(self, job: Dict, status: str, error: Optional[str] = None, cycles_run: Optional[int] = None):
+        update = {"status": status, "error": error, "finished_at": datetime.now(timezone.utc)}
+        if cycles_run is not None:
+            update["cycles_run"] = cycles_run
+        self.jobs.update_one({"_id": job["_id"]}, {"$set": update})
+        self.stats_counters["jobs_finished"] += 1
+        logger.info(f"Learning job {job['_id']} for agent {job['agent_id']} {status}")
+        topic = str(job["_id"])
+        if status == COMPLETED:
+            self.bus.publish(topic, "all_cycles_complete", {"total_cycles": job["cycles"]})
+        elif status == FAILED:
+            self.bus.publish(topic, "error", {"message": error})
+        else:
+            self.bus.publish(topic, "job_cancelled", {"cycles_run": job["cycles_run"]})
+        self.bus.close(topic)
+        self._notify()
+
+    def _notify(self):
+        with self._job_changed:
+            self._job_changed.notify_all()
+
+    def _poll(self):
+        """Dispatches agents with queued work, including jobs queued or orphaned by other processes."""
+        self.ensure_indexes()
+        while not self._stopping.is_set():
+            try:
+                for agent_id in self.jobs.distinct("agent_id", {"status": {"$in": [QUEUED, RUNNING]}}):
+                    self._dispatch(agent_id)
+            except Exception as e:
+                logger.warning(f"Learning job poll failed: {e}")
+            self._stopping.wait(self.poll_interval)
+
+    def close(self):
+        """Stops taking new cycles; cycles in flight finish, and their jobs resume on the next start."""
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            active = len(self._active_agents)
+        return {
+            "worker_id": self.worker_id,
+            "max_workers": self.max_workers,
+            "active_agents": active,
+            **self.stats_counters
+        }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_learning_scheduler(db, run_cycle: Callable[[str, Callable], Optional[Dict]]) -> LearningCycleScheduler:
+    """Returns the process-wide learning-cycle scheduler, starting its poller on first use."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LearningCycleScheduler(
+                    db[Config.LEARNING_JOBS_COLLECTION],
+                    db[Config.LEARNING_AGENT_LEASES_COLLECTION],
+                    run_cycle,
+                    max_workers=Config.LEARNING_SCHEDULER_MAX_WORKERS,
+                    lease_seconds=Config.LEARNING_JOB_LEASE_SECONDS,
+                    poll_interval=Config.LEARNING_JOB_POLL_SECONDS,
+                    bus=get_progress_bus()
+                )
+    return _scheduler
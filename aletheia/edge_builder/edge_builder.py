@@ -1,26 +1,33 @@
 import logging
-import functools
-import json
 import sys
 import os
-from typing import List
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from pymongo import MongoClient, InsertOne
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from config import Config
+from aletheia.embedding_cache import get_embedding_cache
+from aletheia.llm_gateway import get_llm_gateway
+from aletheia.model_registry import get_model_registry
+from aletheia.edge_builder.relation_classifier import BatchRelationClassifier, RelationVerdictStore, text_hash
+from aletheia.edge_builder.similarity import (HNSWLIB_AVAILABLE, ann_neighbours, ann_pairs, iter_cross_pairs,
+                                              iter_similar_pairs, neighbour_recall, normalized_numpy)
 
 # Optional imports with error handling
 try:
-    from sentence_transformers import SentenceTransformer, util
+    from sentence_transformers import SentenceTransformer
     SENTENCE_TRANSFORMERS_AVAILABLE = True
 except ImportError:
     logging.warning("sentence-transformers not available. Edge building will be limited.")
     SENTENCE_TRANSFORMERS_AVAILABLE = False
 
 try:
-    from google import genai
     from google.genai import types
     GENAI_AVAILABLE = True
 except ImportError:
@@ -40,13 +47,28 @@ log = logging.getLogger("edge_builder")
 logging.basicConfig(level=logging.INFO)
 
 EDGE_COLL = "wisdom_edges"                                  # new collection
+CHUNK_STATE_COLL = "wisdom_graph_chunks"                    # per indexed chunk: text hash and embedding
+GRAPH_STATE_COLL = "wisdom_graph_state"                     # build watermark
+STATE_ID = "edge_builder"
+STATE_BATCH = 10_000                                        # indexed embeddings compared per block
+ID_BATCH = 1_000                                            # ids per $in query / bulk write
 SIM_THR   = 0.85                                            # cosine threshold
-TARGET    = 5_000                                           # edges to write
+SIM_TILE_BYTES = int(float(os.getenv("EDGE_SIM_TILE_MB", 256)) * 2**20)  # memory per similarity tile
+SIM_TOP_K = int(os.getenv("EDGE_SIM_TOP_K", 0)) or None     # cap candidates per chunk (0 = all above SIM_THR)
+CANDIDATE_METHOD = os.getenv("EDGE_CANDIDATES", "auto")     # exact | hnsw | auto
+ANN_MIN_CHUNKS = int(os.getenv("EDGE_ANN_MIN_CHUNKS", 50_000))  # auto switches to hnsw at this corpus size
+ANN_TOP_K = int(os.getenv("EDGE_ANN_TOP_K", 10))            # neighbours per chunk when SIM_TOP_K is unset
+ANN_EF = int(os.getenv("EDGE_ANN_EF", 100))
+ANN_RECALL_SAMPLE = int(os.getenv("EDGE_ANN_RECALL_SAMPLE", 200))  # chunks checked against an exact scan
+SBERT_MODEL = "sentence-transformers/all-mpnet-base-v2"
+SBERT_MODEL_ID = f"{SBERT_MODEL}:normalized"                 # embedding cache namespace
 
 # connections
 client = MongoClient(Config.MONGODB_URI)
 chunks = client[Config.DATABASE_NAME][Config.TEXT_COLLECTION_NAME]
 edges  = client[Config.DATABASE_NAME][EDGE_COLL]
+chunk_state = client[Config.DATABASE_NAME][CHUNK_STATE_COLL]
+graph_state = client[Config.DATABASE_NAME][GRAPH_STATE_COLL]
 
 # Global model variables
 sbert = None
@@ -59,9 +81,8 @@ def initialize_models():
     try:
         if SENTENCE_TRANSFORMERS_AVAILABLE:
             log.info("Initializing SentenceTransformer model for embeddings (all-mpnet-base-v2)...")
-            sbert = SentenceTransformer("sentence-transformers/all-mpnet-base-v2")
-            if TORCH_AVAILABLE:
-                sbert.to(device)
+            sbert = get_model_registry().acquire(SBERT_MODEL, lambda: SentenceTransformer(SBERT_MODEL, device=device),
+                                                 dtype="float32", device=device)
             log.info(f"SentenceTransformer model initialized successfully on device: {device}")
         else:
             log.error("SentenceTransformers not available. Cannot initialize embedding model.")
@@ -72,8 +93,9 @@ def initialize_models():
             log.error("GEMINI_API_KEY not found in environment variables. Gemini client will not be available.")
             gem_client = None
         elif GENAI_AVAILABLE:
-            gem_client = genai.Client(api_key=Config.GEMINI_API_KEY)
-            log.info("Gemini API client initialized successfully.")
+            gateway = get_llm_gateway()
+            gem_client = gateway if gateway.available else None
+            log.info("Using the shared LLM gateway for relation classification.")
         else:
             log.error("google-genai not available. Cannot initialize Gemini client.")
             gem_client = None
@@ -87,112 +109,302 @@ def initialize_models():
         gem_client = None
         return False
 
-REL_TYPES = ("supports", "critiques", "analogous_to")
+CLASSIFY_MODEL = "gemini-1.5-pro-latest"
+CLASSIFY_CONFIG = {"response_mime_type": "application/json"}
+CLASSIFY_BATCH_SIZE = int(os.getenv("EDGE_CLASSIFY_BATCH_SIZE", 20))      # passage pairs per prompt
+CLASSIFY_CONCURRENCY = int(os.getenv("EDGE_CLASSIFY_CONCURRENCY", 4))    # prompts in flight
+VERDICT_COLL = "wisdom_relation_verdicts"                                # verdicts by unordered text-hash pair
 
-@functools.lru_cache(maxsize=10_000)
-def classify(a: str, b: str):
-    """Classify relationship between two text passages using Gemini."""
+def _generate_relations(prompt: str) -> str:
+    contents = [
+        types.Content(
+            role="user",
+            parts=[types.Part.from_text(text=prompt)],
+        ),
+    ]
+    response = gem_client.generate(
+        model=CLASSIFY_MODEL,
+        contents=contents,
+        config=types.GenerateContentConfig(**CLASSIFY_CONFIG),
+    )
+    return response.text
+
+def relation_classifier() -> BatchRelationClassifier:
+    """Batched relation classifier backed by Gemini and the persisted verdict store."""
     if gem_client is None or not GENAI_AVAILABLE:
-        log.warning("Gemini client not available, using default relation")
-        return "analogous_to", 0.5
-        
-    prompt = (
-        "Return JSON {relation:(supports|critiques|analogous_to), confidence:0-1}\n\n"
-        f"PassageA:{a}\n\nPassageB:{b}"
+        log.warning("Gemini client not available, using default relation for unclassified pairs")
+        generate = None
+    else:
+        generate = _generate_relations
+    return BatchRelationClassifier(
+        generate,
+        RelationVerdictStore(client[Config.DATABASE_NAME][VERDICT_COLL]),
+        CLASSIFY_MODEL,
+        batch_size=CLASSIFY_BATCH_SIZE,
+        max_workers=CLASSIFY_CONCURRENCY
     )
+
+def classify(a: str, b: str):
+    """Classify the relationship between two passages. build() classifies in batches instead."""
+    _, relation, conf, _ = next(relation_classifier().classify_stream([(a, b)], lambda pair: pair))
+    return relation, conf
+
+def encode_texts(texts: List[str]):
+    """Encode texts with sbert, reusing embeddings from the shared cache and only encoding misses."""
+    import numpy as np
+    cache = get_embedding_cache(client[Config.DATABASE_NAME])
+    # Corpus-sized batches bypass the in-memory tier so they don't evict hot query embeddings
+    vectors = cache.get_many(texts, SBERT_MODEL_ID, memory_tier=False)
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        log.info(f"Encoding {len(missing)} of {len(texts)} texts not found in the embedding cache")
+        fresh = sbert.encode([texts[i] for i in missing], normalize_embeddings=True)
+        cache.put_many([texts[i] for i in missing], SBERT_MODEL_ID, [v.tolist() for v in fresh], memory_tier=False)
+        for i, v in zip(missing, fresh):
+            vectors[i] = v
+    emb = np.asarray(vectors, dtype=np.float32)
+    if TORCH_AVAILABLE:
+        return torch.from_numpy(emb).to(device)
+    return emb
+
+_ann_fallback_logged = False
+
+def candidate_pairs(emb):
+    """
+    Candidate (i, j, similarity) pairs at or above SIM_THR, and a summary of how they
+    were found: exact tiled all-pairs, or HNSW top-k neighbours (near-linear in corpus
+    size) with recall measured against an exact scan of a sample of chunks.
+    """
+    global _ann_fallback_logged
+    method = CANDIDATE_METHOD
+    if method == "auto":
+        method = "hnsw" if HNSWLIB_AVAILABLE and len(emb) >= ANN_MIN_CHUNKS else "exact"
+        if not HNSWLIB_AVAILABLE and len(emb) >= ANN_MIN_CHUNKS and not _ann_fallback_logged:
+            log.warning(f"{len(emb)} chunks is above EDGE_ANN_MIN_CHUNKS={ANN_MIN_CHUNKS} but hnswlib is not "
+                        "installed; using exact all-pairs similarity")
+            _ann_fallback_logged = True
+    if method == "hnsw" and not HNSWLIB_AVAILABLE:
+        log.warning("EDGE_CANDIDATES=hnsw but hnswlib is not installed; using exact all-pairs similarity")
+        method = "exact"
+    if method != "hnsw":
+        return (iter_similar_pairs(emb, SIM_THR, memory_budget_bytes=SIM_TILE_BYTES, top_k=SIM_TOP_K),
+                {"method": "exact", "top_k": SIM_TOP_K})
+
+    top_k = SIM_TOP_K or ANN_TOP_K
+    labels, sims = ann_neighbours(emb, top_k, ef=ANN_EF)
+    recall = neighbour_recall(emb, labels, sims, SIM_THR, top_k,
+                              sample_size=ANN_RECALL_SAMPLE, memory_budget_bytes=SIM_TILE_BYTES)
+    log.info(f"HNSW candidates (top_k={top_k}, ef={ANN_EF}): recall {recall['recall']} "
+             f"over {recall['exact_neighbours']} exact neighbours of {recall['sample_rows']} sampled chunks")
+    return ann_pairs(labels, sims, SIM_THR), {"method": "hnsw", "top_k": top_k, "ef": ANN_EF, **recall}
+
+def ensure_edge_indexes():
+    """Unique (src_chunk, dst_chunk, relation) key, after removing duplicates left by insert-only builds."""
+    key = [("src_chunk", 1), ("dst_chunk", 1), ("relation", 1)]
     try:
-        contents = [
-            types.Content(
-                role="user",
-                parts=[types.Part.from_text(text=prompt)],
-            ),
-        ]
-        
-        config = types.GenerateContentConfig(
-            response_mime_type="application/json"
-        )
-        
-        response = gem_client.models.generate_content(
-            model="gemini-1.5-pro-latest",
-            contents=contents,
-            config=config,
-        )
-        
-        resp_text = response.text
-        data = json.loads(resp_text)
-        relation = data.get("relation", "analogous_to").lower()
-        conf = float(data.get("confidence", 0.5))
-        
-    except Exception as e:
-        log.warning(f"Classification failed: {e}")
-        relation, conf = "analogous_to", 0.5
-    
-    return relation if relation in REL_TYPES else "analogous_to", conf
+        edges.create_index(key, unique=True)
+    except (DuplicateKeyError, OperationFailure):
+        groups = edges.aggregate([
+            {"$group": {"_id": {"src": "$src_chunk", "dst": "$dst_chunk", "rel": "$relation"},
+                        "ids": {"$push": "$_id"}, "n": {"$sum": 1}}},
+            {"$match": {"n": {"$gt": 1}}}
+        ], allowDiskUse=True)
+        duplicates = [edge_id for group in groups for edge_id in group["ids"][1:]]
+        for start in range(0, len(duplicates), ID_BATCH):
+            edges.delete_many({"_id": {"$in": duplicates[start:start + ID_BATCH]}})
+        log.info(f"Removed {len(duplicates)} duplicate edges")
+        edges.create_index(key, unique=True)
+    edges.create_index("dst_chunk")  # src_chunk lookups use the unique index prefix
+
+def chunk_hash(doc) -> str:
+    return doc.get("text_hash") or text_hash(doc.get("text", ""))
+
+def store_chunk_hashes(hashes: Dict) -> int:
+    """
+    Persists text_hash (by chunk id) on chunks that don't store one, so later change scans
+    read hashes only. Writers that edit a chunk's text must update (or unset) its text_hash.
+    """
+    operations = [UpdateOne({"_id": chunk_id, "text_hash": {"$exists": False}}, {"$set": {"text_hash": digest}})
+                  for chunk_id, digest in hashes.items()]
+    for start in range(0, len(operations), ID_BATCH):
+        chunks.bulk_write(operations[start:start + ID_BATCH], ordered=False)
+    return len(operations)
 
-def build():
-    """Build semantic edges between text chunks using similarity and AI classification."""
+def find_changed_chunks(watermark) -> Tuple[List, List]:
+    """
+    Chunks at or below the watermark whose text hash differs from the indexed one (or that
+    were never indexed), and indexed chunks that no longer exist. Reads only hashes, plus
+    the text of chunks that don't store a text_hash yet; those get one stored on the way.
+    """
+    indexed = {doc["_id"]: doc.get("text_hash") for doc in chunk_state.find({}, {"text_hash": 1})}
+    seen, changed = set(), []
+    for doc in chunks.find({"_id": {"$lte": watermark}, "text_hash": {"$exists": True}}, {"text_hash": 1}):
+        seen.add(doc["_id"])
+        if indexed.get(doc["_id"]) != doc["text_hash"]:
+            changed.append(doc["_id"])
+    unhashed = {}
+    for doc in chunks.find({"_id": {"$lte": watermark}, "text_hash": {"$exists": False}}, {"text": 1}):
+        seen.add(doc["_id"])
+        unhashed[doc["_id"]] = chunk_hash(doc)
+        if indexed.get(doc["_id"]) != unhashed[doc["_id"]]:
+            changed.append(doc["_id"])
+        if len(unhashed) >= ID_BATCH:
+            store_chunk_hashes(unhashed)
+            unhashed = {}
+    store_chunk_hashes(unhashed)
+    removed = [chunk_id for chunk_id in indexed if chunk_id not in seen]
+    return changed, removed
+
+def drop_chunk_edges(chunk_ids: List) -> int:
+    deleted = 0
+    for start in range(0, len(chunk_ids), ID_BATCH):
+        batch = chunk_ids[start:start + ID_BATCH]
+        deleted += edges.delete_many({"$or": [{"src_chunk": {"$in": batch}}, {"dst_chunk": {"$in": batch}}]}).deleted_count
+    return deleted
+
+def drop_orphan_edges() -> int:
+    """Drops edges whose src_chunk or dst_chunk no longer exists. Used by full rebuilds, which forget the index."""
+    referenced = set()
+    for field in ("src_chunk", "dst_chunk"):
+        for group in edges.aggregate([{"$group": {"_id": f"${field}"}}], allowDiskUse=True):
+            referenced.add(group["_id"])
+    referenced, missing = list(referenced), []
+    for start in range(0, len(referenced), ID_BATCH):
+        batch = referenced[start:start + ID_BATCH]
+        present = {doc["_id"] for doc in chunks.find({"_id": {"$in": batch}}, {"_id": 1})}
+        missing.extend(chunk_id for chunk_id in batch if chunk_id not in present)
+    return drop_chunk_edges(missing)
+
+def iter_indexed_embeddings(exclude: set) -> Iterator[Tuple[List, np.ndarray]]:
+    """Persisted embeddings of indexed chunks, STATE_BATCH at a time, skipping `exclude`."""
+    ids, vectors = [], []
+    for doc in chunk_state.find({}, {"embedding": 1}).batch_size(STATE_BATCH):
+        if doc["_id"] in exclude:
+            continue
+        ids.append(doc["_id"])
+        vectors.append(np.frombuffer(doc["embedding"], dtype=np.float32))
+        if len(ids) >= STATE_BATCH:
+            yield ids, np.stack(vectors)
+            ids, vectors = [], []
+    if ids:
+        yield ids, np.stack(vectors)
+
+def build(full: bool = False, detect_changes: bool = True, progress: Optional[Callable] = None):
+    """
+    Incrementally maintain semantic edges between text chunks.
+
+    Only chunks added since the watermark, or (with `detect_changes`) whose text changed,
+    are embedded; they are compared with each other and with the persisted embeddings of
+    every other indexed chunk, and the candidates are classified and upserted on
+    (src_chunk, dst_chunk, relation). Edges of changed and removed chunks are dropped
+    first. `full` forgets the index, drops edges of chunks that no longer exist, and starts
+    over. `progress(stage, **counts)` is called as the build advances. Returns a summary
+    of the run.
+    """
     if sbert is None or not SENTENCE_TRANSFORMERS_AVAILABLE:
         log.error("SentenceTransformer model not initialized. Cannot build edges.")
         return
-    
+    report = progress or (lambda stage, **counts: None)
+
     log.info("Starting edge building process...")
-    docs = list(chunks.find({}, {"_id":1, "text":1}))
-    log.info(f"Found {len(docs)} documents to process")
-    
-    texts = [d["text"] for d in docs]
-    
-    if TORCH_AVAILABLE:
-        emb = sbert.encode(texts, convert_to_tensor=True, normalize_embeddings=True)
-    else:
-        emb = sbert.encode(texts, normalize_embeddings=True)
-        
-    log.info("Generated embeddings for all documents")
+    report("preparing")
+    ensure_edge_indexes()
+    orphaned = 0
+    if full:
+        chunk_state.delete_many({})
+        graph_state.delete_one({"_id": STATE_ID})
+        # Without the index, removed chunks can't be detected later: drop their edges now
+        orphaned = drop_orphan_edges()
+    state = graph_state.find_one({"_id": STATE_ID}) or {}
+    watermark = state.get("last_chunk_id")
 
-    count, bulk = 0, []
-    for i in range(len(docs)):
-        if i % 100 == 0:
-            log.info(f"Processing document {i}/{len(docs)}")
-        
-        if TORCH_AVAILABLE and hasattr(util, 'pytorch_cos_sim'):
-            sims = util.pytorch_cos_sim(emb[i], emb[i+1:])[0]
-        else:
-            # Fallback to numpy-based similarity if torch not available
-            import numpy as np
-            emb_i = emb[i] if hasattr(emb[i], 'numpy') else emb[i]
-            emb_rest = emb[i+1:] if hasattr(emb[i+1:], 'numpy') else emb[i+1:]
-            if hasattr(emb_i, 'numpy'):
-                emb_i = emb_i.numpy()
-            if hasattr(emb_rest, 'numpy'):
-                emb_rest = emb_rest.numpy()
-            sims = np.dot(emb_i, emb_rest.T)
-            
-        for off, s in enumerate(sims):
-            if float(s) < SIM_THR: continue
-            j = i + 1 + off
-            rel, conf = classify(texts[i], texts[j])
+    report("scanning", watermark=str(watermark) if watermark else None)
+    docs = list(chunks.find({"_id": {"$gt": watermark}} if watermark else {}, {"text": 1, "text_hash": 1}))
+    new_chunks = len(docs)
+    changed, removed = find_changed_chunks(watermark) if watermark and detect_changes else ([], [])
+    for start in range(0, len(changed), ID_BATCH):
+        docs.extend(chunks.find({"_id": {"$in": changed[start:start + ID_BATCH]}}, {"text": 1, "text_hash": 1}))
+    dropped = drop_chunk_edges(changed + removed) + orphaned
+    if removed:
+        chunk_state.delete_many({"_id": {"$in": removed}})
+    log.info(f"{new_chunks} new, {len(changed)} changed and {len(removed)} removed chunks; dropped {dropped} stale edges")
+    summary = {"new_chunks": new_chunks, "changed_chunks": len(changed), "removed_chunks": len(removed),
+               "dropped_edges": dropped, "edges": 0}
+
+    if docs:
+        report("embedding", chunks=len(docs))
+        texts = [d["text"] for d in docs]
+        emb = encode_texts(texts)
+        delta = normalized_numpy(emb)
+        delta_ids = {d["_id"] for d in docs}
+
+        def candidates():
+            """((id, text), (id, text), similarity): pairs within the delta, then against indexed chunks."""
+            pairs, candidate_stats = candidate_pairs(emb)
+            summary["candidate_generation"] = candidate_stats
+            for i, j, s in pairs:
+                yield (docs[i]["_id"], texts[i]), (docs[j]["_id"], texts[j]), s
+            for ids, block in iter_indexed_embeddings(delta_ids):
+                hits = list(iter_cross_pairs(delta, block, SIM_THR, memory_budget_bytes=SIM_TILE_BYTES, normalize=False))
+                if not hits:
+                    continue
+                wanted = list({ids[j] for _, j, _ in hits})
+                other_texts = {doc["_id"]: doc["text"] for doc in chunks.find({"_id": {"$in": wanted}}, {"text": 1})}
+                for i, j, s in hits:
+                    if ids[j] in other_texts:
+                        yield (docs[i]["_id"], texts[i]), (ids[j], other_texts[ids[j]]), s
+
+        report("classifying", chunks=len(docs))
+        classifier = relation_classifier()
+        scored = classifier.classify_stream(candidates(), lambda pair: (pair[0][1], pair[1][1]))
+        now = datetime.now(timezone.utc)
+        count, classified, bulk = 0, 0, []
+        for (a, b, s), rel, conf, flipped in scored:
+            classified += 1
+            if classified % 1_000 == 0:
+                log.info(f"Classified {classified} candidate pairs")
+                report("classifying", chunks=len(docs), candidates=classified, edges=count)
             if conf < 0.75: continue
-            bulk.append(InsertOne({
-                "src_chunk": docs[i]["_id"],
-                "dst_chunk": docs[j]["_id"],
-                "relation": rel,
-                "sim_score": float(s),
-                "confidence": conf
-            }))
+            # The verdict reads from passage A to passage B
+            if flipped:
+                a, b = b, a
+            bulk.append(UpdateOne(
+                {"src_chunk": a[0], "dst_chunk": b[0], "relation": rel},
+                {"$set": {"sim_score": s, "confidence": conf, "updated_at": now}},
+                upsert=True
+            ))
             count += 1
             if len(bulk) >= 1_000:
                 edges.bulk_write(bulk, ordered=False)
                 bulk = []
                 log.info(f"Wrote batch of edges. Total so far: {count}")
-            if count >= TARGET: break
-        if count >= TARGET: break
-    
-    if bulk:
-        edges.bulk_write(bulk, ordered=False)
-    
-    log.info(f"Edge building complete. Stored {count} edges.")
+        if bulk:
+            edges.bulk_write(bulk, ordered=False)
+
+        report("indexing", chunks=len(docs))
+        operations = [
+            UpdateOne({"_id": doc["_id"]},
+                      {"$set": {"text_hash": chunk_hash(doc), "embedding": vector.astype(np.float32).tobytes(),
+                                "indexed_at": now}},
+                      upsert=True)
+            for doc, vector in zip(docs, delta)
+        ]
+        for start in range(0, len(operations), ID_BATCH):
+            chunk_state.bulk_write(operations[start:start + ID_BATCH], ordered=False)
+        store_chunk_hashes({doc["_id"]: chunk_hash(doc) for doc in docs if not doc.get("text_hash")})
+        summary.update(edges=count, candidates_classified=classified, classification=dict(classifier.stats))
+
+    # Advanced last, so an interrupted build redoes its delta (with verdicts already stored)
+    last_chunk_id = max([d["_id"] for d in docs[:new_chunks]] + ([watermark] if watermark else []), default=None)
+    graph_state.update_one({"_id": STATE_ID},
+                           {"$set": {"last_chunk_id": last_chunk_id, "updated_at": datetime.now(timezone.utc),
+                                     "indexed_chunks": chunk_state.estimated_document_count()}},
+                           upsert=True)
+    log.info(f"Edge building complete. Upserted {summary['edges']} edges. Summary: {summary}")
+    return summary
 
 if __name__ == "__main__":
     if initialize_models():
-        build()
+        build(full="--full" in sys.argv)
     else:
         log.error("Failed to initialize models. Exiting.")
\ No newline at end of file
@@ -0,0 +1,72 @@
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from bson.objectid import ObjectId
+
+from aletheia.cycle_scheduler import COMPLETED, FAILED, QUEUED, RUNNING
+
+log = logging.getLogger("edge_builder")
+
+
+class GraphRebuildJobs:
+    """
+    Runs edge_builder.build() on a background thread, one rebuild at a time per
+    process, recording its stage, progress counts and final summary on a job
+    document that callers poll.
+    """
+    def __init__(self, collection):
+        self.collection = collection
+        self._lock = threading.Lock()
+        self._running: Optional[ObjectId] = None
+
+    def start(self, full: bool = False, detect_changes: bool = True) -> Tuple[Dict, bool]:
+        """Starts a rebuild, or returns the one already running. The flag says whether a new job was started."""
+        with self._lock:
+            if self._running is not None:
+                job = self.get(self._running)
+                if job is not None:
+                    return job, False
+            job = {
+                "_id": ObjectId(),
+                "status": QUEUED,
+                "full": full,
+                "detect_changes": detect_changes,
+                "stage": None,
+                "progress": {},
+                "summary": None,
+                "error": None,
+                "created_at": datetime.now(timezone.utc),
+                "finished_at": None
+            }
+            self.collection.insert_one(job)
+            self._running = job["_id"]
+        threading.Thread(target=self._run, args=(job["_id"], full, detect_changes),
+                         name="graph-rebuild", daemon=True).start()
+        return job, True
+
+    def get(self, job_id) -> Optional[Dict]:
+        return self.collection.find_one({"_id": ObjectId(job_id)})
+
+    def _progress(self, job_id: ObjectId, stage: str, **counts):
+        self.collection.update_one({"_id": job_id}, {"$set": {"stage": stage, "progress": counts}})
+
+    def _run(self, job_id: ObjectId, full: bool, detect_changes: bool):
+        self.collection.update_one({"_id": job_id},
+                                   {"$set": {"status": RUNNING, "started_at": datetime.now(timezone.utc)}})
+        try:
+            # Imported here: the builder loads sbert and opens its own Mongo client
+            from aletheia.edge_builder import edge_builder
+            if edge_builder.sbert is None and not edge_builder.initialize_models():
+                raise RuntimeError("Edge builder models could not be initialized")
+            summary = edge_builder.build(full=full, detect_changes=detect_changes,
+                                         progress=lambda stage, **counts: self._progress(job_id, stage, **counts))
+            update = {"status": COMPLETED, "stage": "done", "summary": summary}
+        except Exception as e:
+            log.error(f"Graph rebuild {job_id} failed: {e}", exc_info=True)
+            update = {"status": FAILED, "error": str(e)}
+        update["finished_at"] = datetime.now(timezone.utc)
+        self.collection.update_one({"_id": job_id}, {"$set": update})
+        with self._lock:
+            self._running = None
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+log = logging.getLogger("edge_builder")
+
+REL_TYPES = ("supports", "critiques", "analogous_to")
+DEFAULT_VERDICT = ("analogous_to", 0.5)
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def pair_key(hash_a: str, hash_b: str) -> str:
+    """Key of the unordered pair: the same for (a, b) and (b, a)."""
+    return ":".join(sorted((hash_a, hash_b)))
+
+
+class RelationVerdictStore:
+    """
+    Relation verdicts persisted by unordered pair of text hashes. Pairs are always
+    classified in canonical order (lower hash as passage A), so a stored
+    "supports"/"critiques" reads in that direction.
+    """
+    def __init__(self, collection):
+        self.collection = collection
+
+    def get_many(self, keys: List[str]) -> Dict[str, Tuple[str, float]]:
+        if not keys:
+            return {}
+        found = self.collection.find({"_id": {"$in": keys}}, {"relation": 1, "confidence": 1})
+        return {doc["_id"]: (doc["relation"], doc["confidence"]) for doc in found}
+
+    def put_many(self, verdicts: Dict[str, Tuple[str, float]], model: str):
+        if not verdicts:
+            return
+        now = datetime.now(timezone.utc)
+        self.collection.bulk_write([
+            UpdateOne({"_id": key},
+                      {"$setOnInsert": {"relation": relation, "confidence": confidence,
+                                        "model": model, "created_at": now}},
+                      upsert=True)
+            for key, (relation, confidence) in verdicts.items()
+        ], ordered=False)
+
+    def count(self) -> int:
+        return self.collection.estimated_document_count()
+
+
+class BatchRelationClassifier:
+    """
+    Classifies passage pairs many to a prompt, with several prompts in flight at
+    once. `generate(prompt) -> str` makes the model call; concurrency is capped
+    here and request rates by the LLM gateway behind it. Verdicts already in the
+    store are never asked again, and new ones are stored as their batch returns.
+    A batch whose response is malformed or incomplete is split in half and retried,
+    down to single pairs; pairs that still fail get the default verdict, unstored.
+    A failed call (quota, rate limit, network) is retried whole with backoff and
+    then raised, since splitting would only multiply the requests.
+    """
+    def __init__(self, generate: Optional[Callable[[str], str]], store: Optional[RelationVerdictStore],
+                 model: str, batch_size: int = 20, max_workers: int = 4, max_chars: int = 1500,
+                 max_retries: int = 2, retry_backoff: float = 1.0):
+        self.generate = generate
+        self.store = store
+        self.model = model
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.max_chars = max_chars
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.stats = {"pairs": 0, "stored_hits": 0, "classified": 0, "requests": 0, "retries": 0, "failed": 0}
+
+    def _prompt(self, pairs: List[Tuple[str, str]]) -> str:
+        blocks = [
+            f"PAIR {number}\nPassageA: {a[:self.max_chars]}\nPassageB: {b[:self.max_chars]}"
+            for number, (a, b) in enumerate(pairs, 1)
+        ]
+        return (
+            "For each numbered pair, classify how PassageA relates to PassageB.\n"
+            'Return JSON {"results": [{"pair": <number>, "relation": "supports"|"critiques"|"analogous_to", '
+            '"confidence": 0-1}]} with one entry per pair.\n\n' + "\n\n".join(blocks)
+        )
+
+    def _parse(self, response_text: str, count: int) -> Dict[int, Tuple[str, float]]:
+        data = json.loads(response_text)
+        results = data.get("results", data) if isinstance(data, dict) else data
+        verdicts = {}
+        for entry in results:
+            number = int(entry.get("pair", 0))
+            if 1 <= number <= count:
+                relation = str(entry.get("relation", "analogous_to")).lower()
+                confidence = float(entry.get("confidence", 0.5))
+                verdicts[number - 1] = (relation if relation in REL_TYPES else "analogous_to", confidence)
+        return verdicts
+
+    def _request(self, prompt: str) -> str:
+        """One model call, retried with jittered backoff; the last failure is raised."""
+        for attempt in range(self.max_retries + 1):
+            self.stats["requests"] += 1
+            try:
+                return self.generate(prompt)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                self.stats["retries"] += 1
+                delay = self.retry_backoff * 2 ** attempt * (0.5 + random.random())
+                log.warning(f"Relation request failed (attempt {attempt + 1}), retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+
+    def _classify_batch(self, batch: List[Tuple[str, str, str]]) -> Dict[str, Tuple[str, float]]:
+        """Verdicts for (key, text_a, text_b) items, splitting the batch when the response is unusable."""
+        response_text = self._request(self._prompt([(a, b) for _, a, b in batch]))
+        try:
+            parsed = self._parse(response_text, len(batch))
+        except (ValueError, TypeError, AttributeError) as e:
+            log.warning(f"Relation batch of {len(batch)} returned an unparseable response: {e}")
+            parsed = {}
+        verdicts = {batch[index][0]: verdict for index, verdict in parsed.items()}
+        missing = [item for item in batch if item[0] not in verdicts]
+        if missing and len(batch) > 1:
+            half = (len(missing) + 1) // 2
+            for part in (missing[:half], missing[half:]):
+                if part:
+                    verdicts.update(self._classify_batch(part))
+        elif missing:
+            self.stats["failed"] += 1
+            return verdicts
+        if self.store is not None and parsed:
+            self.store.put_many({batch[index][0]: verdict for index, verdict in parsed.items()}, self.model)
+        return verdicts
+
+    def classify_stream(self, items: Iterable, texts_of: Callable) -> Iterator[Tuple[object, str, float, bool]]:
+        """
+        Yields (item, relation, confidence, flipped) for each item, where `texts_of(item)`
+        gives its two passages. `flipped` is True when the verdict reads from the second
+        passage to the first. Items are pulled a window at a time, so a consumer that
+        stops early leaves the rest of the stream unclassified.
+        """
+        window_size = self.batch_size * self.max_workers
+        items = iter(items)
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="edge-classify") as pool:
+            while True:
+                window = list(islice(items, window_size))
+                if not window:
+                    return
+                self.stats["pairs"] += len(window)
+                canonical = {}
+                for item in window:
+                    a, b = texts_of(item)
+                    hash_a, hash_b = text_hash(a), text_hash(b)
+                    flipped = hash_b < hash_a
+                    canonical[id(item)] = (pair_key(hash_a, hash_b), (b, a) if flipped else (a, b), flipped)
+                keys = list({key for key, _, _ in canonical.values()})
+                verdicts = self.store.get_many(keys) if self.store is not None else {}
+                self.stats["stored_hits"] += len(verdicts)
+                todo, seen = [], set(verdicts)
+                for key, (a, b), _ in canonical.values():
+                    if key not in seen:
+                        seen.add(key)
+                        todo.append((key, a, b))
+                if todo and self.generate is not None:
+                    batches = [todo[start:start + self.batch_size] for start in range(0, len(todo), self.batch_size)]
+                    for future in as_completed([pool.submit(self._classify_batch, batch) for batch in batches]):
+                        fresh = future.result()
+                        self.stats["classified"] += len(fresh)
+                        verdicts.update(fresh)
+                for item in window:
+                    key, _, flipped = canonical[id(item)]
+                    relation, confidence = verdicts.get(key, DEFAULT_VERDICT)
+                    yield item, relation, confidence, flipped
@@ -0,0 +1,217 @@
+import logging
+import math
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+try:
+    import hnswlib
+    HNSWLIB_AVAILABLE = True
+except ImportError:
+    HNSWLIB_AVAILABLE = False
+
+log = logging.getLogger("edge_builder")
+
+Pair = Tuple[int, int, float]  # (i, j, cosine similarity) with i < j
+
+
+def _is_torch(x) -> bool:
+    return hasattr(x, "detach") and hasattr(x, "device")
+
+
+def _to_numpy(emb) -> np.ndarray:
+    if _is_torch(emb):
+        return emb.detach().float().cpu().numpy()
+    return np.asarray(emb, dtype=np.float32)
+
+
+def normalized_numpy(emb) -> np.ndarray:
+    """Row-normalized float32 numpy copy of a numpy array or torch tensor."""
+    return _to_numpy(_normalize(emb))
+
+
+def _normalize(emb):
+    if _is_torch(emb):
+        import torch
+        return torch.nn.functional.normalize(emb.float(), dim=1)
+    emb = np.asarray(emb, dtype=np.float32)
+    norms = np.linalg.norm(emb, axis=1, keepdims=True)
+    return emb / np.maximum(norms, 1e-12)
+
+
+def tile_size(n: int, memory_budget_bytes: int, itemsize: int = 4) -> int:
+    """Side of the square similarity tile that fits the budget (at least 1, at most n)."""
+    return max(1, min(n, int(math.sqrt(max(memory_budget_bytes, itemsize) / itemsize))))
+
+
+def _tile_hits(tile, threshold: float, top_k: Optional[int]):
+    """(row, col, score) arrays for the entries of one tile to keep, as numpy."""
+    if _is_torch(tile):
+        import torch
+        if top_k:
+            k = min(top_k, tile.shape[1])
+            scores, cols = torch.topk(tile, k, dim=1)
+            rows = torch.arange(tile.shape[0], device=tile.device).unsqueeze(1).expand(-1, k)
+            keep = scores >= threshold
+            return rows[keep].cpu().numpy(), cols[keep].cpu().numpy(), scores[keep].cpu().numpy()
+        rows, cols = torch.nonzero(tile >= threshold, as_tuple=True)
+        return rows.cpu().numpy(), cols.cpu().numpy(), tile[rows, cols].cpu().numpy()
+    if top_k:
+        k = min(top_k, tile.shape[1])
+        cols = np.argpartition(-tile, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(tile, cols, axis=1)
+        rows = np.broadcast_to(np.arange(tile.shape[0])[:, None], cols.shape)
+        keep = scores >= threshold
+        return rows[keep], cols[keep], scores[keep]
+    rows, cols = np.nonzero(tile >= threshold)
+    return rows, cols, tile[rows, cols]
+
+
+def iter_similar_pairs(emb, threshold: float, memory_budget_bytes: int = 256 * 2**20,
+                       top_k: Optional[int] = None, normalize: bool = True) -> Iterator[Pair]:
+    """
+    Streams every pair (i, j), i < j, whose cosine similarity is at least `threshold`.
+
+    Embeddings (a numpy array or torch tensor, on any device) are normalized once,
+    then the upper triangle of the similarity matrix is computed as square tiles of
+    matrix products sized to `memory_budget_bytes`; thresholding happens on the
+    tile, so Python only sees the pairs that pass. With `top_k`, each row keeps at
+    most its `top_k` best partners among the later rows. Pairs come out ordered by
+    i, then j.
+    """
+    n = len(emb)
+    if n < 2:
+        return
+    if normalize:
+        emb = _normalize(emb)
+    side = tile_size(n, memory_budget_bytes)
+    log.info(f"Computing similarities for {n} embeddings in {side}x{side} tiles")
+    for r0 in range(0, n - 1, side):
+        r1 = min(r0 + side, n)
+        rows_block = emb[r0:r1]
+        hit_rows, hit_cols, hit_scores = [], [], []
+        for c0 in range(r0, n, side):
+            c1 = min(c0 + side, n)
+            tile = rows_block @ emb[c0:c1].T
+            if c0 == r0:
+                # Diagonal tile: only j > i
+                lower = np.tril(np.ones((r1 - r0, c1 - c0), dtype=bool))
+                if _is_torch(tile):
+                    import torch
+                    tile = tile.masked_fill(torch.from_numpy(lower).to(tile.device), -2.0)
+                else:
+                    tile = np.where(lower, -2.0, tile)
+            rows, cols, scores = _tile_hits(tile, threshold, top_k)
+            hit_rows.append(rows + r0)
+            hit_cols.append(cols + c0)
+            hit_scores.append(scores)
+        rows, cols, scores = np.concatenate(hit_rows), np.concatenate(hit_cols), np.concatenate(hit_scores)
+        if top_k and len(rows):
+            # Per-tile top-k candidates: keep each row's overall best top_k
+            order = np.lexsort((-scores, rows))
+            rows, cols, scores = rows[order], cols[order], scores[order]
+            rank = np.arange(len(rows)) - np.searchsorted(rows, rows, side="left")
+            keep = rank < top_k
+            rows, cols, scores = rows[keep], cols[keep], scores[keep]
+        order = np.lexsort((cols, rows))
+        for i, j, score in zip(rows[order].tolist(), cols[order].tolist(), scores[order].tolist()):
+            yield i, j, score
+
+
+def iter_cross_pairs(queries, corpus, threshold: float, memory_budget_bytes: int = 256 * 2**20,
+                     normalize: bool = True) -> Iterator[Pair]:
+    """
+    Streams (q, c, score) for every query row q and corpus row c whose cosine similarity
+    is at least `threshold`, computing `queries x corpus` in tiles sized to the budget.
+    Pairs come out ordered by c block, then q, then c.
+    """
+    if not len(queries) or not len(corpus):
+        return
+    if normalize:
+        queries, corpus = _normalize(queries), _normalize(corpus)
+    # Few queries (the usual case): one row block, with the widest column block the budget allows
+    rows = min(len(queries), tile_size(max(len(queries), len(corpus)), memory_budget_bytes))
+    cols = max(1, memory_budget_bytes // (4 * rows))
+    for c0 in range(0, len(corpus), cols):
+        corpus_block = corpus[c0:c0 + cols]
+        for r0 in range(0, len(queries), rows):
+            q, c, scores = _tile_hits(queries[r0:r0 + rows] @ corpus_block.T, threshold, None)
+            for i, j, score in zip((q + r0).tolist(), (c + c0).tolist(), scores.tolist()):
+                yield i, j, score
+
+
+def ann_neighbours(emb, top_k: int, ef: int = 100, M: int = 16, num_threads: int = -1):
+    """
+    Each row's `top_k` nearest other rows by cosine similarity, from an HNSW graph
+    built over the normalized embeddings. Build and query are both about
+    O(n log n). Returns (labels, similarities), each shaped (n, k); the row
+    itself is filtered out later, since it is usually, but not always, returned.
+    """
+    if not HNSWLIB_AVAILABLE:
+        raise RuntimeError("hnswlib is not installed; use the exact candidate generator")
+    matrix = _to_numpy(_normalize(emb))
+    n, dim = matrix.shape
+    k = min(top_k + 1, n)  # +1: the row finds itself
+    index = hnswlib.Index(space="ip", dim=dim)
+    index.init_index(max_elements=n, ef_construction=200, M=M)
+    index.set_num_threads(num_threads)
+    index.add_items(matrix, np.arange(n))
+    index.set_ef(max(ef, k))
+    labels, distances = index.knn_query(matrix, k=k)
+    return labels.astype(np.int64), 1.0 - distances  # ip distance is 1 - dot product
+
+
+def ann_pairs(labels: np.ndarray, sims: np.ndarray, threshold: float) -> Iterator[Pair]:
+    """Unique (i, j), i < j, neighbour pairs at or above `threshold`, ordered by i, then j."""
+    n, k = labels.shape
+    rows = np.repeat(np.arange(n, dtype=np.int64), k)
+    cols, scores = labels.ravel(), sims.ravel()
+    keep = (cols != rows) & (cols >= 0) & (scores >= threshold)
+    rows, cols, scores = rows[keep], cols[keep], scores[keep]
+    # A pair found from both ends is kept once
+    keys = np.minimum(rows, cols) * n + np.maximum(rows, cols)
+    keys, first = np.unique(keys, return_index=True)
+    for key, score in zip(keys.tolist(), scores[first].tolist()):
+        yield key // n, key % n, score
+
+
+def neighbour_recall(emb, labels: np.ndarray, sims: np.ndarray, threshold: float, top_k: int,
+                     sample_size: int = 200, seed: int = 0,
+                     memory_budget_bytes: int = 256 * 2**20) -> dict:
+    """
+    Recall of the approximate neighbour lists against an exact scan for a random
+    sample of rows: of each sampled row's true `top_k` neighbours at or above
+    `threshold`, the fraction the approximate lists contain. The scan runs in
+    column blocks, keeping a running top-k, so memory stays O(sample * block).
+    """
+    matrix = _to_numpy(_normalize(emb))
+    n = len(matrix)
+    rng = np.random.default_rng(seed)
+    sample = np.sort(rng.choice(n, size=min(sample_size, n), replace=False))
+    queries = matrix[sample]
+    k = min(top_k, n - 1)
+    if k < 1:
+        return {"sample_rows": len(sample), "exact_neighbours": 0, "recall": None}
+    best_scores = np.full((len(sample), k), -np.inf, dtype=np.float32)
+    best_labels = np.full((len(sample), k), -1, dtype=np.int64)
+    block = max(1, memory_budget_bytes // (4 * len(sample)))
+    for c0 in range(0, n, block):
+        scores = queries @ matrix[c0:c0 + block].T
+        block_labels = np.broadcast_to(np.arange(c0, c0 + scores.shape[1]), scores.shape)
+        scores = np.where(block_labels == sample[:, None], -np.inf, scores)  # not its own neighbour
+        merged_scores = np.concatenate([best_scores, scores], axis=1)
+        merged_labels = np.concatenate([best_labels, block_labels], axis=1)
+        top = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(merged_scores, top, axis=1)
+        best_labels = np.take_along_axis(merged_labels, top, axis=1)
+    found = expected = 0
+    for position, row in enumerate(sample.tolist()):
+        truth = {j for j, s in zip(best_labels[position].tolist(), best_scores[position].tolist()) if s >= threshold}
+        approx = [j for j in labels[row].tolist() if j != row and j >= 0][:k]
+        expected += len(truth)
+        found += len(truth.intersection(approx))
+    return {
+        "sample_rows": len(sample),
+        "exact_neighbours": expected,
+        "recall": round(found / expected, 4) if expected else None
+    }
@@ -0,0 +1,169 @@
+# embedding_cache.py
+import hashlib
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from aletheia.config import Config
+from aletheia.kv_store import MongoKVStore, SQLiteKVStore
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Collapses whitespace so trivially different spellings of a query share a cache entry."""
+    return " ".join(text.split())
+
+
+def cache_key(text: str, model_id: str) -> str:
+    """Content-addressed key for an embedding of `text` produced by `model_id`."""
+    payload = f"{model_id}\x00{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+def _encode_vector(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _decode_vector(blob: bytes) -> List[float]:
+    return array("f", blob).tolist()
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache for text embeddings keyed by normalized text and model id.
+    Lookups hit an in-process LRU first and fall back to a persistent store,
+    so repeated queries never cost an embedding round-trip.
+    """
+    def __init__(self, store=None, lru_size: int = 2048):
+        self.store = store
+        self.lru_size = lru_size
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    def _lru_get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+            return vector
+
+    def _lru_put(self, key: str, vector: List[float]):
+        with self._lock:
+            self._lru[key] = vector
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def get_many(self, texts: List[str], model_id: str, memory_tier: bool = True) -> List[Optional[List[float]]]:
+        """Returns cached embeddings aligned with `texts`, with None for misses."""
+        keys = [cache_key(text, model_id) for text in texts]
+        results = [self._lru_get(key) if memory_tier else None for key in keys]
+        pending = [key for key, vector in zip(keys, results) if vector is None]
+
+        persisted = {}
+        if pending and self.store is not None:
+            try:
+                persisted = self.store.get_many(pending)
+            except Exception as e:
+                logger.warning(f"Persistent embedding cache read failed: {e}")
+
+        for i, key in enumerate(keys):
+            if results[i] is not None:
+                self.hits += 1
+            elif key in persisted:
+                results[i] = persisted[key]
+                self.persistent_hits += 1
+                if memory_tier:
+                    self._lru_put(key, results[i])
+            else:
+                self.misses += 1
+        return results
+
+    def put_many(self, texts: List[str], model_id: str, vectors: List[List[float]], memory_tier: bool = True):
+        items = {}
+        for text, vector in zip(texts, vectors):
+            if not vector:
+                continue
+            key = cache_key(text, model_id)
+            vector = list(vector)
+            items[key] = vector
+            if memory_tier:
+                self._lru_put(key, vector)
+        if items and self.store is not None:
+            try:
+                self.store.put_many(items, model_id)
+            except Exception as e:
+                logger.warning(f"Persistent embedding cache write failed: {e}")
+
+    def get(self, text: str, model_id: str) -> Optional[List[float]]:
+        return self.get_many([text], model_id)[0]
+
+    def put(self, text: str, model_id: str, vector: List[float]):
+        self.put_many([text], model_id, [vector])
+
+    def get_or_compute(self, text: str, model_id: str, compute: Callable[[str], List[float]]) -> List[float]:
+        """Returns the cached embedding or computes, stores and returns it. Empty results are not cached."""
+        vector = self.get(text, model_id)
+        if vector is not None:
+            return vector
+        vector = compute(text)
+        if vector:
+            self.put(text, model_id, vector)
+        return vector
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.persistent_hits + self.misses
+        return {
+            "memory_entries": len(self._lru),
+            "persistent_backend": type(self.store).__name__ if self.store is not None else None,
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.persistent_hits) / lookups if lookups else 0.0
+        }
+
+
+_cache_instance = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache(db=None, create: bool = True) -> Optional[EmbeddingCache]:
+    """
+    Returns the process-wide embedding cache, creating it on first use.
+    The Mongo backend needs `db`; if it is requested before a db is available the
+    cache runs memory-only and attaches the Mongo tier on the first call that passes one.
+    With create=False, returns the cache as it is, or None if it doesn't exist yet.
+    """
+    global _cache_instance
+    if not create:
+        return _cache_instance
+    with _cache_lock:
+        backend = Config.EMBEDDING_CACHE_BACKEND
+        if _cache_instance is None:
+            _cache_instance = EmbeddingCache(lru_size=Config.EMBEDDING_CACHE_LRU_SIZE)
+            if backend == "file":
+                try:
+                    _cache_instance.store = SQLiteKVStore(
+                        Config.EMBEDDING_CACHE_PATH,
+                        Config.EMBEDDING_CACHE_TTL_SECONDS,
+                        Config.EMBEDDING_CACHE_MAX_ENTRIES,
+                        encode=_encode_vector,
+                        decode=_decode_vector
+                    )
+                except Exception as e:
+                    logger.warning(f"Could not open embedding cache file, running memory-only: {e}")
+            logger.info(f"Embedding cache initialized (backend: {backend})")
+        if backend == "mongo" and _cache_instance.store is None and db is not None:
+            _cache_instance.store = MongoKVStore(
+                db[Config.EMBEDDING_CACHE_COLLECTION],
+                Config.EMBEDDING_CACHE_TTL_SECONDS,
+                Config.EMBEDDING_CACHE_MAX_ENTRIES
+            )
+            logger.info(f"Embedding cache attached to collection '{Config.EMBEDDING_CACHE_COLLECTION}'")
+        return _cache_instance
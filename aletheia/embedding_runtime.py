@@ -0,0 +1,201 @@
+# embedding_runtime.py
+#
+# Deliberately free of app config imports: bert_api.py ships this module on its own.
+import json
+import logging
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+from transformers import AutoModel, AutoTokenizer
+
+logger = logging.getLogger(__name__)
+
+try:
+    import onnxruntime as ort
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+
+RUNTIMES = ("torch", "int8", "onnx", "onnx-int8")
+# Reference sentences of varied length used to check an exported runtime against PyTorch fp32
+VALIDATION_TEXTS = [
+    "Justice.",
+    "Is it ever permissible to lie to protect someone from harm?",
+    "An AI system that optimizes a proxy objective may pursue instrumental goals its designers never intended.",
+    "Virtue ethics asks not what rule to follow but what a person of good character would do in this situation, "
+    "and how acting that way contributes to a flourishing life for the agent and the community around them.",
+    "The categorical imperative requires that we act only according to maxims we could will to become universal law.",
+    "Utilitarianism weighs consequences; deontology weighs duties.",
+]
+
+
+def pool(last_hidden_state: np.ndarray, attention_mask: np.ndarray, pooling: str) -> np.ndarray:
+    """CLS or attention-masked mean pooling of a [batch, seq, hidden] array."""
+    if pooling == "cls":
+        return last_hidden_state[:, 0, :]
+    mask = attention_mask[..., None].astype(np.float32)
+    return (last_hidden_state * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+
+class _LastHiddenState(torch.nn.Module):
+    """Wraps a HF encoder so tracing/export sees a plain tensor output."""
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask, token_type_ids):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask,
+                          token_type_ids=token_type_ids).last_hidden_state
+
+
+class TorchEncoder:
+    def __init__(self, model):
+        self.model = model
+
+    def __call__(self, inputs: Dict[str, torch.Tensor]) -> np.ndarray:
+        with torch.inference_mode():
+            return self.model(**inputs).last_hidden_state.float().numpy()
+
+
+class OnnxEncoder:
+    def __init__(self, path: str):
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.size_bytes = os.path.getsize(path)  # resident size estimate for the model registry
+
+    def __call__(self, inputs: Dict[str, torch.Tensor]) -> np.ndarray:
+        feed = {name: np.asarray(value, dtype=np.int64) for name, value in inputs.items() if name in self.input_names}
+        return self.session.run(["last_hidden_state"], feed)[0]
+
+
+class EmbeddingRuntime:
+    """A tokenizer plus an encoder that maps padded inputs to the last hidden state as a numpy array."""
+    def __init__(self, tokenizer, encoder, runtime: str, hidden_size: int):
+        self.tokenizer = tokenizer
+        self.encoder = encoder
+        self.runtime = runtime
+        self.hidden_size = hidden_size
+
+    def forward(self, inputs: Dict[str, torch.Tensor]) -> np.ndarray:
+        return self.encoder(inputs)
+
+    def embed(self, texts: List[str], pooling: str = "mean", max_length: int = 512) -> np.ndarray:
+        inputs = self.tokenizer(list(texts), return_tensors="pt", padding=True, truncation=True, max_length=max_length)
+        return pool(self.forward(inputs), inputs["attention_mask"].numpy(), pooling)
+
+
+def _load_reference(model_name: str):
+    model = AutoModel.from_pretrained(model_name, torch_dtype=torch.float32)
+    model.eval()
+    return model
+
+
+def _quantize_int8(model):
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def _export_onnx(model, tokenizer, export_dir: str, quantize: bool) -> str:
+    fp32_path = os.path.join(export_dir, "model.onnx")
+    sample = tokenizer(VALIDATION_TEXTS[:2], return_tensors="pt", padding=True)
+    torch.onnx.export(
+        _LastHiddenState(model),
+        (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+        fp32_path,
+        input_names=["input_ids", "attention_mask", "token_type_ids"],
+        output_names=["last_hidden_state"],
+        dynamic_axes={name: {0: "batch", 1: "sequence"}
+                      for name in ("input_ids", "attention_mask", "token_type_ids", "last_hidden_state")},
+        opset_version=14,
+    )
+    if not quantize:
+        return fp32_path
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    int8_path = os.path.join(export_dir, "model.int8.onnx")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    return int8_path
+
+
+def validate_runtime(tokenizer, reference, candidate) -> Dict[str, float]:
+    """Minimum per-sentence cosine similarity between reference and candidate, for CLS and mean pooling."""
+    inputs = tokenizer(VALIDATION_TEXTS, return_tensors="pt", padding=True)
+    mask = inputs["attention_mask"].numpy()
+    ref_hidden, cand_hidden = reference(inputs), candidate(inputs)
+    scores = {}
+    for pooling in ("cls", "mean"):
+        a, b = pool(ref_hidden, mask, pooling), pool(cand_hidden, mask, pooling)
+        cosine = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1) + 1e-12)
+        scores[pooling] = float(cosine.min())
+    return scores
+
+
+def load_embedding_runtime(model_name: str, runtime: str = "torch", cache_dir: str = ".cache/embedding_runtime",
+                           tolerance: float = 0.99) -> EmbeddingRuntime:
+    """
+    Loads `model_name` on the requested runtime, falling back to PyTorch fp32.
+
+    `int8` applies dynamic int8 quantization to the Linear layers; `onnx` and
+    `onnx-int8` export the model to ONNX (optionally dynamically quantized) and run
+    it with ONNX Runtime. The first load of a non-torch runtime validates it against
+    the fp32 reference and records the result in a manifest next to the export, so
+    later loads skip both the export and the reference model.
+    """
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if runtime not in RUNTIMES:
+        logger.warning(f"Unknown embedding runtime '{runtime}', using torch")
+        runtime = "torch"
+    if runtime.startswith("onnx") and not ONNXRUNTIME_AVAILABLE:
+        logger.warning("onnxruntime not installed, using torch embedding runtime")
+        runtime = "torch"
+    if runtime == "torch":
+        model = _load_reference(model_name)
+        return EmbeddingRuntime(tokenizer, TorchEncoder(model), "torch", model.config.hidden_size)
+
+    export_dir = os.path.join(cache_dir, model_name.replace("/", "--"), runtime)
+    manifest_path = os.path.join(export_dir, "manifest.json")
+    try:
+        manifest = _read_manifest(manifest_path)
+        if manifest is None:
+            os.makedirs(export_dir, exist_ok=True)
+            reference = _load_reference(model_name)
+            hidden_size = reference.config.hidden_size
+            reference_encoder = TorchEncoder(reference)
+            if runtime == "int8":
+                candidate = TorchEncoder(_quantize_int8(_load_reference(model_name)))
+            else:
+                candidate = OnnxEncoder(_export_onnx(reference, tokenizer, export_dir, quantize=runtime == "onnx-int8"))
+            scores = validate_runtime(tokenizer, reference_encoder, candidate)
+            manifest = {"model": model_name, "runtime": runtime, "hidden_size": hidden_size,
+                        "min_cosine": scores, "tolerance": tolerance,
+                        "torch_version": torch.__version__}
+            with open(manifest_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+            del reference, reference_encoder
+        else:
+            candidate = _load_export(model_name, runtime, export_dir)
+        if min(manifest["min_cosine"].values()) < tolerance:
+            logger.error(f"Embedding runtime '{runtime}' failed validation ({manifest['min_cosine']} < {tolerance}); using torch")
+            return load_embedding_runtime(model_name, "torch", cache_dir, tolerance)
+        logger.info(f"Embedding runtime '{runtime}' loaded for {model_name} (validated cosine: {manifest['min_cosine']})")
+        return EmbeddingRuntime(tokenizer, candidate, runtime, manifest["hidden_size"])
+    except Exception as e:
+        logger.error(f"Failed to load embedding runtime '{runtime}', using torch: {e}", exc_info=True)
+        return load_embedding_runtime(model_name, "torch", cache_dir, tolerance)
+
+
+def _read_manifest(path: str) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _load_export(model_name: str, runtime: str, export_dir: str):
+    if runtime == "int8":
+        # Dynamic quantization is cheap; the manifest only records that it validated
+        return TorchEncoder(_quantize_int8(_load_reference(model_name)))
+    filename = "model.int8.onnx" if runtime == "onnx-int8" else "model.onnx"
+    return OnnxEncoder(os.path.join(export_dir, filename))
@@ -3,14 +3,19 @@ from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from transformers import AutoTokenizer, AutoModelForCausalLM
 from peft import PeftModel
+from aletheia.model_registry import get_model_registry
 
 MODEL_BASE = "google/gemma-2b-it"
 LORA_PATH  = "./artifacts/lora_guardrail"
 DEVICE     = "cuda" if torch.cuda.is_available() else "cpu"
 
-tok   = AutoTokenizer.from_pretrained(MODEL_BASE, trust_remote_code=True)
-base  = AutoModelForCausalLM.from_pretrained(MODEL_BASE, torch_dtype="auto").to(DEVICE)
-model = PeftModel.from_pretrained(base, LORA_PATH).to(DEVICE).eval()
+def load_critic():
+    tok   = AutoTokenizer.from_pretrained(MODEL_BASE, trust_remote_code=True)
+    base  = AutoModelForCausalLM.from_pretrained(MODEL_BASE, torch_dtype="auto").to(DEVICE)
+    return tok, PeftModel.from_pretrained(base, LORA_PATH).to(DEVICE).eval()
+
+# Held for the life of the server; shared with anything else in-process that loads the same critic
+tok, model = get_model_registry().acquire(f"{MODEL_BASE}+{LORA_PATH}", load_critic, dtype="auto", device=DEVICE)
 
 class Inp(BaseModel): text: str
 app = FastAPI()
@@ -0,0 +1,194 @@
+# http_client.py
+import bisect
+import logging
+import random
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from aletheia.config import Config
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = frozenset({429, 502, 503, 504})
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without touching the network while a host's circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker for one host.
+
+    After `threshold` failures in a row the circuit opens and calls fail fast for
+    `cooldown` seconds; then a single trial call is let through (half-open) and
+    its outcome closes or re-opens the circuit.
+    """
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record(self, success: bool):
+        with self._lock:
+            self._trial_in_flight = False
+            if success:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram for one endpoint."""
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total_ms = 0.0
+        self.errors = 0
+
+    def observe(self, elapsed_ms: float, error: bool = False):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+        self.total_ms += elapsed_ms
+        if error:
+            self.errors += 1
+
+    def snapshot(self) -> Dict:
+        count = sum(self.counts)
+        labels = [f"le_{bound}" for bound in LATENCY_BUCKETS_MS] + ["inf"]
+        return {
+            "count": count,
+            "errors": self.errors,
+            "mean_ms": round(self.total_ms / count, 2) if count else None,
+            "buckets": dict(zip(labels, self.counts))
+        }
+
+
+class PooledHTTPClient:
+    """
+    Shared outbound HTTP client.
+
+    One keep-alive `requests.Session` whose adapter holds at most `pool_maxsize`
+    connections per host, so repeated calls to the BERT API, HuggingFace or the
+    guardrail service skip the TCP/TLS handshake. Connection errors and
+    429/502/503/504 responses are retried with jittered exponential backoff, each
+    host has its own circuit breaker, and every endpoint keeps a latency histogram.
+    """
+    def __init__(self, pool_maxsize: int = 20, max_retries: int = 2, backoff_base: float = 0.2,
+                 breaker_threshold: int = 5, breaker_cooldown: float = 30.0):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=pool_maxsize, pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._breakers = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def _breaker(self, host: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = self._breakers[host] = CircuitBreaker(self.breaker_threshold, self.breaker_cooldown)
+            return breaker
+
+    def _histogram(self, endpoint: str) -> LatencyHistogram:
+        with self._lock:
+            histogram = self._histograms.get(endpoint)
+            if histogram is None:
+                histogram = self._histograms[endpoint] = LatencyHistogram()
+            return histogram
+
+    def request(self, method: str, url: str, retries: Optional[int] = None, **kwargs) -> requests.Response:
+        """Sends a request through the pool. `retries` overrides the client default for this call."""
+        parts = urlsplit(url)
+        host = parts.netloc
+        endpoint = f"{method.upper()} {host}{parts.path or '/'}"
+        breaker = self._breaker(host)
+        histogram = self._histogram(endpoint)
+        retries = self.max_retries if retries is None else retries
+        kwargs.setdefault("timeout", 30)
+
+        for attempt in range(retries + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f"Circuit open for {host}; skipping {endpoint}")
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                histogram.observe((time.perf_counter() - start) * 1000, error=True)
+                breaker.record(False)
+                if attempt >= retries:
+                    raise
+                logger.warning(f"{endpoint} failed (attempt {attempt + 1}/{retries + 1}): {e}")
+            else:
+                failed = response.status_code in RETRY_STATUS_CODES or response.status_code >= 500
+                histogram.observe((time.perf_counter() - start) * 1000, error=failed)
+                breaker.record(not failed)
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= retries:
+                    return response
+                logger.warning(f"{endpoint} returned {response.status_code} (attempt {attempt + 1}/{retries + 1})")
+            time.sleep(self.backoff_base * 2 ** attempt * (0.5 + random.random()))
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "breakers": {host: {"state": b.state, "failures": b.failures} for host, b in self._breakers.items()},
+                "latency": {endpoint: h.snapshot() for endpoint, h in self._histograms.items()}
+            }
+
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client(create: bool = True) -> Optional[PooledHTTPClient]:
+    """Returns the process-wide pooled HTTP client; with create=False, None if it doesn't exist yet."""
+    global _http_client
+    if _http_client is None and create:
+        with _http_client_lock:
+            if _http_client is None:
+                _http_client = PooledHTTPClient(
+                    pool_maxsize=Config.HTTP_POOL_MAXSIZE,
+                    max_retries=Config.HTTP_MAX_RETRIES,
+                    backoff_base=Config.HTTP_BACKOFF_BASE,
+                    breaker_threshold=Config.HTTP_BREAKER_THRESHOLD,
+                    breaker_cooldown=Config.HTTP_BREAKER_COOLDOWN
+                )
+    return _http_client
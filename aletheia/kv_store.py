@@ -0,0 +1,163 @@
+# kv_store.py
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Expired and over-capacity entries are trimmed once per this many writes
+EVICT_EVERY_WRITES = 100
+
+
+def _identity(value):
+    return value
+
+
+class SQLiteKVStore:
+    """
+    Persistent cache tier backed by a local SQLite file.
+
+    Rows are (key, model, value, created_at, last_access); `encode`/`decode`
+    convert values to and from what SQLite stores. Entries older than
+    `ttl_seconds` are treated as misses, and every EVICT_EVERY_WRITES writes the
+    expired rows and the least recently used rows above `max_entries` are dropped.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int, max_entries: int,
+                 encode: Callable[[Any], Any] = _identity, decode: Callable[[Any], Any] = _identity):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.encode = encode
+        self.decode = decode
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            "key TEXT PRIMARY KEY, model TEXT, value BLOB, created_at REAL, last_access REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache_entries(last_access)")
+        self._conn.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        if not keys:
+            return {}
+        now = time.time()
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, value, created_at FROM cache_entries WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, value, created_at in rows:
+                    if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                        continue
+                    found[key] = self.decode(value)
+            if found:
+                self._conn.executemany(
+                    "UPDATE cache_entries SET last_access = ? WHERE key = ?", [(now, k) for k in found]
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(self, items: Dict[str, Any], model: str):
+        if not items:
+            return
+        now = time.time()
+        rows = [(key, model, self.encode(value), now, now) for key, value in items.items()]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO cache_entries VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+            self._writes_since_evict += len(rows)
+            if self._writes_since_evict >= EVICT_EVERY_WRITES:
+                self._evict()
+
+    def _evict(self):
+        """Drops expired rows, then the least recently used rows above max_entries."""
+        self._writes_since_evict = 0
+        if self.ttl_seconds:
+            self._conn.execute("DELETE FROM cache_entries WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        if self.max_entries:
+            self._conn.execute(
+                "DELETE FROM cache_entries WHERE key IN ("
+                "SELECT key FROM cache_entries ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+        self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+
+
+class MongoKVStore:
+    """Persistent cache tier backed by a MongoDB collection with a TTL index."""
+
+    def __init__(self, collection, ttl_seconds: int, max_entries: int):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._writes_since_evict = 0
+        self._lock = threading.Lock()
+        try:
+            if ttl_seconds:
+                self.collection.create_index("created_at", expireAfterSeconds=ttl_seconds, background=True)
+            self.collection.create_index("last_access", background=True)
+        except Exception as e:
+            logger.warning(f"Cache index creation failed on '{collection.name}': {e}")
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        if not keys:
+            return {}
+        found = {doc["_id"]: doc["value"]
+                 for doc in self.collection.find({"_id": {"$in": keys}}, {"value": 1}) if "value" in doc}
+        if found:
+            self.collection.update_many({"_id": {"$in": list(found)}}, {"$set": {"last_access": time.time()}})
+        return found
+
+    def put_many(self, items: Dict[str, Any], model: str):
+        if not items:
+            return
+        from datetime import datetime, timezone
+        from pymongo import UpdateOne
+        now = datetime.now(timezone.utc)
+        ops = [
+            UpdateOne(
+                {"_id": key},
+                {"$set": {"model": model, "value": value, "created_at": now, "last_access": time.time()}},
+                upsert=True
+            )
+            for key, value in items.items()
+        ]
+        self.collection.bulk_write(ops, ordered=False)
+        with self._lock:
+            self._writes_since_evict += len(ops)
+            should_evict = self._writes_since_evict >= EVICT_EVERY_WRITES
+            if should_evict:
+                self._writes_since_evict = 0
+        if should_evict:
+            self._evict()
+
+    def _evict(self):
+        """Trims the least recently used documents above max_entries; TTL expiry is handled by MongoDB."""
+        if not self.max_entries:
+            return
+        overflow = self.collection.estimated_document_count() - self.max_entries
+        if overflow <= 0:
+            return
+        stale = [doc["_id"] for doc in self.collection.find({}, {"_id": 1}).sort("last_access", 1).limit(overflow)]
+        if stale:
+            self.collection.delete_many({"_id": {"$in": stale}})
+
+    def count(self) -> int:
+        return self.collection.estimated_document_count()
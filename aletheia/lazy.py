@@ -0,0 +1,95 @@
+# lazy.py
+import importlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class StartupReport:
+    """
+    Wall-clock cost of each startup phase, plus the first-use cost of every
+    lazily created resource. `mark(name)` closes the phase that started at the
+    previous mark (or when the report was created).
+    """
+    def __init__(self):
+        self._last_mark = time.perf_counter()
+        self._lock = threading.Lock()
+        self.phases = OrderedDict()
+        self.lazy = OrderedDict()
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        with self._lock:
+            self.phases[phase] = round((now - self._last_mark) * 1000, 1)
+            self._last_mark = now
+
+    def record_lazy(self, name: str, seconds: float):
+        with self._lock:
+            self.lazy[name] = round(seconds * 1000, 1)
+        logger.info(f"Lazy init of '{name}' took {seconds * 1000:.0f} ms")
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {
+                "startup_ms": round(sum(self.phases.values()), 1),
+                "phases_ms": dict(self.phases),
+                "lazy_init_ms": dict(self.lazy)
+            }
+
+    def log(self):
+        summary = self.summary()
+        phases = ", ".join(f"{name}={ms:.0f}ms" for name, ms in summary["phases_ms"].items())
+        logger.info(f"Startup finished in {summary['startup_ms']:.0f} ms ({phases})")
+
+
+startup_report = StartupReport()
+
+
+class Lazy:
+    """
+    A value created by `factory` on first use, at most once, from any thread.
+
+    Attribute access is forwarded to the created value, so a `Lazy` can stand in
+    for a module-level client or service object without changing its call sites.
+    A factory that raises is retried on the next access.
+    """
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self._name = name
+        self._factory = factory
+        self._value = None
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    @property
+    def initialized(self) -> bool:
+        return self._initialized
+
+    def get(self) -> Any:
+        if self._initialized:
+            return self._value
+        with self._lock:
+            if not self._initialized:
+                started = time.perf_counter()
+                self._value = self._factory()
+                self._initialized = True
+                startup_report.record_lazy(self._name, time.perf_counter() - started)
+        return self._value
+
+    def __getattr__(self, item):
+        # Only called for attributes not found on the Lazy itself
+        if item.startswith("_"):
+            raise AttributeError(item)
+        return getattr(self.get(), item)
+
+    def __repr__(self):
+        state = "initialized" if self._initialized else "pending"
+        return f"<Lazy {self._name} ({state})>"
+
+
+def lazy_import(module_name: str) -> Lazy:
+    """A module imported on first attribute access."""
+    return Lazy(module_name, lambda: importlib.import_module(module_name))
@@ -0,0 +1,95 @@
+# llm_cache.py
+import hashlib
+import json
+import logging
+import threading
+from typing import Dict, Optional
+
+from aletheia.config import Config
+from aletheia.kv_store import MongoKVStore, SQLiteKVStore
+
+logger = logging.getLogger(__name__)
+
+
+def llm_cache_key(model: str, prompt: str, generation_config: Optional[Dict] = None) -> str:
+    """Content-addressed key for a response of `model` to `prompt` under `generation_config`."""
+    config_json = json.dumps(generation_config or {}, sort_keys=True, default=str)
+    payload = f"{model}\x00{config_json}\x00{prompt}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Content-addressed cache of raw LLM response text keyed by model, prompt and
+    generation config, so replays of identical prompts (same agent version,
+    scenario and retrieved context, or a rerun of the edge builder) skip the API.
+    """
+    def __init__(self, store=None):
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, model: str, prompt: str, generation_config: Optional[Dict] = None) -> Optional[str]:
+        if self.store is None:
+            return None
+        key = llm_cache_key(model, prompt, generation_config)
+        try:
+            response = self.store.get_many([key]).get(key)
+        except Exception as e:
+            logger.warning(f"LLM cache read failed: {e}")
+            response = None
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return response
+
+    def put(self, model: str, prompt: str, generation_config: Optional[Dict], response: str):
+        if self.store is None or not response:
+            return
+        try:
+            self.store.put_many({llm_cache_key(model, prompt, generation_config): response}, model)
+        except Exception as e:
+            logger.warning(f"LLM cache write failed: {e}")
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.store).__name__ if self.store is not None else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache(db=None, create: bool = True) -> Optional[LLMResponseCache]:
+    """
+    Returns the process-wide LLM response cache. LLM_CACHE_BACKEND=off disables it;
+    the Mongo backend attaches on the first call that passes `db`. With create=False,
+    returns the cache as it is, or None if it doesn't exist yet.
+    """
+    global _llm_cache
+    if not create:
+        return _llm_cache
+    with _llm_cache_lock:
+        backend = Config.LLM_CACHE_BACKEND
+        if _llm_cache is None:
+            _llm_cache = LLMResponseCache()
+            if backend == "file":
+                try:
+                    _llm_cache.store = SQLiteKVStore(
+                        Config.LLM_CACHE_PATH, Config.LLM_CACHE_TTL_SECONDS, Config.LLM_CACHE_MAX_ENTRIES
+                    )
+                except Exception as e:
+                    logger.warning(f"Could not open LLM cache file, caching disabled: {e}")
+            logger.info(f"LLM response cache initialized (backend: {backend})")
+        if backend == "mongo" and _llm_cache.store is None and db is not None:
+            _llm_cache.store = MongoKVStore(
+                db[Config.LLM_CACHE_COLLECTION], Config.LLM_CACHE_TTL_SECONDS, Config.LLM_CACHE_MAX_ENTRIES
+            )
+            logger.info(f"LLM response cache attached to collection '{Config.LLM_CACHE_COLLECTION}'")
+        return _llm_cache
@@ -0,0 +1,250 @@
+# llm_gateway.py
+import asyncio
+import contextlib
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import AsyncIterator, Dict, Iterator, Optional
+
+from aletheia.config import Config
+
+logger = logging.getLogger(__name__)
+
+try:
+    from google import genai
+    from google.genai import types
+    GENAI_AVAILABLE = True
+except ImportError:
+    GENAI_AVAILABLE = False
+
+
+def text_request(prompt: str, response_mime_type: str = "text/plain"):
+    """Builds the (contents, config) pair for a single-turn text prompt."""
+    contents = [types.Content(role="user", parts=[types.Part.from_text(text=prompt)])]
+    return contents, types.GenerateContentConfig(response_mime_type=response_mime_type)
+
+
+def parse_rate_limits(spec: str) -> Dict[str, float]:
+    """Parses 'model=rpm,model=rpm' into a dict, skipping malformed entries."""
+    limits = {}
+    for item in (spec or "").split(","):
+        model, _, rpm = item.partition("=")
+        try:
+            limits[model.strip()] = float(rpm)
+        except ValueError:
+            if item.strip():
+                logger.warning(f"Ignoring malformed LLM rate limit entry: '{item}'")
+    return limits
+
+
+class RateLimiter:
+    """Evenly spaced requests-per-minute limiter. `reserve()` claims a slot and returns how long to wait for it."""
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+            return slot - now
+
+
+class ModelMetrics:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.total_seconds = 0.0
+        self.first_chunk_seconds = 0.0
+        self.streams = 0
+        self.rate_limited_seconds = 0.0
+
+    def snapshot(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "mean_latency_s": round(self.total_seconds / self.calls, 3) if self.calls else None,
+            "mean_time_to_first_chunk_s": round(self.first_chunk_seconds / self.streams, 3) if self.streams else None,
+            "rate_limited_s": round(self.rate_limited_seconds, 3)
+        }
+
+
+class LLMGateway:
+    """
+    Process-wide entry point for Gemini calls.
+
+    Owns a single `genai.Client` (and therefore one connection pool) and exposes
+    sync and async generate/stream methods that mirror the client's
+    `models.generate_content(_stream)` signatures. Every call passes through a
+    global concurrency cap shared by the sync and async paths, and an optional
+    per-model requests-per-minute limiter, and is timed per model.
+    """
+    def __init__(self, api_key: Optional[str], max_concurrency: int = 16,
+                 rate_limits: Optional[Dict[str, float]] = None, default_rpm: float = 0,
+                 timeout: float = 60.0):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.rate_limits = rate_limits or {}
+        self.default_rpm = default_rpm
+        self.client = None
+        if not GENAI_AVAILABLE:
+            logger.error("google-genai not available. LLM gateway disabled.")
+        elif not api_key:
+            logger.error("GEMINI_API_KEY not found in environment variables. LLM gateway disabled.")
+        else:
+            self.client = genai.Client(api_key=api_key,
+                                       http_options=types.HttpOptions(timeout=int(timeout * 1000)))
+            logger.info(f"LLM gateway initialized (max concurrency: {max_concurrency})")
+        # One budget for both paths: async callers take the same slots without blocking the loop
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._limiters = {}
+        self._metrics = defaultdict(ModelMetrics)
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return self.client is not None
+
+    def _require_client(self):
+        if self.client is None:
+            raise ConnectionError("LLM client not initialized.")
+
+    def _rate_wait(self, model: str) -> float:
+        rpm = self.rate_limits.get(model, self.default_rpm)
+        if not rpm:
+            return 0.0
+        with self._lock:
+            limiter = self._limiters.get(model)
+            if limiter is None:
+                limiter = self._limiters[model] = RateLimiter(rpm)
+        wait = limiter.reserve()
+        if wait > 0:
+            with self._lock:
+                self._metrics[model].rate_limited_seconds += wait
+        return wait
+
+    def _start(self, model: str) -> float:
+        with self._lock:
+            self._metrics[model].in_flight += 1
+        return time.perf_counter()
+
+    def _finish(self, model: str, started: float, error: bool, first_chunk_at: Optional[float] = None):
+        with self._lock:
+            metrics = self._metrics[model]
+            metrics.in_flight -= 1
+            metrics.calls += 1
+            metrics.total_seconds += time.perf_counter() - started
+            if error:
+                metrics.errors += 1
+            if first_chunk_at is not None:
+                metrics.streams += 1
+                metrics.first_chunk_seconds += first_chunk_at - started
+
+    def generate(self, model: str, contents, config=None):
+        """Blocking `generate_content` through the concurrency cap and rate limiter."""
+        self._require_client()
+        time.sleep(self._rate_wait(model))
+        with self._slots:
+            started, error = self._start(model), True
+            try:
+                response = self.client.models.generate_content(model=model, contents=contents, config=config)
+                error = False
+                return response
+            finally:
+                self._finish(model, started, error)
+
+    def stream(self, model: str, contents, config=None) -> Iterator:
+        """Blocking `generate_content_stream`; the concurrency slot is held until the stream is exhausted."""
+        self._require_client()
+        time.sleep(self._rate_wait(model))
+        with self._slots:
+            started, error, first_chunk_at = self._start(model), True, None
+            try:
+                for chunk in self.client.models.generate_content_stream(model=model, contents=contents, config=config):
+                    if first_chunk_at is None:
+                        first_chunk_at = time.perf_counter()
+                    if time.perf_counter() - started > self.timeout:
+                        raise TimeoutError(f"LLM stream for {model} exceeded {self.timeout:.0f}s")
+                    yield chunk
+                error = False
+            finally:
+                self._finish(model, started, error, first_chunk_at)
+
+    @contextlib.asynccontextmanager
+    async def _async_slot(self):
+        """Holds one of the shared concurrency slots, polling for it so the event loop keeps running."""
+        delay = 0.005
+        while not self._slots.acquire(blocking=False):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    async def agenerate(self, model: str, contents, config=None):
+        """Async `generate_content` through the same limits as `generate`."""
+        self._require_client()
+        await asyncio.sleep(self._rate_wait(model))
+        async with self._async_slot():
+            started, error = self._start(model), True
+            try:
+                response = await self.client.aio.models.generate_content(model=model, contents=contents, config=config)
+                error = False
+                return response
+            finally:
+                self._finish(model, started, error)
+
+    async def astream(self, model: str, contents, config=None) -> AsyncIterator:
+        """Async `generate_content_stream` through the same limits as `stream`."""
+        self._require_client()
+        await asyncio.sleep(self._rate_wait(model))
+        async with self._async_slot():
+            started, error, first_chunk_at = self._start(model), True, None
+            try:
+                stream = await self.client.aio.models.generate_content_stream(model=model, contents=contents, config=config)
+                async for chunk in stream:
+                    if first_chunk_at is None:
+                        first_chunk_at = time.perf_counter()
+                    if time.perf_counter() - started > self.timeout:
+                        raise TimeoutError(f"LLM stream for {model} exceeded {self.timeout:.0f}s")
+                    yield chunk
+                error = False
+            finally:
+                self._finish(model, started, error, first_chunk_at)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "available": self.available,
+                "max_concurrency": self.max_concurrency,
+                "models": {model: metrics.snapshot() for model, metrics in self._metrics.items()}
+            }
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway(create: bool = True) -> Optional[LLMGateway]:
+    """
+    Returns the process-wide LLM gateway, creating the Gemini client on first use.
+    With create=False, returns None instead of creating it.
+    """
+    global _gateway
+    if _gateway is None and create:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway(
+                    api_key=Config.GEMINI_API_KEY,
+                    max_concurrency=Config.LLM_MAX_CONCURRENCY,
+                    rate_limits=parse_rate_limits(Config.LLM_RATE_LIMITS),
+                    default_rpm=Config.LLM_DEFAULT_RPM,
+                    timeout=Config.LLM_TIMEOUT_SECONDS
+                )
+    return _gateway
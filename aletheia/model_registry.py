@@ -0,0 +1,238 @@
+# model_registry.py
+#
+# Like embedding_runtime.py, free of app config imports: bert_api.py ships this module on its own.
+import gc
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ModelKey = Tuple[str, str, str]  # (name, dtype, device)
+
+
+def _module_bytes(module) -> int:
+    """Bytes held by a torch module's state (parameters, buffers and packed quantized weights), counting shared storage once."""
+    seen, total = set(), 0
+    stack = list(module.state_dict(keep_vars=True).values())
+    while stack:
+        value = stack.pop()
+        if isinstance(value, (list, tuple)):
+            stack.extend(value)
+            continue
+        if not (hasattr(value, "numel") and hasattr(value, "element_size")):
+            continue
+        try:
+            pointer = value.data_ptr()
+        except Exception:
+            pointer = id(value)
+        if pointer in seen:
+            continue
+        seen.add(pointer)
+        total += value.numel() * value.element_size()
+    return total
+
+
+def estimate_model_bytes(obj, _seen=None, _depth: int = 0) -> int:
+    """
+    Approximate resident size of a loaded model object. Torch modules are measured
+    from their state; other objects may report `size_bytes` themselves (ONNX
+    sessions do), and containers or wrappers are searched a few attributes deep.
+    """
+    _seen = set() if _seen is None else _seen
+    if obj is None or id(obj) in _seen or _depth > 3:
+        return 0
+    _seen.add(id(obj))
+    if hasattr(obj, "state_dict") and hasattr(obj, "parameters"):
+        return _module_bytes(obj)
+    size = getattr(obj, "size_bytes", None)
+    if isinstance(size, int):
+        return size
+    if isinstance(obj, (list, tuple)):
+        children = obj
+    elif isinstance(obj, dict):
+        children = obj.values()
+    elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+        children = vars(obj).values()
+    else:
+        return 0
+    return sum(estimate_model_bytes(child, _seen, _depth + 1) for child in children)
+
+
+class _Entry:
+    def __init__(self, value: Any, size_bytes: int, load_seconds: float):
+        self.value = value
+        self.size_bytes = size_bytes
+        self.load_seconds = load_seconds
+        self.refcount = 0
+        self.last_used = time.time()
+
+
+class ModelRegistry:
+    """
+    Process-wide store of loaded local models, keyed by (name, dtype, device).
+
+    `acquire` loads a model at most once (concurrent callers for the same key wait
+    for the first load) and counts a reference; `release` drops it. Once the summed
+    resident size exceeds `memory_budget_bytes`, unreferenced models are unloaded
+    least recently used first. Callers should therefore hold a model only for as
+    long as they use it — `with registry.use(...)` — rather than keep their own
+    reference, or the memory cannot be reclaimed.
+    """
+    def __init__(self, memory_budget_bytes: int = 0):
+        self.memory_budget_bytes = memory_budget_bytes
+        self._entries: "OrderedDict[ModelKey, _Entry]" = OrderedDict()  # least recently used first
+        self._load_locks: Dict[ModelKey, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(name: str, dtype: Any = "float32", device: Any = "cpu") -> ModelKey:
+        return (name, str(dtype).replace("torch.", ""), str(device))
+
+    def _checkout(self, key: ModelKey):
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.refcount += 1
+            entry.last_used = time.time()
+            self._entries.move_to_end(key)
+        return entry
+
+    def acquire(self, name: str, loader: Callable[[], Any], dtype: Any = "float32", device: Any = "cpu") -> Any:
+        """Returns the model for the key, calling `loader()` if it is not resident, and counts a reference to it."""
+        key = self.key(name, dtype, device)
+        with self._lock:
+            entry = self._checkout(key)
+            if entry is not None:
+                return entry.value
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        with load_lock:
+            with self._lock:
+                entry = self._checkout(key)
+                if entry is not None:
+                    return entry.value
+            started = time.perf_counter()
+            value = loader()
+            entry = _Entry(value, estimate_model_bytes(value), time.perf_counter() - started)
+            entry.refcount = 1
+            with self._lock:
+                self._entries[key] = entry
+                self.loads += 1
+                evicted = self._evict_over_budget()
+            logger.info(f"Loaded model {key} in {entry.load_seconds:.1f}s "
+                        f"(~{entry.size_bytes / 2**20:.0f} MB, resident total ~{self.resident_bytes() / 2**20:.0f} MB)")
+        self._free(evicted)
+        return value
+
+    def release(self, name: str, dtype: Any = "float32", device: Any = "cpu"):
+        key = self.key(name, dtype, device)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.refcount == 0:
+                logger.warning(f"Release of model {key} without a matching acquire")
+                return
+            entry.refcount -= 1
+            entry.last_used = time.time()
+            evicted = self._evict_over_budget() if entry.refcount == 0 else []
+        self._free(evicted)
+
+    @contextmanager
+    def use(self, name: str, loader: Callable[[], Any], dtype: Any = "float32", device: Any = "cpu"):
+        value = self.acquire(name, loader, dtype, device)
+        try:
+            yield value
+        finally:
+            self.release(name, dtype, device)
+
+    def unload(self, name: str, dtype: Any = "float32", device: Any = "cpu") -> bool:
+        """Unloads a model now if nothing holds it. Returns whether it was unloaded."""
+        key = self.key(name, dtype, device)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.refcount:
+                return False
+            del self._entries[key]
+            self.evictions += 1
+        self._free([(key, entry)])
+        return True
+
+    def resident_bytes(self) -> int:
+        return sum(entry.size_bytes for entry in list(self._entries.values()))
+
+    def _evict_over_budget(self) -> List[Tuple[ModelKey, _Entry]]:
+        """Called with the lock held. Detaches unreferenced models, oldest first, until within budget."""
+        if not self.memory_budget_bytes:
+            return []
+        evicted = []
+        resident = self.resident_bytes()
+        for key in list(self._entries):
+            if resident <= self.memory_budget_bytes:
+                break
+            entry = self._entries[key]
+            if entry.refcount == 0:
+                del self._entries[key]
+                resident -= entry.size_bytes
+                evicted.append((key, entry))
+                self.evictions += 1
+        if resident > self.memory_budget_bytes:
+            logger.warning(f"Models in use (~{resident / 2**20:.0f} MB) exceed the "
+                           f"{self.memory_budget_bytes / 2**20:.0f} MB model memory budget")
+        return evicted
+
+    def _free(self, evicted: List[Tuple[ModelKey, _Entry]]):
+        if not evicted:
+            return
+        for key, entry in evicted:
+            logger.info(f"Unloaded model {key} (~{entry.size_bytes / 2**20:.0f} MB, "
+                        f"idle {time.time() - entry.last_used:.0f}s)")
+        evicted.clear()
+        gc.collect()
+        torch = sys.modules.get("torch")
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def stats(self) -> Dict:
+        now = time.time()
+        with self._lock:
+            return {
+                "memory_budget_mb": round(self.memory_budget_bytes / 2**20, 1) if self.memory_budget_bytes else None,
+                "resident_mb": round(self.resident_bytes() / 2**20, 1),
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "models": [
+                    {
+                        "name": name,
+                        "dtype": dtype,
+                        "device": device,
+                        "resident_mb": round(entry.size_bytes / 2**20, 1),
+                        "refcount": entry.refcount,
+                        "load_seconds": round(entry.load_seconds, 2),
+                        "idle_seconds": round(now - entry.last_used, 1)
+                    }
+                    for (name, dtype, device), entry in self._entries.items()
+                ]
+            }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry(create: bool = True) -> Optional[ModelRegistry]:
+    """
+    Returns the process-wide model registry. MODEL_MEMORY_BUDGET_MB caps resident models (0 = unlimited).
+    With create=False, returns None if it doesn't exist yet.
+    """
+    global _registry
+    if _registry is None and create:
+        with _registry_lock:
+            if _registry is None:
+                budget_mb = float(os.environ.get("MODEL_MEMORY_BUDGET_MB", 0))
+                _registry = ModelRegistry(int(budget_mb * 2**20))
+    return _registry
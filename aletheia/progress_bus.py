@@ -0,0 +1,171 @@
+# progress_bus.py
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Dict, Iterator, Optional
+
+from aletheia.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+# Sequence part of the id given to a job's synthesized outcome; nothing follows it
+FINAL_EVENT_SEQ = "final"
+
+
+def final_event_id(topic_name: str) -> str:
+    return f"{topic_name}:{FINAL_EVENT_SEQ}"
+
+
+def is_final_event_id(event_id: Optional[str]) -> bool:
+    return bool(event_id) and event_id.rpartition(":")[2] == FINAL_EVENT_SEQ
+
+
+def parse_event_id(event_id: Optional[str]):
+    """Splits a "<topic>:<seq>" event id. Returns (None, 0) for a missing or malformed id."""
+    if not event_id or ":" not in event_id:
+        return None, 0
+    topic, _, seq = event_id.rpartition(":")
+    try:
+        return topic, int(seq)
+    except ValueError:
+        return None, 0
+
+
+class _Topic:
+    def __init__(self, buffer_size: int):
+        self.events = deque(maxlen=buffer_size)
+        self.next_seq = 1
+        self.closed = False
+        self.subscribers = 0
+        self.cond = threading.Condition()
+
+
+class ProgressBus:
+    """
+    In-process publish/subscribe for progress events, one topic per job.
+
+    Each topic keeps its most recent `buffer_size` events in a ring buffer with
+    increasing sequence numbers, so a subscriber that reconnects with the id of
+    the last event it saw gets everything published since, then blocks until the
+    next event. Any number of subscribers can follow one topic. Closed topics are
+    dropped, least recently updated first, once there are more than `max_topics`.
+    """
+    def __init__(self, buffer_size: int = 256, max_topics: int = 500):
+        self.buffer_size = buffer_size
+        self.max_topics = max_topics
+        self._topics: "OrderedDict[str, _Topic]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def _topic(self, name: str) -> _Topic:
+        with self._lock:
+            topic = self._topics.get(name)
+            if topic is None:
+                topic = self._topics[name] = _Topic(self.buffer_size)
+                self._evict()
+            self._topics.move_to_end(name)
+            return topic
+
+    def _evict(self):
+        """Called with the lock held."""
+        excess = len(self._topics) - self.max_topics
+        for name in list(self._topics):
+            if excess <= 0:
+                break
+            topic = self._topics[name]
+            if topic.closed and not topic.subscribers:
+                del self._topics[name]
+                excess -= 1
+
+    def publish(self, topic_name: str, event_type: str, payload: Any = None) -> str:
+        """Appends an event to the topic, wakes its subscribers and returns the event id."""
+        topic = self._topic(topic_name)
+        with topic.cond:
+            event = {
+                "id": f"{topic_name}:{topic.next_seq}",
+                "seq": topic.next_seq,
+                "type": event_type,
+                "payload": payload if payload is not None else {}
+            }
+            topic.next_seq += 1
+            topic.events.append(event)
+            topic.cond.notify_all()
+        self.published += 1
+        return event["id"]
+
+    def close(self, topic_name: str):
+        """Marks the topic finished: subscribers drain the buffered events and stop."""
+        topic = self._topic(topic_name)
+        with topic.cond:
+            topic.closed = True
+            topic.cond.notify_all()
+
+    def last_seq(self, topic_name: str) -> int:
+        """Sequence number of the topic's latest event; 0 if nothing was published to it here."""
+        with self._lock:
+            topic = self._topics.get(topic_name)
+        return topic.next_seq - 1 if topic is not None else 0
+
+    def is_closed(self, topic_name: str) -> bool:
+        with self._lock:
+            topic = self._topics.get(topic_name)
+        return topic is not None and topic.closed
+
+    def subscribe(self, topic_name: str, after_seq: int = 0, heartbeat: float = 15.0) -> Iterator[Optional[Dict]]:
+        """
+        Yields the topic's events with a sequence number above `after_seq`, then new
+        ones as they are published, until the topic is closed. Yields None after
+        `heartbeat` seconds without an event, so callers can keep the connection alive.
+        If the requested events have already left the buffer, an `events_dropped`
+        event says how many were missed.
+        """
+        topic = self._topic(topic_name)
+        with topic.cond:
+            topic.subscribers += 1
+        try:
+            while True:
+                with topic.cond:
+                    pending = [event for event in topic.events if event["seq"] > after_seq]
+                    if not pending and not topic.closed:
+                        topic.cond.wait(heartbeat)
+                        pending = [event for event in topic.events if event["seq"] > after_seq]
+                    closed = topic.closed
+                if pending and pending[0]["seq"] > after_seq + 1:
+                    yield {"id": None, "seq": after_seq, "type": "events_dropped",
+                           "payload": {"missed": pending[0]["seq"] - after_seq - 1}}
+                for event in pending:
+                    after_seq = event["seq"]
+                    yield event
+                if not pending:
+                    if closed:
+                        return
+                    yield None
+        finally:
+            with topic.cond:
+                topic.subscribers -= 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            topics = list(self._topics.values())
+        return {
+            "topics": len(topics),
+            "open_topics": sum(1 for topic in topics if not topic.closed),
+            "subscribers": sum(topic.subscribers for topic in topics),
+            "published": self.published,
+            "buffer_size": self.buffer_size
+        }
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_progress_bus() -> ProgressBus:
+    """Returns the process-wide progress bus."""
+    global _bus
+    if _bus is None:
+        with _bus_lock:
+            if _bus is None:
+                _bus = ProgressBus(buffer_size=Config.PROGRESS_BUFFER_SIZE, max_topics=Config.PROGRESS_MAX_TOPICS)
+    return _bus
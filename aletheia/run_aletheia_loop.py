@@ -100,6 +100,8 @@ def main():
     parser = argparse.ArgumentParser(description="Run the Aletheia self-correcting ethical learning loop.")
     parser.add_argument("agent_id", type=str, help="The agent_id of the agent to run.")
     parser.add_argument("--cycles", type=int, default=1, help="The number of learning cycles to run.")
+    parser.add_argument("--pause", type=float, default=0,
+                        help="Seconds to wait between cycles. LLM request rates are already capped by the gateway (LLM_RATE_LIMITS).")
     args = parser.parse_args()
 
     try:
@@ -125,8 +127,8 @@ def main():
         success = run_single_cycle(agent, sim, oracle)
         if not success:
             break
-        # Be a good citizen and don't spam the API
-        time.sleep(15) 
+        if args.pause and i + 1 < args.cycles:
+            time.sleep(args.pause)
 
     client.close()
     logging.info("Aletheia learning loop finished.")
@@ -0,0 +1,166 @@
+# scenario_features.py
+import logging
+import random
+import re
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# Bump when the keyword tables or scoring below change, so the backfill recomputes stored features
+FEATURES_VERSION = 2
+
+# (bucket, lower bound inclusive, upper bound exclusive) on estimated_complexity; names match ScenarioComplexity values
+COMPLEXITY_BUCKETS = [
+    ('simple', 0.0, 1.0),
+    ('moderate', 1.0, 2.0),
+    ('complex', 2.0, 3.0),
+    ('extreme', 3.0, 10.0)
+]
+
+FRAMEWORK_KEYWORDS = {
+    'utilitarian': ['harm', 'benefit', 'consequence', 'utility', 'greatest good', 'happiness'],
+    'deontological': ['duty', 'right', 'wrong', 'rule', 'obligation', 'principle'],
+    'virtue_ethics': ['character', 'virtue', 'courage', 'compassion', 'wisdom', 'integrity'],
+    'care_ethics': ['relationship', 'care', 'responsibility', 'empathy', 'vulnerability']
+}
+STAKEHOLDER_PATTERNS = {
+    'individuals': ['person', 'people', 'individual', 'human', 'patient'],
+    'groups': ['group', 'community', 'society', 'population', 'family'],
+    'institutions': ['hospital', 'company', 'organization', 'government', 'institution'],
+    'vulnerable_populations': ['elderly', 'children', 'disabled', 'poor', 'minority']
+}
+HIGH_IMPACT_TERMS = ['death', 'life', 'harm', 'suffering', 'pain', 'critical', 'emergency']
+NUMBER_PATTERN = re.compile(r'\b(\d+)\b')
+
+
+def identify_relevant_frameworks(scenario: Dict) -> List[str]:
+    """Identify which ethical frameworks are most relevant."""
+    description = scenario.get('description', '').lower()
+    actions = ' '.join(scenario.get('actions', [])).lower()
+    text = f"{description} {actions}"
+    relevant_frameworks = [
+        framework for framework, keywords in FRAMEWORK_KEYWORDS.items()
+        if any(keyword in text for keyword in keywords)
+    ]
+    return relevant_frameworks or ['utilitarian']  # Default fallback
+
+
+def analyze_stakeholders(scenario: Dict) -> Dict[str, int]:
+    """Count stakeholder mentions per category in the scenario description."""
+    text = scenario.get('description', '').lower()
+    stakeholder_counts = {}
+    for category, patterns in STAKEHOLDER_PATTERNS.items():
+        count = sum(text.count(pattern) for pattern in patterns)
+        if count > 0:
+            stakeholder_counts[category] = count
+    return stakeholder_counts
+
+
+def calculate_moral_weight(scenario: Dict) -> float:
+    """Calculate the moral weight/importance of a scenario."""
+    description = scenario.get('description', '').lower()
+
+    # High-impact terms increase moral weight
+    moral_weight = sum(description.count(term) for term in HIGH_IMPACT_TERMS) * 0.2
+
+    # Number of people affected
+    people_numbers = [int(num) for num in NUMBER_PATTERN.findall(description) if 1 <= int(num) <= 1000000]
+    if people_numbers:
+        moral_weight += min(max(people_numbers) / 1000.0, 1.0)  # Scale to 0-1
+
+    return min(moral_weight, 1.0)  # Cap at 1.0
+
+
+def estimate_complexity(scenario: Dict) -> float:
+    """Complexity from the number of actions and the description length."""
+    actions = scenario.get('actions')
+    action_count = len(actions) if isinstance(actions, list) else 3  # Default action count
+    description = scenario.get('description')
+    description_length = len(description) if isinstance(description, str) else 100  # Default description length
+    return action_count * 0.2 + description_length * 0.001
+
+
+def complexity_bucket(estimated_complexity: float) -> Optional[str]:
+    for bucket, lower, upper in COMPLEXITY_BUCKETS:
+        if lower <= estimated_complexity < upper:
+            return bucket
+    return None
+
+
+def compute_scenario_features(scenario: Dict) -> Dict:
+    """Text-derived features of a scenario, stored on the document under `features`."""
+    return {
+        'ethical_frameworks_relevant': identify_relevant_frameworks(scenario),
+        'stakeholder_analysis': analyze_stakeholders(scenario),
+        'moral_weight_score': calculate_moral_weight(scenario),
+        'version': FEATURES_VERSION
+    }
+
+
+def precomputed_fields(scenario: Dict) -> Dict:
+    """
+    Every derived field stored on a scenario document: the text features, and the
+    indexed complexity, bucket and random key used for selection. An existing
+    random key is kept so recomputing features doesn't reshuffle sampling.
+    """
+    estimated = estimate_complexity(scenario)
+    return {
+        'features': compute_scenario_features(scenario),
+        'estimated_complexity': estimated,
+        'complexity_bucket': complexity_bucket(estimated),
+        'random_key': scenario.get('random_key', random.random())
+    }
+
+
+def with_scenario_features(scenario: Dict) -> Dict:
+    """Attaches freshly computed features to a scenario document before it is inserted."""
+    scenario.update(precomputed_fields(scenario))
+    return scenario
+
+
+def has_current_features(scenario: Dict) -> bool:
+    return (scenario.get('features') or {}).get('version') == FEATURES_VERSION
+
+
+def ensure_scenario_feature_indexes(collection):
+    try:
+        collection.create_index('features.ethical_frameworks_relevant', background=True)
+        collection.create_index('features.moral_weight_score', background=True)
+        collection.create_index('features.version', background=True)
+        collection.create_index('estimated_complexity', background=True)
+        # Equality on the bucket plus a range on random_key: one index seek per random pick
+        collection.create_index([('complexity_bucket', 1), ('random_key', 1)], background=True)
+    except Exception as e:
+        logger.warning(f"Scenario feature index creation failed: {e}")
+
+
+def backfill_scenario_features(collection, batch_size: int = 500) -> int:
+    """Computes features for every scenario missing them or carrying an older version. Returns the number updated."""
+    ensure_scenario_feature_indexes(collection)
+    cursor = collection.find(
+        {'features.version': {'$ne': FEATURES_VERSION}},
+        {'description': 1, 'actions': 1, 'random_key': 1}
+    ).batch_size(batch_size)
+    updated, operations = 0, []
+    for scenario in cursor:
+        operations.append(UpdateOne({'_id': scenario['_id']},
+                                    {'$set': precomputed_fields(scenario)}))
+        if len(operations) >= batch_size:
+            updated += collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        updated += collection.bulk_write(operations, ordered=False).modified_count
+    logger.info(f"Backfilled features for {updated} scenarios in '{collection.name}'")
+    return updated
+
+
+if __name__ == "__main__":
+    from pymongo import MongoClient
+    from aletheia.config import Config
+
+    logging.basicConfig(level=logging.INFO)
+    client = MongoClient(Config.MONGODB_URI)
+    backfill_scenario_features(client[Config.DATABASE_NAME][Config.SCENARIOS_COLLECTION])
+    client.close()
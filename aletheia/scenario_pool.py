@@ -0,0 +1,90 @@
+# scenario_pool.py
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import pymongo
+
+from aletheia.scenario_features import complexity_bucket, estimate_complexity
+
+logger = logging.getLogger(__name__)
+
+
+class ScenarioPool:
+    """
+    In-memory copy of the scenario library grouped by complexity bucket, so a
+    random pick is a list index instead of a database query.
+
+    The pool reloads once `ttl_seconds` have passed, and right after any write to
+    the collection when change streams are available (replica sets and Atlas).
+    Callers get a shallow copy of the stored document.
+    """
+    def __init__(self, collection, ttl_seconds: float = 300, use_change_streams: bool = True):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self._buckets: Dict[str, List[Dict]] = {}
+        self._all: List[Dict] = []
+        self._loaded_at = 0.0
+        self._stale = True
+        self._lock = threading.Lock()
+        self.reloads = 0
+        self.change_streams_active = False
+        if use_change_streams:
+            threading.Thread(target=self._watch, name="scenario-pool-watch", daemon=True).start()
+
+    def _watch(self):
+        while True:
+            try:
+                with self.collection.watch() as stream:
+                    self.change_streams_active = True
+                    for _ in stream:
+                        self._stale = True
+            except pymongo.errors.OperationFailure as e:
+                # Standalone servers don't support change streams; the TTL still bounds staleness
+                logger.info(f"Scenario pool change stream unavailable, refreshing every {self.ttl_seconds:.0f}s: {e}")
+                self.change_streams_active = False
+                return
+            except Exception as e:
+                logger.warning(f"Scenario pool change stream interrupted, reconnecting: {e}")
+            self.change_streams_active = False
+            self._stale = True
+            time.sleep(5)
+
+    def _reload(self):
+        # Cleared before reading, so a change that lands mid-load triggers another reload
+        self._stale = False
+        buckets = defaultdict(list)
+        scenarios = list(self.collection.find({}))
+        for scenario in scenarios:
+            # Scenarios not yet backfilled still get bucketed
+            bucket = scenario.get('complexity_bucket') or complexity_bucket(estimate_complexity(scenario))
+            buckets[bucket].append(scenario)
+        self._buckets, self._all = dict(buckets), scenarios
+        self._loaded_at = time.monotonic()
+        self.reloads += 1
+        logger.info(f"Scenario pool loaded {len(scenarios)} scenarios "
+                    f"({', '.join(f'{name}={len(docs)}' for name, docs in self._buckets.items())})")
+
+    def _refresh_if_needed(self):
+        if self._stale or time.monotonic() - self._loaded_at > self.ttl_seconds:
+            with self._lock:
+                if self._stale or time.monotonic() - self._loaded_at > self.ttl_seconds:
+                    self._reload()
+
+    def sample(self, bucket: Optional[str] = None) -> Optional[Dict]:
+        """A random scenario from `bucket`, or from the whole library when no bucket is given."""
+        self._refresh_if_needed()
+        candidates = self._all if bucket is None else self._buckets.get(bucket)
+        return dict(random.choice(candidates)) if candidates else None
+
+    def stats(self) -> Dict:
+        return {
+            "size": len(self._all),
+            "buckets": {name: len(docs) for name, docs in self._buckets.items()},
+            "reloads": self.reloads,
+            "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None,
+            "change_streams_active": self.change_streams_active
+        }
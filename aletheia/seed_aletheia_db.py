@@ -7,6 +7,7 @@ from bson.objectid import ObjectId
 # Add project root to path to allow importing config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import Config
+from aletheia.scenario_features import ensure_scenario_feature_indexes, with_scenario_features
 
 def seed_database():
     """
@@ -63,7 +64,8 @@ def seed_database():
     try:
         scenarios_collection = db[Config.SCENARIOS_COLLECTION]
         scenarios_collection.drop() # Clear existing scenarios
-        scenarios_collection.insert_many(scenarios)
+        scenarios_collection.insert_many([with_scenario_features(s) for s in scenarios])
+        ensure_scenario_feature_indexes(scenarios_collection)
         print(f"Successfully seeded {len(scenarios)} scenarios into '{Config.SCENARIOS_COLLECTION}'.")
     except Exception as e:
         print(f"Error seeding scenarios: {e}")
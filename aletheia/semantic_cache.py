@@ -0,0 +1,117 @@
+# semantic_cache.py
+import logging
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Same criteria check_wisdom_cache has always used for reusable responses
+APPROVED_FILTER = {"feedback_score": {"$gte": 4}, "is_approved": True}
+
+
+def is_reusable(entry: dict) -> bool:
+    """Whether a wisdom cache entry satisfies APPROVED_FILTER."""
+    score = entry.get("feedback_score")
+    return bool(entry.get("is_approved")) and score is not None and score >= 4
+
+
+class SemanticWisdomIndex:
+    """
+    In-memory index over the `query_embedding` of approved wisdom cache entries.
+
+    Vectors are kept L2-normalized in a single float32 matrix so a lookup is one
+    matrix-vector product. The matrix is loaded from Mongo on first use and then
+    maintained incrementally through `upsert`/`remove` as feedback arrives.
+    """
+    def __init__(self, collection, threshold: float = 0.92, top_k: int = 3):
+        self.collection = collection
+        self.threshold = threshold
+        self.top_k = top_k
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._matrix = None
+        self._ids = []
+        self._row_of = {}
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            ids, vectors = [], []
+            for doc in self.collection.find(APPROVED_FILTER, {"query_embedding": 1}):
+                embedding = doc.get("query_embedding")
+                if embedding:
+                    ids.append(doc["_id"])
+                    vectors.append(embedding)
+            self._set_rows(ids, vectors)
+            self._loaded = True
+            logger.info(f"Semantic wisdom cache index loaded with {len(ids)} approved entries")
+
+    def _set_rows(self, ids, vectors):
+        matrix = np.asarray(vectors, dtype=np.float32) if vectors else None
+        if matrix is not None:
+            matrix /= np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+        self._matrix = matrix
+        self._ids = list(ids)
+        self._row_of = {entry_id: row for row, entry_id in enumerate(self._ids)}
+
+    def upsert(self, entry_id, embedding: List[float]):
+        """Adds or replaces one approved entry without reloading the collection."""
+        if not embedding:
+            return
+        self._ensure_loaded()
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector /= max(float(np.linalg.norm(vector)), 1e-12)
+        with self._lock:
+            if self._matrix is not None and self._matrix.shape[1] != vector.shape[0]:
+                logger.warning(f"Skipping wisdom cache entry {entry_id}: embedding dimension {vector.shape[0]} "
+                               f"does not match index dimension {self._matrix.shape[1]}")
+                return
+            row = self._row_of.get(entry_id)
+            if row is not None:
+                self._matrix[row] = vector
+            elif self._matrix is None:
+                self._set_rows([entry_id], [vector])
+            else:
+                self._matrix = np.vstack([self._matrix, vector[None, :]])
+                self._row_of[entry_id] = len(self._ids)
+                self._ids.append(entry_id)
+
+    def remove(self, entry_id):
+        """Drops an entry that is no longer approved."""
+        self._ensure_loaded()
+        with self._lock:
+            row = self._row_of.get(entry_id)
+            if row is None:
+                return
+            self._matrix = np.delete(self._matrix, row, axis=0)
+            self._ids = self._ids[:row] + self._ids[row + 1:]
+            self._row_of = {eid: r for r, eid in enumerate(self._ids)}
+            if not self._ids:
+                self._matrix = None
+
+    def lookup(self, embedding: List[float], threshold: Optional[float] = None,
+               top_k: Optional[int] = None) -> List[Tuple[object, float]]:
+        """Returns up to top_k (entry_id, cosine similarity) pairs above threshold, best first."""
+        self._ensure_loaded()
+        threshold = self.threshold if threshold is None else threshold
+        top_k = self.top_k if top_k is None else top_k
+        with self._lock:
+            matrix, ids = self._matrix, self._ids
+        if matrix is None or not embedding or len(embedding) != matrix.shape[1]:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        sims = matrix @ query
+        k = min(top_k, len(sims))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return [(ids[i], float(sims[i])) for i in top if sims[i] >= threshold]
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._ids)
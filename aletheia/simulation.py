@@ -2,14 +2,22 @@ import logging
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 import random
+import threading
 from dataclasses import dataclass
 from enum import Enum
 import json
 
 from aletheia.config import Config
+from aletheia.constitution_versions import get_constitution_versions
+from aletheia.scenario_features import (
+    backfill_scenario_features, ensure_scenario_feature_indexes, has_current_features, precomputed_fields
+)
+from aletheia.scenario_pool import ScenarioPool
 
 logger = logging.getLogger(__name__)
 
+PERFORMANCE_WINDOW = 10  # interactions behind an agent's adaptive difficulty metrics
+
 class ScenarioComplexity(Enum):
     """Scenario difficulty levels."""
     SIMPLE = "simple"
@@ -36,6 +44,17 @@ class Simulation:
         self.db = db
         self.scenarios_collection = self.db[Config.SCENARIOS_COLLECTION]
         self.history_collection = self.db[Config.LEARNING_HISTORY_COLLECTION]
+        # One small document per agent: the last PERFORMANCE_WINDOW interaction scores, keyed by agent_id
+        self.performance_collection = self.db[Config.AGENT_PERFORMANCE_COLLECTION]
+        ensure_scenario_feature_indexes(self.scenarios_collection)
+        # Scenarios stored before features were precomputed have no bucket or random key, so
+        # bucket sampling can't reach them until they are backfilled; done once, in the background
+        threading.Thread(target=self._backfill_scenarios, name="scenario-backfill", daemon=True).start()
+        self.scenario_pool = ScenarioPool(
+            self.scenarios_collection,
+            ttl_seconds=Config.SCENARIO_POOL_TTL_SECONDS,
+            use_change_streams=Config.SCENARIO_POOL_CHANGE_STREAMS
+        ) if Config.SCENARIO_POOL_ENABLED else None
         
         # Initialize analytics collection with error handling
         try:
@@ -106,6 +125,15 @@ class Simulation:
     def get_random_scenario(self) -> Optional[Dict[str, Any]]:
         """Get a random scenario with enhanced error handling."""
         try:
+            if self.scenario_pool is not None:
+                scenario = self.scenario_pool.sample()
+                if scenario:
+                    scenario.update({"retrieved_at": datetime.utcnow(), "selection_method": "random"})
+                    logger.info(f"Retrieved random scenario: '{scenario['title']}'")
+                    return self._enhance_scenario_metadata(scenario, ScenarioComplexity.MODERATE)
+                logger.error("No scenarios found in database")
+                return None
+            
             # Use aggregation for better randomization
             pipeline = [
                 {"$sample": {"size": 1}},
@@ -130,47 +158,62 @@ class Simulation:
             return None
 
     def _analyze_agent_performance(self, agent_id: str) -> Dict[str, float]:
-        """Analyze agent's historical performance."""
+        """Analyze agent's recent performance from its rolling summary document."""
         try:
-            # Get recent learning history
-            recent_interactions = list(
-                self.history_collection.find(
-                    {"agent_id": agent_id}
-                ).sort("timestamp", -1).limit(10)
-            )
+            summary = self.performance_collection.find_one({"_id": agent_id}, {"window": 1})
+            if summary is None:
+                summary = self._seed_performance_summary(agent_id)
+            window = (summary or {}).get("window") or []
             
-            if not recent_interactions:
+            if not window:
                 return {"average_score": 0.5, "consistency": 0.5, "learning_rate": 0.5}
             
-            # Calculate performance metrics
-            performance_scores = []
-            constitutional_changes = 0
-            
-            for interaction in recent_interactions:
-                # Evaluate decision quality (simplified scoring)
-                reflection = interaction.get('agent_reflection', {})
-                if reflection.get('proposed_constitution') != reflection.get('current_constitution'):
-                    constitutional_changes += 1
-                
-                # Score based on reflection quality and critique alignment
-                score = self._score_interaction_quality(interaction)
-                performance_scores.append(score)
-            
+            performance_scores = [entry["score"] for entry in window]
             avg_score = sum(performance_scores) / len(performance_scores)
             consistency = 1.0 - (max(performance_scores) - min(performance_scores))
-            learning_rate = constitutional_changes / len(recent_interactions)
+            learning_rate = sum(1 for entry in window if entry["changed"]) / len(window)
             
             return {
                 "average_score": avg_score,
                 "consistency": max(0, consistency),
                 "learning_rate": learning_rate,
-                "interaction_count": len(recent_interactions)
+                "interaction_count": len(window)
             }
             
         except Exception as e:
             logger.error(f"Performance analysis failed: {e}")
             return {"average_score": 0.5, "consistency": 0.5, "learning_rate": 0.5}
 
+    def _seed_performance_summary(self, agent_id: str) -> Optional[Dict]:
+        """Builds the summary for an agent whose history predates it, from its last PERFORMANCE_WINDOW interactions."""
+        recent_interactions = list(
+            self.history_collection.find(
+                {"agent_id": agent_id},
+                {"agent_reflection": 1, "decision_quality_score": 1, "constitutional_change_detected": 1}
+            ).sort("timestamp", -1).limit(PERFORMANCE_WINDOW)
+        )
+        if not recent_interactions:
+            return None
+        window = [self._performance_entry(interaction) for interaction in reversed(recent_interactions)]
+        # $setOnInsert: an interaction logged meanwhile has already created the document and wins
+        result = self.performance_collection.update_one(
+            {"_id": agent_id},
+            {"$setOnInsert": {"window": window, "interaction_count": len(window), "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+        return {"window": window, "seeded": result.upserted_id is not None}
+
+    def _performance_entry(self, interaction: Dict) -> Dict:
+        reflection = interaction.get('agent_reflection', {})
+        score = interaction.get('decision_quality_score')
+        changed = interaction.get('constitutional_change_detected')
+        return {
+            "score": score if score is not None else self._score_interaction_quality(interaction),
+            "changed": changed if changed is not None else (
+                reflection.get('proposed_constitution') != reflection.get('current_constitution')
+            )
+        }
+
     def _score_interaction_quality(self, interaction: Dict) -> float:
         """Score the quality of an agent interaction."""
         score = 0.5  # Base score
@@ -228,71 +271,12 @@ class Simulation:
             return ScenarioComplexity.EXTREME
 
     def _get_scenario_by_complexity(self, complexity: ScenarioComplexity) -> Optional[Dict]:
-        """Retrieve scenario matching specified complexity."""
+        """Retrieve a random scenario from the complexity bucket, from the in-memory pool or one index seek."""
         try:
-            # First check if we have any scenarios
-            if self.scenarios_collection.count_documents({}) == 0:
-                logger.warning("No scenarios in database for complexity-based selection")
-                return None
-            
-            # Query scenarios with complexity metadata
-            # For now, we'll use a simple approach based on action count and description length
-            pipeline = []
-            
-            # Add fields only if they exist
-            pipeline.append({
-                "$addFields": {
-                    "action_count": {
-                        "$cond": {
-                            "if": {"$isArray": "$actions"},
-                            "then": {"$size": "$actions"},
-                            "else": 3  # Default action count
-                        }
-                    },
-                    "description_length": {
-                        "$cond": {
-                            "if": {"$type": "$description"},
-                            "then": {"$strLenCP": "$description"},
-                            "else": 100  # Default description length
-                        }
-                    }
-                }
-            })
-            
-            pipeline.append({
-                "$addFields": {
-                    "estimated_complexity": {
-                        "$add": [
-                            {"$multiply": ["$action_count", 0.2]},
-                            {"$multiply": ["$description_length", 0.001]}
-                        ]
-                    }
-                }
-            })
-            
-            # Filter by complexity range
-            complexity_ranges = {
-                ScenarioComplexity.SIMPLE: (0, 1.0),
-                ScenarioComplexity.MODERATE: (1.0, 2.0),
-                ScenarioComplexity.COMPLEX: (2.0, 3.0),
-                ScenarioComplexity.EXTREME: (3.0, 10.0)
-            }
-            
-            min_complexity, max_complexity = complexity_ranges[complexity]
-            pipeline.extend([
-                {
-                    "$match": {
-                        "estimated_complexity": {
-                            "$gte": min_complexity,
-                            "$lt": max_complexity
-                        }
-                    }
-                },
-                {"$sample": {"size": 1}}
-            ])
-            
-            cursor = self.scenarios_collection.aggregate(pipeline)
-            scenario = next(cursor, None)
+            if self.scenario_pool is not None:
+                scenario = self.scenario_pool.sample(complexity.value)
+            else:
+                scenario = self._sample_bucket(complexity.value)
             
             if scenario:
                 return scenario
@@ -305,24 +289,60 @@ class Simulation:
             logger.warning(f"Complexity-based scenario retrieval failed: {e}")
             return None
 
+    def _sample_bucket(self, bucket: str) -> Optional[Dict]:
+        """
+        Random pick within a bucket via the (complexity_bucket, random_key) index:
+        the first scenario at or after a random point, wrapping around to the last one before it.
+        """
+        point = random.random()
+        scenario = self.scenarios_collection.find_one(
+            {"complexity_bucket": bucket, "random_key": {"$gte": point}}, sort=[("random_key", 1)]
+        )
+        if scenario is None:
+            scenario = self.scenarios_collection.find_one(
+                {"complexity_bucket": bucket, "random_key": {"$lt": point}}, sort=[("random_key", -1)]
+            )
+        return scenario
+
     def _enhance_scenario_metadata(self, scenario: Dict, 
                                   complexity: ScenarioComplexity) -> Dict:
-        """Add enhanced metadata to scenario."""
+        """Add enhanced metadata to scenario from its precomputed features."""
         if not scenario:
             return scenario
         
+        features = scenario.get('features')
+        if not has_current_features(scenario):
+            features = self._store_scenario_features(scenario)
+        
         # Add complexity and timing metadata
         scenario['metadata'] = {
             'complexity': complexity.value,
             'estimated_decision_time_minutes': self._estimate_decision_time(complexity),
-            'ethical_frameworks_relevant': self._identify_relevant_frameworks(scenario),
-            'stakeholder_analysis': self._analyze_stakeholders(scenario),
-            'moral_weight_score': self._calculate_moral_weight(scenario),
+            'ethical_frameworks_relevant': features['ethical_frameworks_relevant'],
+            'stakeholder_analysis': features['stakeholder_analysis'],
+            'moral_weight_score': features['moral_weight_score'],
             'selection_timestamp': datetime.utcnow().isoformat()
         }
         
         return scenario
 
+    def _backfill_scenarios(self):
+        try:
+            backfill_scenario_features(self.scenarios_collection)
+        except Exception as e:
+            logger.warning(f"Scenario feature backfill failed: {e}")
+
+    def _store_scenario_features(self, scenario: Dict) -> Dict:
+        """Computes features for a scenario inserted before they were precomputed, and saves them for next time."""
+        fields = precomputed_fields(scenario)
+        scenario.update(fields)
+        if scenario.get('_id') is not None:
+            try:
+                self.scenarios_collection.update_one({'_id': scenario['_id']}, {'$set': fields})
+            except Exception as e:
+                logger.warning(f"Could not store features for scenario {scenario['_id']}: {e}")
+        return fields['features']
+
     def _estimate_decision_time(self, complexity: ScenarioComplexity) -> int:
         """Estimate decision time based on complexity."""
         time_mapping = {
@@ -333,71 +353,6 @@ class Simulation:
         }
         return time_mapping.get(complexity, 5)
 
-    def _identify_relevant_frameworks(self, scenario: Dict) -> List[str]:
-        """Identify which ethical frameworks are most relevant."""
-        description = scenario.get('description', '').lower()
-        actions = ' '.join(scenario.get('actions', [])).lower()
-        text = f"{description} {actions}"
-        
-        framework_keywords = {
-            'utilitarian': ['harm', 'benefit', 'consequence', 'utility', 'greatest good', 'happiness'],
-            'deontological': ['duty', 'right', 'wrong', 'rule', 'obligation', 'principle'],
-            'virtue_ethics': ['character', 'virtue', 'courage', 'compassion', 'wisdom', 'integrity'],
-            'care_ethics': ['relationship', 'care', 'responsibility', 'empathy', 'vulnerability']
-        }
-        
-        relevant_frameworks = []
-        for framework, keywords in framework_keywords.items():
-            if any(keyword in text for keyword in keywords):
-                relevant_frameworks.append(framework)
-        
-        return relevant_frameworks or ['utilitarian']  # Default fallback
-
-    def _analyze_stakeholders(self, scenario: Dict) -> Dict[str, int]:
-        """Analyze stakeholders mentioned in the scenario."""
-        text = scenario.get('description', '').lower()
-        
-        stakeholder_patterns = {
-            'individuals': ['person', 'people', 'individual', 'human', 'patient'],
-            'groups': ['group', 'community', 'society', 'population', 'family'],
-            'institutions': ['hospital', 'company', 'organization', 'government', 'institution'],
-            'vulnerable_populations': ['elderly', 'children', 'disabled', 'poor', 'minority']
-        }
-        
-        stakeholder_counts = {}
-        for category, patterns in stakeholder_patterns.items():
-            count = sum(text.count(pattern) for pattern in patterns)
-            if count > 0:
-                stakeholder_counts[category] = count
-        
-        return stakeholder_counts
-
-    def _calculate_moral_weight(self, scenario: Dict) -> float:
-        """Calculate the moral weight/importance of a scenario."""
-        description = scenario.get('description', '').lower()
-        
-        # High-impact terms increase moral weight
-        high_impact_terms = ['death', 'life', 'harm', 'suffering', 'pain', 'critical', 'emergency']
-        moral_weight = sum(description.count(term) for term in high_impact_terms) * 0.2
-        
-        # Number of people affected
-        people_numbers = []
-        import re
-        numbers = re.findall(r'\b(\d+)\b', description)
-        for num_str in numbers:
-            try:
-                num = int(num_str)
-                if 1 <= num <= 1000000:  # Reasonable range for people count
-                    people_numbers.append(num)
-            except ValueError:
-                continue
-        
-        if people_numbers:
-            max_affected = max(people_numbers)
-            moral_weight += min(max_affected / 1000.0, 1.0)  # Scale to 0-1
-        
-        return min(moral_weight, 1.0)  # Cap at 1.0
-
     def log_enhanced_interaction(self, agent_id: str, agent_version: int, scenario: Dict,
                                decision: Dict, oracle_context: str, reflection: Dict,
                                performance_metrics: Optional[Dict] = None):
@@ -432,6 +387,10 @@ class Simulation:
         try:
             # Log to main history collection
             result = self.history_collection.insert_one(log_entry.copy())
+            self._update_performance_summary(agent_id, log_entry)
+            if log_entry["constitution_after_reflection"] is not None:
+                # The reflection recorded its version before this interaction had an id
+                get_constitution_versions(self.db).link_interaction(agent_id, agent_version + 1, result.inserted_id)
             
             # Log to analytics collection with additional processing if available
             if self.analytics_collection is not None:
@@ -447,6 +406,27 @@ class Simulation:
         except Exception as e:
             logger.error(f"Failed to log enhanced interaction: {e}", exc_info=True)
 
+    def _update_performance_summary(self, agent_id: str, log_entry: Dict):
+        """
+        Appends the interaction to the agent's rolling window in one atomic update. An agent
+        without a summary yet gets one seeded from its last PERFORMANCE_WINDOW history
+        entries, which already include this interaction.
+        """
+        append = {
+            "$push": {"window": {"$each": [self._performance_entry(log_entry)], "$slice": -PERFORMANCE_WINDOW}},
+            "$inc": {"interaction_count": 1},
+            "$set": {"updated_at": log_entry["timestamp"]}
+        }
+        try:
+            if self.performance_collection.update_one({"_id": agent_id}, append).matched_count:
+                return
+            seeded = self._seed_performance_summary(agent_id)
+            if seeded is None or not seeded["seeded"]:
+                # Nothing to seed from, or another interaction created the summary first
+                self.performance_collection.update_one({"_id": agent_id}, append, upsert=True)
+        except Exception as e:
+            logger.warning(f"Failed to update performance summary for agent {agent_id}: {e}")
+
     def get_learning_analytics(self, agent_id: str, days: int = 30) -> Dict[str, Any]:
         """
         Generate comprehensive learning analytics for an agent.
@@ -465,6 +445,16 @@ class Simulation:
                         "timestamp": {"$gte": cutoff_date}
                     }
                 },
+                # Only the scalar fields the summary needs; never the critique context or reflection
+                {
+                    "$project": {
+                        "_id": 0,
+                        "decision_quality_score": 1,
+                        "constitutional_change_detected": 1,
+                        "scenario_complexity": 1,
+                        "agent_version_before_reflection": 1
+                    }
+                },
                 {
                     "$group": {
                         "_id": None,
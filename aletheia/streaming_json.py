@@ -0,0 +1,85 @@
+# streaming_json.py
+import json
+import logging
+from typing import Any, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingJSONFields:
+    """
+    Incrementally scans a streamed JSON object and reports top-level fields as soon
+    as their value is complete.
+
+    Only the characters received since the last `feed` are scanned, so the cost over
+    a whole response is linear in its length. Anything before the opening brace
+    (e.g. a ```json fence) is ignored. Nested values are returned once fully closed.
+    """
+    def __init__(self, fields: Iterable[str]):
+        self.fields = set(fields)
+        self.emitted = set()
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None
+        self._key = None
+        self._value_start = None
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Consumes a chunk of model output; returns the (field, value) pairs completed by it."""
+        self._text += chunk
+        completed = []
+        text = self._text
+        while self._pos < len(text):
+            i = self._pos
+            ch = text[i]
+            self._pos += 1
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._value_start is None:
+                        self._last_string = text[self._string_start:i + 1]
+                continue
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1 and self._value_start is None:
+                    self._string_start = i
+            elif ch == ":" and self._depth == 1 and self._value_start is None:
+                try:
+                    self._key = json.loads(self._last_string)
+                except (TypeError, json.JSONDecodeError):
+                    self._key = None
+                self._value_start = self._pos
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    completed.extend(self._complete_value(i))
+            elif ch == "," and self._depth == 1:
+                completed.extend(self._complete_value(i))
+        return completed
+
+    def _complete_value(self, end: int) -> List[Tuple[str, Any]]:
+        key, start = self._key, self._value_start
+        self._key, self._value_start = None, None
+        if start is None or key not in self.fields or key in self.emitted:
+            return []
+        try:
+            value = json.loads(self._text[start:end])
+        except json.JSONDecodeError as e:
+            logger.debug(f"Could not parse streamed value for '{key}': {e}")
+            return []
+        self.emitted.add(key)
+        return [(key, value)]
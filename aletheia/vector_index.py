@@ -0,0 +1,270 @@
+# vector_index.py
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from aletheia.config import Config
+
+logger = logging.getLogger(__name__)
+
+try:
+    import hnswlib
+    HNSWLIB_AVAILABLE = True
+except ImportError:
+    HNSWLIB_AVAILABLE = False
+
+# Every field either caller projects today; the local snapshot keeps all of them.
+SNAPSHOT_FIELDS = ("text", "author", "source", "ethical_framework", "concepts", "era", "text_hash")
+# Rows upcast to float32 at a time during a brute-force scan of a float16 snapshot
+SCAN_BLOCK_ROWS = 65_536
+
+
+def _atlas_cosine_score(cosine):
+    """Atlas reports cosine similarity rescaled to [0, 1]; match it so scores stay comparable."""
+    return (1.0 + cosine) / 2.0
+
+
+class AtlasVectorBackend:
+    """Retrieval through MongoDB Atlas `$vectorSearch` (the original behaviour)."""
+
+    name = "atlas"
+
+    def __init__(self, collection, index_name: str):
+        self.collection = collection
+        self.index_name = index_name
+
+    def _pipeline(self, query_vector: List[float], limit: int, fields: List[str],
+                  num_candidates: Optional[int], include_id: bool) -> List[Dict]:
+        projection = {field: 1 for field in fields}
+        if not include_id:
+            projection["_id"] = 0
+        projection["score"] = {"$meta": "vectorSearchScore"}
+        return [
+            {
+                "$vectorSearch": {
+                    "index": self.index_name,
+                    "path": "embedding",
+                    "queryVector": query_vector,
+                    "numCandidates": num_candidates or limit * 10,
+                    "limit": limit
+                }
+            },
+            {"$project": projection}
+        ]
+
+    def search(self, query_vector: List[float], limit: int, fields: List[str],
+               num_candidates: Optional[int] = None, include_id: bool = True) -> List[Dict]:
+        pipeline = self._pipeline(query_vector, limit, fields, num_candidates, include_id)
+        return list(self.collection.aggregate(pipeline))
+
+    async def asearch(self, query_vector: List[float], limit: int, fields: List[str],
+                      num_candidates: Optional[int] = None, include_id: bool = True,
+                      motor_collection=None) -> List[Dict]:
+        """Non-blocking search through Motor, or the blocking client on a worker thread."""
+        if motor_collection is None:
+            return await asyncio.to_thread(self.search, query_vector, limit, fields, num_candidates, include_id)
+        pipeline = self._pipeline(query_vector, limit, fields, num_candidates, include_id)
+        return await motor_collection.aggregate(pipeline).to_list(length=limit)
+
+
+class LocalVectorBackend:
+    """
+    In-process retrieval over a memory-mapped snapshot of the corpus embeddings.
+
+    `snapshot()` copies every `embedding` in the collection into a normalized
+    float32/float16 matrix on disk plus a JSON sidecar with the projected fields.
+    Queries are a single matrix-vector product and an argpartition; corpora above
+    LOCAL_INDEX_HNSW_THRESHOLD rows use an HNSW graph when hnswlib is installed.
+    """
+
+    name = "local"
+
+    def __init__(self, collection, index_dir: str, dtype: str = "float32",
+                 hnsw_threshold: int = 200_000):
+        self.collection = collection
+        self.index_dir = index_dir
+        self.dtype = np.dtype(dtype)
+        self.hnsw_threshold = hnsw_threshold
+        self._lock = threading.Lock()
+        # Serializes snapshot builds so concurrent first queries scan the collection once
+        self._build_lock = threading.Lock()
+        self.matrix = None
+        self.metadata = []
+        self.hnsw = None
+
+    @property
+    def _matrix_path(self):
+        return os.path.join(self.index_dir, "embeddings.npy")
+
+    @property
+    def _metadata_path(self):
+        return os.path.join(self.index_dir, "metadata.jsonl")
+
+    @property
+    def _hnsw_path(self):
+        return os.path.join(self.index_dir, "hnsw.bin")
+
+    def _tmp_path(self, path: str) -> str:
+        """A temp name unique to this process and thread, so concurrent builds never share a file."""
+        root, ext = os.path.splitext(path)
+        return f"{root}.{os.getpid()}.{threading.get_ident()}.tmp{ext}"
+
+    def snapshot(self) -> int:
+        """Rebuilds the on-disk snapshot from the collection and loads it. Returns the row count."""
+        with self._build_lock:
+            return self._build_snapshot()
+
+    def _build_snapshot(self) -> int:
+        start = time.perf_counter()
+        os.makedirs(self.index_dir, exist_ok=True)
+        projection = {field: 1 for field in SNAPSHOT_FIELDS}
+        projection["embedding"] = 1
+        cursor = self.collection.find({"embedding": {"$exists": True}}, projection)
+
+        vectors, metadata = [], []
+        for doc in cursor:
+            embedding = doc.pop("embedding", None)
+            if not embedding:
+                continue
+            doc["_id"] = str(doc["_id"])
+            vectors.append(embedding)
+            metadata.append(doc)
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if len(matrix):
+            matrix /= np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+        tmp_matrix = self._tmp_path(self._matrix_path)
+        np.save(tmp_matrix, matrix.astype(self.dtype))
+        os.replace(tmp_matrix, self._matrix_path)
+        tmp_meta = self._tmp_path(self._metadata_path)
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            for doc in metadata:
+                f.write(json.dumps(doc, default=str) + "\n")
+        os.replace(tmp_meta, self._metadata_path)
+
+        if HNSWLIB_AVAILABLE and len(matrix) >= self.hnsw_threshold:
+            index = hnswlib.Index(space="ip", dim=matrix.shape[1])
+            index.init_index(max_elements=len(matrix), ef_construction=200, M=16)
+            index.add_items(matrix, np.arange(len(matrix)))
+            tmp_hnsw = self._tmp_path(self._hnsw_path)
+            index.save_index(tmp_hnsw)
+            os.replace(tmp_hnsw, self._hnsw_path)
+        elif os.path.exists(self._hnsw_path):
+            os.remove(self._hnsw_path)
+
+        with self._lock:
+            self._load()
+        logger.info(f"Local vector snapshot built with {len(metadata)} rows in {time.perf_counter() - start:.2f}s")
+        return len(metadata)
+
+    def _load(self):
+        self.matrix = np.load(self._matrix_path, mmap_mode="r")
+        with open(self._metadata_path, encoding="utf-8") as f:
+            self.metadata = [json.loads(line) for line in f]
+        self.hnsw = None
+        if HNSWLIB_AVAILABLE and os.path.exists(self._hnsw_path) and len(self.matrix):
+            self.hnsw = hnswlib.Index(space="ip", dim=self.matrix.shape[1])
+            self.hnsw.load_index(self._hnsw_path, max_elements=len(self.matrix))
+        logger.info(f"Loaded local vector snapshot ({len(self.metadata)} rows, "
+                    f"{'hnsw' if self.hnsw is not None else 'brute-force'})")
+
+    def _ensure_loaded(self):
+        if self.matrix is not None:
+            return
+        with self._build_lock:
+            if self.matrix is not None:
+                return
+            if os.path.exists(self._matrix_path) and os.path.exists(self._metadata_path):
+                with self._lock:
+                    self._load()
+                return
+            self._build_snapshot()
+
+    def search_many(self, query_vectors, limit: int, fields: List[str],
+                    num_candidates: Optional[int] = None, include_id: bool = True) -> List[List[Dict]]:
+        """Top-k lookup for a batch of queries in one matrix product."""
+        self._ensure_loaded()
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        n_rows = len(self.metadata)
+        if n_rows == 0 or len(queries) == 0:
+            return [[] for _ in range(len(queries))]
+        queries /= np.clip(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12, None)
+        k = min(limit, n_rows)
+
+        if self.hnsw is not None:
+            self.hnsw.set_ef(max(num_candidates or limit * 10, k))
+            labels, distances = self.hnsw.knn_query(queries, k=k)
+            top_ids, top_sims = labels, 1.0 - distances
+        else:
+            sims = np.empty((len(queries), n_rows), dtype=np.float32)
+            for start in range(0, n_rows, SCAN_BLOCK_ROWS):
+                block = np.asarray(self.matrix[start:start + SCAN_BLOCK_ROWS], dtype=np.float32)
+                sims[:, start:start + len(block)] = queries @ block.T
+            top_ids = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+            top_sims = np.take_along_axis(sims, top_ids, axis=1)
+            order = np.argsort(-top_sims, axis=1)
+            top_ids = np.take_along_axis(top_ids, order, axis=1)
+            top_sims = np.take_along_axis(top_sims, order, axis=1)
+
+        results = []
+        for ids, row_sims in zip(top_ids, top_sims):
+            hits = []
+            for idx, sim in zip(ids, row_sims):
+                meta = self.metadata[int(idx)]
+                doc = {field: meta[field] for field in fields if field in meta}
+                if include_id:
+                    doc["_id"] = _restore_object_id(meta["_id"])
+                doc["score"] = float(_atlas_cosine_score(sim))
+                hits.append(doc)
+            results.append(hits)
+        return results
+
+    def search(self, query_vector: List[float], limit: int, fields: List[str],
+               num_candidates: Optional[int] = None, include_id: bool = True) -> List[Dict]:
+        return self.search_many([query_vector], limit, fields, num_candidates, include_id)[0]
+
+    async def asearch(self, query_vector: List[float], limit: int, fields: List[str],
+                      num_candidates: Optional[int] = None, include_id: bool = True,
+                      motor_collection=None) -> List[Dict]:
+        """Runs the in-process scan on a worker thread so large corpora don't stall the loop."""
+        return await asyncio.to_thread(self.search, query_vector, limit, fields, num_candidates, include_id)
+
+
+def _restore_object_id(value: str):
+    try:
+        from bson.objectid import ObjectId
+        return ObjectId(value) if ObjectId.is_valid(value) else value
+    except ImportError:
+        return value
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_retrieval_backend(collection):
+    """Returns the configured retrieval backend for `collection`, shared across callers."""
+    key = (Config.RETRIEVAL_BACKEND, collection.full_name)
+    with _backends_lock:
+        backend = _backends.get(key)
+        if backend is None:
+            if Config.RETRIEVAL_BACKEND == "local":
+                backend = LocalVectorBackend(
+                    collection,
+                    os.path.join(Config.LOCAL_INDEX_DIR, collection.name),
+                    dtype=Config.LOCAL_INDEX_DTYPE,
+                    hnsw_threshold=Config.LOCAL_INDEX_HNSW_THRESHOLD
+                )
+            else:
+                backend = AtlasVectorBackend(collection, Config.VECTOR_SEARCH_INDEX)
+            _backends[key] = backend
+            logger.info(f"Retrieval backend '{backend.name}' selected for '{collection.full_name}'")
+        return backend
@@ -1,13 +1,25 @@
 # wisdom_oracle.py
 import logging
+from concurrent.futures import ThreadPoolExecutor
 import torch
-from transformers import AutoTokenizer, AutoModel
 from typing import List, Dict, Tuple
 import pymongo
 from aletheia.config import Config
+from aletheia.embedding_cache import get_embedding_cache
+from aletheia.vector_index import get_retrieval_backend
+from aletheia.embedding_runtime import load_embedding_runtime
+from aletheia.model_registry import get_model_registry
 
 logger = logging.getLogger(__name__)
 
+CRITIQUE_FRAMEWORKS = {
+    "utilitarian": "utility, consequences, greatest good, happiness, suffering, outcome",
+    "deontological": "duty, rules, obligation, rights, intent, universal law, means to an end",
+    "virtue_ethics": "character, virtue, flourishing, compassion, courage, justice, wisdom",
+    "ai_safety": "alignment, corrigibility, instrumental convergence, value lock-in, existential risk"
+}
+SEARCH_FIELDS = ["text", "author", "source", "ethical_framework", "era"]
+
 class WisdomOracle:
     """
     The Wisdom Network evaluates an AI's actions against the corpus of human wisdom.
@@ -16,96 +28,102 @@ class WisdomOracle:
     def __init__(self, db):
         self.db = db
         self.text_collection = self.db[Config.TEXT_COLLECTION_NAME]
+        self.retrieval_backend = get_retrieval_backend(self.text_collection)
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.tokenizer = None
-        self.embedding_model = None
-        self.model_loaded = False
+        self.model_registry = get_model_registry()
+        self.embedding_cache = get_embedding_cache(db)
+        # Non-reference runtimes get their own cache namespace; they agree with torch only within tolerance
+        runtime_suffix = "" if Config.EMBEDDING_RUNTIME == "torch" else f":{Config.EMBEDDING_RUNTIME}"
+        self.embedding_model_id = f"{Config.EMBEDDING_MODEL_NAME}:mean{runtime_suffix}"
+        self._search_pool = ThreadPoolExecutor(max_workers=len(CRITIQUE_FRAMEWORKS), thread_name_prefix="oracle-search")
         logger.info(f"WisdomOracle initialized. Using device: {self.device}")
 
-    def _initialize_local_embedding_model(self):
-        try:
-            logger.info(f"Initializing local embedding model: {Config.EMBEDDING_MODEL_NAME}")
-            # Force CPU usage to reduce memory pressure
-            self.device = torch.device("cpu")
-            self.tokenizer = AutoTokenizer.from_pretrained(Config.EMBEDDING_MODEL_NAME)
-            # Load model with memory optimizations
-            self.embedding_model = AutoModel.from_pretrained(
-                Config.EMBEDDING_MODEL_NAME,
-                torch_dtype=torch.float16,  # Use half precision
-                low_cpu_mem_usage=True,
-                device_map="cpu"
-            )
-            self.embedding_model.eval()
-            self.model_loaded = True
-            logger.info("Local embedding model initialized successfully with memory optimizations.")
-        except Exception as e:
-            logger.error(f"Failed to initialize local embedding model: {e}", exc_info=True)
-            self.model_loaded = False
+    def _load_local_embedding_model(self):
+        logger.info(f"Initializing local embedding model: {Config.EMBEDDING_MODEL_NAME} "
+                    f"(runtime: {Config.EMBEDDING_RUNTIME})")
+        embedding_runtime = load_embedding_runtime(
+            Config.EMBEDDING_MODEL_NAME,
+            runtime=Config.EMBEDDING_RUNTIME,
+            cache_dir=Config.EMBEDDING_RUNTIME_CACHE_DIR,
+            tolerance=Config.EMBEDDING_RUNTIME_TOLERANCE
+        )
+        logger.info(f"Local embedding model initialized on the '{embedding_runtime.runtime}' runtime.")
+        return embedding_runtime
 
     def generate_embedding(self, text: str) -> List[float]:
-        """Generates a vector embedding for a given text using a local model."""
+        """Generates a vector embedding for a given text, consulting the shared embedding cache first."""
         if not text or not text.strip():
             return []
-        
-        # Lazy loading - only initialize model when needed
-        if not self.model_loaded:
-            try:
-                self._initialize_local_embedding_model()
-            except Exception as e:
-                logger.error(f"Failed to initialize local embedding model on demand: {e}")
-                return []
-        
-        if not self.model_loaded:
-            logger.error("Local BERT model or tokenizer not initialized")
-            return []
-            
+        return self.generate_embeddings([text])[0]
+
+    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Embeds several texts, serving cache hits and running all misses through one forward pass."""
+        results = self.embedding_cache.get_many(texts, self.embedding_model_id)
+        missing = [i for i, vector in enumerate(results) if vector is None and texts[i] and texts[i].strip()]
+        if missing:
+            computed = self._compute_embeddings([texts[i] for i in missing])
+            self.embedding_cache.put_many([texts[i] for i in missing], self.embedding_model_id, computed)
+            for i, vector in zip(missing, computed):
+                results[i] = vector
+        return [vector or [] for vector in results]
+
+    def _compute_embedding(self, text: str) -> List[float]:
+        """Generates a vector embedding for a given text using a local model."""
+        return self._compute_embeddings([text])[0]
+
+    def _compute_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Mean-pooled embeddings for a batch of texts from one padded forward pass of the local model."""
+        # The model is loaded on first use and held only for the forward pass, so the shared
+        # registry can unload it when other local models need the memory. Embeddings always run on CPU.
         try:
-            inputs = self.tokenizer(text, return_tensors='pt', padding=True, truncation=True, max_length=512)
-            with torch.no_grad():
-                # Use autocast for memory efficiency
-                with torch.autocast(device_type='cpu', dtype=torch.float16):
-                    outputs = self.embedding_model(**inputs)
-            # Mean pooling
-            attention_mask = inputs['attention_mask']
-            token_embeddings = outputs.last_hidden_state
-            input_mask_expanded = attention_mask.unsqueeze(-1).expand(token_embeddings.size()).float()
-            sum_embeddings = torch.sum(token_embeddings * input_mask_expanded, 1)
-            sum_mask = torch.clamp(input_mask_expanded.sum(1), min=1e-9)
-            mean_pooled = sum_embeddings / sum_mask
-            # Convert to float32 for consistency with existing embeddings
-            return mean_pooled[0].float().cpu().numpy().tolist()
+            with self.model_registry.use(Config.EMBEDDING_MODEL_NAME, self._load_local_embedding_model,
+                                         dtype=Config.EMBEDDING_RUNTIME, device="cpu") as embedding_runtime:
+                # Mean pooling over real tokens only, so padding doesn't change any row
+                return embedding_runtime.embed(texts, pooling="mean", max_length=512).astype("float32").tolist()
         except Exception as e:
-            logger.error(f"Failed to generate local BERT embeddings: {e}")
-            return []
+            logger.error(f"Failed to generate local BERT embeddings: {e}", exc_info=True)
+            return [[] for _ in texts]
 
     def _vector_search(self, embedding: List[float], limit: int = 3) -> List[Dict]:
         """Performs a vector search on the philosophical texts collection."""
         if not embedding:
             return []
         try:
-            pipeline = [
-                {
-                    "$vectorSearch": {
-                        "index": Config.VECTOR_SEARCH_INDEX,
-                        "path": "embedding",
-                        "queryVector": embedding,
-                        "numCandidates": limit * 15,
-                        "limit": limit
-                    }
-                },
-                {
-                    "$project": {
-                        "text": 1, "author": 1, "source": 1,
-                        "ethical_framework": 1, "era": 1,
-                        "score": {"$meta": "vectorSearchScore"}
-                    }
-                }
-            ]
-            return list(self.text_collection.aggregate(pipeline))
+            return self.retrieval_backend.search(
+                embedding,
+                limit=limit,
+                fields=SEARCH_FIELDS,
+                num_candidates=limit * 15
+            )
         except pymongo.errors.OperationFailure as e:
             logger.error(f"Vector search failed: {e.details}", exc_info=True)
             return []
 
+    def _vector_search_many(self, embeddings: List[List[float]], limit: int = 3) -> List[List[Dict]]:
+        """Runs several vector searches at once: one matrix product on a local index, concurrent queries on Atlas."""
+        if hasattr(self.retrieval_backend, "search_many") and all(embeddings):
+            try:
+                return self.retrieval_backend.search_many(embeddings, limit=limit, fields=SEARCH_FIELDS,
+                                                          num_candidates=limit * 15)
+            except Exception as e:
+                logger.error(f"Batched vector search failed: {e}", exc_info=True)
+                return [[] for _ in embeddings]
+        return list(self._search_pool.map(lambda embedding: self._vector_search(embedding, limit), embeddings))
+
+    @staticmethod
+    def _dedupe_across_frameworks(docs_by_framework: Dict[str, List[Dict]]) -> Dict[str, List[Dict]]:
+        """Keeps each retrieved passage only under the framework where it scored highest."""
+        best = {}
+        for framework, docs in docs_by_framework.items():
+            for doc in docs:
+                key = doc.get("_id") or doc.get("text")
+                if key not in best or doc.get("score", 0) > best[key][1]:
+                    best[key] = (framework, doc.get("score", 0))
+        return {
+            framework: [doc for doc in docs if best[doc.get("_id") or doc.get("text")][0] == framework]
+            for framework, docs in docs_by_framework.items()
+        }
+
     def _build_context_from_docs(self, docs: List[Dict], framework_name: str) -> str:
         """Builds a formatted string context from retrieved documents."""
         context_parts = [f"--- Context for {framework_name} ---"]
@@ -124,18 +142,16 @@ class WisdomOracle:
         of an agent's action.
         """
         critique = {}
-        frameworks_to_query = {
-            "utilitarian": "utility, consequences, greatest good, happiness, suffering, outcome",
-            "deontological": "duty, rules, obligation, rights, intent, universal law, means to an end",
-            "virtue_ethics": "character, virtue, flourishing, compassion, courage, justice, wisdom",
-            "ai_safety": "alignment, corrigibility, instrumental convergence, value lock-in, existential risk"
-        }
+        query_texts = [
+            f"Critique the action '{action}' for the scenario '{scenario['title']}' using principles of: {keywords}"
+            for keywords in CRITIQUE_FRAMEWORKS.values()
+        ]
+        embeddings = self.generate_embeddings(query_texts)
+        results = self._vector_search_many(embeddings)
+        docs_by_framework = self._dedupe_across_frameworks(dict(zip(CRITIQUE_FRAMEWORKS, results)))
 
         full_context = ""
-        for framework, keywords in frameworks_to_query.items():
-            query_text = f"Critique the action '{action}' for the scenario '{scenario['title']}' using principles of: {keywords}"
-            embedding = self.generate_embedding(query_text)
-            docs = self._vector_search(embedding)
+        for framework, docs in docs_by_framework.items():
             critique[f'{framework}_docs'] = docs
             full_context += self._build_context_from_docs(docs, framework.replace("_", " ").title()) + "\n\n"
         
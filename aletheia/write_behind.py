@@ -0,0 +1,235 @@
+# write_behind.py
+import atexit
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+from bson import json_util
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError
+
+from aletheia.config import Config
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class WriteBehindQueue:
+    """
+    Background batching writer for documents the caller doesn't need to wait on.
+
+    `enqueue` assigns an ObjectId up front and returns it immediately; a worker
+    thread groups queued documents per collection into `insert_many` calls. Failed
+    batches are retried with jittered exponential backoff and, once retries are
+    exhausted, appended to a JSONL dead-letter file. The queue is bounded: when it
+    is full, or once `close()` has been called, the caller writes inline instead.
+    Pending documents are flushed on interpreter shutdown. An `on_written` callback
+    given to `enqueue` runs once its document is stored, never if it is dead-lettered.
+    """
+    def __init__(self, max_pending: int = 10_000, batch_size: int = 100, flush_interval: float = 0.5,
+                 max_retries: int = 3, dead_letter_path: str = ".cache/write_behind_dead_letter.jsonl"):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.dead_letter_path = dead_letter_path
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._pending = {}
+        self._pending_cond = threading.Condition()
+        self._stopping = False
+        # Guards `_stopping` against enqueues racing with close(), so nothing lands after the final drain
+        self._accept_lock = threading.Lock()
+        self.stats = {"enqueued": 0, "written": 0, "inline_writes": 0, "retries": 0, "dead_lettered": 0}
+        self._worker = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
+    def enqueue(self, collection, doc: Dict, on_written: Optional[Callable[[], None]] = None) -> ObjectId:
+        """Queues `doc` for insertion into `collection` and returns its pre-generated _id."""
+        doc_id = doc.setdefault("_id", ObjectId())
+        item = (collection, doc, on_written)
+        with self._pending_cond:
+            self._pending[doc_id] = doc
+        self.stats["enqueued"] += 1
+        with self._accept_lock:
+            queued = False
+            if not self._stopping:
+                try:
+                    self._queue.put_nowait(item)
+                    queued = True
+                except queue.Full:
+                    logger.warning("Write-behind queue full; writing document inline")
+        if not queued:
+            self.stats["inline_writes"] += 1
+            self._write_batch([item])
+        return doc_id
+
+    def lookup_pending(self, doc_id) -> Optional[Dict]:
+        """Returns a document that has been enqueued but not yet written, if any."""
+        with self._pending_cond:
+            return self._pending.get(doc_id)
+
+    def wait_flushed(self, doc_id, timeout: float = 5.0) -> bool:
+        """Blocks until `doc_id` is no longer pending. Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._pending_cond:
+            while doc_id in self._pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._pending_cond.wait(remaining)
+        return True
+
+    def _collect(self) -> List:
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stopping and self._queue.empty()):
+            batch = self._collect()
+            if batch:
+                self._write_batch(batch)
+
+    def _write_batch(self, batch: List):
+        grouped = defaultdict(list)
+        collections = {}
+        for collection, doc, _ in batch:
+            grouped[collection.full_name].append(doc)
+            collections[collection.full_name] = collection
+        dead_lettered = set()
+        for name, docs in grouped.items():
+            dead_lettered.update(doc["_id"] for doc in self._insert_with_retry(collections[name], docs))
+        # Before the documents stop being pending, so a caller in wait_flushed sees the callback's effects
+        for _, doc, on_written in batch:
+            if on_written is not None and doc["_id"] not in dead_lettered:
+                try:
+                    on_written()
+                except Exception as e:
+                    logger.warning(f"Write-behind callback for {doc['_id']} failed: {e}")
+        with self._pending_cond:
+            for _, doc, _ in batch:
+                self._pending.pop(doc["_id"], None)
+            self._pending_cond.notify_all()
+
+    def _insert_with_retry(self, collection, docs: List[Dict]) -> List[Dict]:
+        """Inserts `docs`, retrying failures. Returns the documents that were dead-lettered."""
+        remaining = docs
+        for attempt in range(self.max_retries + 1):
+            try:
+                collection.insert_many(remaining, ordered=False)
+                self.stats["written"] += len(remaining)
+                return []
+            except BulkWriteError as e:
+                # Documents that already landed (duplicate _id on retry) count as written
+                failed = {err["index"] for err in e.details.get("writeErrors", [])
+                          if err.get("code") != DUPLICATE_KEY_ERROR}
+                self.stats["written"] += len(remaining) - len(failed)
+                remaining = [doc for i, doc in enumerate(remaining) if i in failed]
+                if not remaining:
+                    return []
+                logger.warning(f"Write-behind insert into '{collection.full_name}' failed for {len(remaining)} documents: {e}")
+            except Exception as e:
+                logger.warning(f"Write-behind insert into '{collection.full_name}' failed (attempt {attempt + 1}): {e}")
+            if attempt < self.max_retries:
+                self.stats["retries"] += 1
+                time.sleep(min(0.2 * 2 ** attempt, 5.0) * (0.5 + random.random()))
+        self._dead_letter(collection, remaining)
+        return remaining
+
+    def _dead_letter(self, collection, docs: List[Dict]):
+        logger.error(f"Write-behind giving up on {len(docs)} documents for '{collection.full_name}'; "
+                     f"appending to {self.dead_letter_path}")
+        self.stats["dead_lettered"] += len(docs)
+        try:
+            directory = os.path.dirname(self.dead_letter_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                for doc in docs:
+                    f.write(json_util.dumps({"collection": collection.name, "document": doc}) + "\n")
+        except Exception as e:
+            logger.error(f"Failed to write dead-letter file: {e}")
+
+    def close(self, timeout: float = 10.0):
+        """Stops accepting work and flushes everything still queued."""
+        with self._accept_lock:
+            if self._stopping:
+                return
+            self._stopping = True
+        self._worker.join(timeout)
+        if self._worker.is_alive():
+            logger.warning(f"Write-behind shutdown timed out with {self._queue.qsize()} documents queued")
+        else:
+            logger.info("Write-behind queue flushed on shutdown")
+
+    def snapshot_stats(self) -> Dict:
+        return {**self.stats, "queued": self._queue.qsize(), "pending": len(self._pending)}
+
+
+def replay_dead_letters(db, path: Optional[str] = None) -> int:
+    """
+    Re-inserts dead-lettered documents into `db`, keeping any that fail again. Returns the count replayed.
+    The file is moved aside before replaying, so documents dead-lettered meanwhile are kept; a file left
+    aside by an interrupted replay is picked up by the next one.
+    """
+    path = path or Config.WRITE_BEHIND_DEAD_LETTER_PATH
+    replaying = f"{path}.replaying"
+    if not os.path.exists(replaying):
+        if not os.path.exists(path):
+            return 0
+        os.replace(path, replaying)
+    with open(replaying, encoding="utf-8") as f:
+        records = [json_util.loads(line) for line in f if line.strip()]
+    replayed, leftover = 0, []
+    for record in records:
+        try:
+            db[record["collection"]].insert_one(record["document"])
+            replayed += 1
+        except Exception as e:
+            if getattr(e, "code", None) == DUPLICATE_KEY_ERROR:
+                replayed += 1
+            else:
+                leftover.append(record)
+    if leftover:
+        with open(path, "a", encoding="utf-8") as f:
+            for record in leftover:
+                f.write(json_util.dumps(record) + "\n")
+    os.remove(replaying)
+    logger.info(f"Replayed {replayed} dead-lettered documents; {len(leftover)} remain")
+    return replayed
+
+
+_write_behind = None
+_write_behind_lock = threading.Lock()
+
+
+def get_write_behind(create: bool = True) -> Optional[WriteBehindQueue]:
+    """
+    Returns the process-wide write-behind queue, starting its worker on first use.
+    With create=False, returns None if it hasn't been started.
+    """
+    global _write_behind
+    if _write_behind is None and create:
+        with _write_behind_lock:
+            if _write_behind is None:
+                _write_behind = WriteBehindQueue(
+                    max_pending=Config.WRITE_BEHIND_MAX_PENDING,
+                    batch_size=Config.WRITE_BEHIND_BATCH_SIZE,
+                    flush_interval=Config.WRITE_BEHIND_FLUSH_INTERVAL,
+                    max_retries=Config.WRITE_BEHIND_MAX_RETRIES,
+                    dead_letter_path=Config.WRITE_BEHIND_DEAD_LETTER_PATH
+                )
+    return _write_behind
@@ -1,38 +1,49 @@
 import os
 import logging
-from flask import Flask, request, jsonify, render_template
+import asyncio
+import threading
+from aletheia.lazy import Lazy, startup_report
+from flask import Flask, request, jsonify, render_template, Response, make_response
 from flask_cors import CORS
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
-import vertexai
 import numpy as np
 from datetime import datetime, timezone
 import json
 import re
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Tuple, Optional, Iterator, Callable
 from bson.objectid import ObjectId
+from bson.errors import InvalidId
 from dotenv import load_dotenv
 import base64
-from google import genai
 from google.genai import types
 from google.genai import errors # <--- ADD THIS IMPORT
 import pymongo
 import google.auth
-# Added for local BERT embeddings
-import torch
-from transformers import AutoTokenizer, AutoModel
 from aletheia.config import Config as AppConfig # Renamed to avoid conflict
 from aletheia.simulation import Simulation
-from aletheia.wisdom_oracle import WisdomOracle
 from aletheia.ai_agent import AIAgent
-from aletheia.run_aletheia_loop import run_single_cycle
+from aletheia.embedding_cache import get_embedding_cache
+from aletheia.vector_index import get_retrieval_backend
+from aletheia.semantic_cache import SemanticWisdomIndex, APPROVED_FILTER, is_reusable
+from aletheia.async_runtime import get_async_runtime, to_thread
+from aletheia.write_behind import get_write_behind, replay_dead_letters
+from aletheia.streaming_json import StreamingJSONFields
+from aletheia.http_client import get_http_client
+from aletheia.llm_gateway import get_llm_gateway
+from aletheia.llm_cache import get_llm_cache
+from aletheia.model_registry import get_model_registry
+from aletheia.constitution_versions import get_constitution_versions
+from aletheia.cycle_scheduler import CANCELLED, FAILED, FINISHED_STATUSES, get_learning_scheduler
+from aletheia.progress_bus import final_event_id, is_final_event_id, parse_event_id
+from aletheia.edge_builder.rebuild_jobs import GraphRebuildJobs
+from aletheia.scenario_features import backfill_scenario_features, ensure_scenario_feature_indexes, with_scenario_features
 #from aletheia.edge_builder.edge_builder import build
 import requests, os, json, logging
 import logging
 
 logger = logging.getLogger(__name__)
 
-from google.cloud import pubsub_v1
 # Import stress test validation utilities
 try:
     from stress_test_validation import validate_stress_test_response, sanitize_stress_test_response
@@ -58,6 +69,7 @@ def json_serialize(obj):
 
 
 load_dotenv()
+startup_report.mark("imports")
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -89,6 +101,7 @@ class Config:
 def initialize_vertex_ai():
     try:
         if Config.GOOGLE_CLOUD_PROJECT and Config.GOOGLE_CLOUD_LOCATION:
+            import vertexai
             vertexai.init(project=Config.GOOGLE_CLOUD_PROJECT, location=Config.GOOGLE_CLOUD_LOCATION)
             logger.info("Vertex AI initialized successfully (for project context or other services).")
             return True
@@ -99,24 +112,26 @@ def initialize_vertex_ai():
         logger.error(f"Failed to initialize Vertex AI: {e}")
         return False
 
+def create_wisdom_oracle(db):
+    # Imported here: the oracle pulls in torch/transformers, which only the learning loop needs
+    from aletheia.wisdom_oracle import WisdomOracle
+    return WisdomOracle(db)
+
 def initialize_mongodb():
+    """Create the Mongo client and lazy service handles. Nothing here touches the network:
+    MongoClient connects in the background, and Simulation/WisdomOracle are built on first use."""
     try:
-        logger.info(f"Attempting MongoDB connection to: {Config.MONGODB_URI}")
+        if not Config.MONGODB_URI:
+            logger.error("MONGODB_URI not set. MongoDB features will be unavailable.")
+            return None, None, None, None, None
         logger.info(f"Database name: {Config.DATABASE_NAME}")
         
         client = MongoClient(Config.MONGODB_URI, server_api=ServerApi('1'))
         db = client[Config.DATABASE_NAME]
         collection = db[Config.COLLECTION_NAME]
-        try:
-            client.admin.command('ping')
-            logger.info("Pinged your deployment. You successfully connected to MongoDB!")
-            
-            sim_instance = Simulation(db)
-            oracle_instance = WisdomOracle(db)
-        except Exception as e:
-            logger.error(f"Ping to MongoDB failed: {e}")
-            return None, None, None, None, None
-        logger.info(f"MongoDB connection successful. Collection: {collection.name}")
+        sim_instance = Lazy("simulation", lambda: Simulation(db))
+        oracle_instance = Lazy("wisdom_oracle", lambda: create_wisdom_oracle(db))
+        logger.info(f"MongoDB client created. Collection: {collection.name}")
         return client, db, collection, sim_instance, oracle_instance
     except Exception as e:
         logger.error(f"Failed to connect to MongoDB: {e}")
@@ -124,15 +139,46 @@ def initialize_mongodb():
         logger.error(f"Database name was: {Config.DATABASE_NAME}")
         return None, None, None, None, None
 
-vertex_ai_initialized = initialize_vertex_ai()
+startup_report.mark("config")
+vertex_ai = Lazy("vertex_ai", initialize_vertex_ai)
 mongo_client, db, collection, sim_instance, oracle_instance = initialize_mongodb()
 reasoning_traces_collection = None
 wisdom_cache_collection = None
+wisdom_cache_index = None
 if db is not None:
     reasoning_traces_collection = db[Config.REASONING_TRACES_COLLECTION_NAME]
     wisdom_cache_collection = db['wisdom_cache']
     logger.info(f"Reasoning traces collection '{Config.REASONING_TRACES_COLLECTION_NAME}' initialized.")
     logger.info(f"Wisdom cache collection 'wisdom_cache' initialized.")
+    wisdom_cache_index = SemanticWisdomIndex(
+        wisdom_cache_collection,
+        threshold=AppConfig.WISDOM_CACHE_SIMILARITY_THRESHOLD,
+        top_k=AppConfig.WISDOM_CACHE_TOP_K
+    )
+
+def ensure_history_indexes(database):
+    """Indexes behind the paginated history endpoints; run off the startup path so boot never waits on Mongo."""
+    try:
+        database[AppConfig.LEARNING_HISTORY_COLLECTION].create_index(
+            [('agent_id', 1), ('timestamp', -1), ('_id', -1)], background=True
+        )
+        logger.info("Learning history indexes ensured.")
+    except Exception as e:
+        logger.warning(f"Learning history index creation failed: {e}")
+
+def replay_write_behind_dead_letters(database):
+    """Re-inserts documents the write-behind queue gave up on in an earlier run, off the startup path."""
+    try:
+        replay_dead_letters(database)
+    except Exception as e:
+        logger.warning(f"Write-behind dead-letter replay failed: {e}")
+
+if db is not None:
+    threading.Thread(target=ensure_history_indexes, args=(db,), name="history-indexes", daemon=True).start()
+    if AppConfig.WRITE_BEHIND_ENABLED:
+        threading.Thread(target=replay_write_behind_dead_letters, args=(db,), name="dead-letter-replay",
+                         daemon=True).start()
+startup_report.mark("mongodb")
 
 # Initialize and register Scenario Exporter
 from scenario_exporter import scenario_exporter, initialize_exporter
@@ -160,76 +206,100 @@ if db is not None:
     else:
         logger.info("MAS Evaluator skipped - dependencies not available")
     logger.info("Scenario Exporter blueprint registered successfully")
+startup_report.mark("blueprints")
+
+WISDOM_MODEL_NAME = "gemini-2.5-flash-preview-05-20"
+RAG_PROJECTION_FIELDS = ["text", "author", "source", "ethical_framework", "concepts", "era", "text_hash"]
 
 class SophiaGuardRAG:
     def __init__(self):
         self.bert_api_url = os.getenv('BERT_API_URL', 'https://api-inference.huggingface.co/models/sentence-transformers/all-MiniLM-L6-v2')
         self.hf_token = os.getenv('HUGGINGFACE_API_TOKEN', '')
+        # Runtime the BERT service embeds with; corrected from its /health report when that differs
+        self.bert_runtime = os.getenv('BERT_RUNTIME', 'torch')
         logger.info(f"Using external BERT API at: {self.bert_api_url}")
         self.initialize_models()
 
     def initialize_models(self):
         """Initialize Gemini API client and check BERT API availability."""
         try:
-            # Check BERT API availability
-            logger.info(f"Checking BERT API at {self.bert_api_url}...")
-            try:
-                response = requests.get(f"{self.bert_api_url}/health", timeout=10)
-                if response.status_code == 200:
-                    logger.info("External BERT API is available.")
-                else:
-                    logger.warning(f"BERT API returned status {response.status_code}")
-            except Exception as e:
-                logger.warning(f"BERT API check failed: {e}")
+            # Check BERT API availability in the background so it never delays startup
+            threading.Thread(target=self.check_bert_api, name="bert-health-check", daemon=True).start()
 
-            gemini_api_key = Config.GEMINI_API_KEY
-            if not gemini_api_key:
-                logger.error("GEMINI_API_KEY not found in environment variables. GenAI client will not be available.")
-                self.client = None
-            else:
-                self.client = genai.Client(api_key=Config.GEMINI_API_KEY)
-                logger.info("Gemini API client initialized successfully.")
+            # All Gemini traffic goes through the shared gateway's single client
+            self.llm = get_llm_gateway()
             logger.info("AI models initialization complete.")
         except Exception as e:
             logger.error(f"Failed to initialize AI models: {e}")
-            self.client = None
+            self.llm = None
+
+    def check_bert_api(self):
+        logger.info(f"Checking BERT API at {self.bert_api_url}...")
+        try:
+            response = get_http_client().get(f"{self.bert_api_url}/health", timeout=10, retries=0)
+            if response.status_code == 200:
+                logger.info("External BERT API is available.")
+                reported = response.json().get('runtime')
+                if reported and reported != self.bert_runtime:
+                    logger.warning(f"BERT API reports runtime '{reported}' but BERT_RUNTIME is "
+                                   f"'{self.bert_runtime}'; caching query embeddings under '{reported}'")
+                    self.bert_runtime = reported
+            else:
+                logger.warning(f"BERT API returned status {response.status_code}")
+        except Exception as e:
+            logger.warning(f"BERT API check failed: {e}")
+
+    @property
+    def embedding_model_id(self) -> str:
+        """Embedding cache namespace; non-torch runtimes only agree with torch within tolerance."""
+        runtime_suffix = "" if self.bert_runtime == "torch" else f":{self.bert_runtime}"
+        return f"{self.bert_api_url}{runtime_suffix}"
 
     def generate_embeddings(self, text: str) -> List[float]:
-        """Generate embeddings using Hugging Face Inference API."""
+        """Generate embeddings, serving repeat queries from the shared embedding cache."""
         if not text or not text.strip():
             logger.warning("generate_embeddings called with empty text. Returning empty list.")
             return []
-        try:
-            headers = {"Content-Type": "application/json"}
-            if self.hf_token:
-                headers["Authorization"] = f"Bearer {self.hf_token}"
+        return get_embedding_cache(db).get_or_compute(text, self.embedding_model_id, self._request_embedding)
+
+    def _embedding_headers(self) -> Dict[str, str]:
+        headers = {"Content-Type": "application/json"}
+        if self.hf_token:
+            headers["Authorization"] = f"Bearer {self.hf_token}"
+        return headers
+
+    def _parse_embedding_payload(self, embedding) -> List[float]:
+        """Normalize an embedding API payload to a single 768-dim vector."""
+        if isinstance(embedding, list) and len(embedding) > 0:
+            # Hugging Face returns the embedding directly as a list
+            if isinstance(embedding[0], list):
+                embedding = embedding[0]  # Take first embedding if batched
             
-            response = requests.post(
+            # Pad or truncate to 768 dimensions to match BERT expectations
+            if len(embedding) != 768:
+                if len(embedding) < 768:
+                    embedding.extend([0.0] * (768 - len(embedding)))
+                else:
+                    embedding = embedding[:768]
+            
+            logger.info(f"Successfully generated embedding via HF API (dim: {len(embedding)})")
+            return embedding
+        else:
+            logger.error(f"Invalid embedding from HF API: {type(embedding)}")
+            return []
+
+    def _request_embedding(self, text: str) -> List[float]:
+        """Generate embeddings using Hugging Face Inference API."""
+        try:
+            response = get_http_client().post(
                 self.bert_api_url,
                 json={"inputs": text},
                 timeout=30,
-                headers=headers
+                headers=self._embedding_headers()
             )
             
             if response.status_code == 200:
-                embedding = response.json()
-                if isinstance(embedding, list) and len(embedding) > 0:
-                    # Hugging Face returns the embedding directly as a list
-                    if isinstance(embedding[0], list):
-                        embedding = embedding[0]  # Take first embedding if batched
-                    
-                    # Pad or truncate to 768 dimensions to match BERT expectations
-                    if len(embedding) != 768:
-                        if len(embedding) < 768:
-                            embedding.extend([0.0] * (768 - len(embedding)))
-                        else:
-                            embedding = embedding[:768]
-                    
-                    logger.info(f"Successfully generated embedding via HF API (dim: {len(embedding)})")
-                    return embedding
-                else:
-                    logger.error(f"Invalid embedding from HF API: {type(embedding)}")
-                    return []
+                return self._parse_embedding_payload(response.json())
             else:
                 logger.error(f"HF API request failed: {response.status_code} - {response.text}")
                 return []
@@ -240,6 +310,35 @@ class SophiaGuardRAG:
             logger.error(f"Unexpected error generating embeddings: {e}")
             return []
 
+    async def agenerate_embeddings(self, text: str) -> List[float]:
+        """Async variant of generate_embeddings sharing the same embedding cache."""
+        if not text or not text.strip():
+            return []
+        cache = get_embedding_cache(db)
+        model_id = self.embedding_model_id
+        embedding = cache.get(text, model_id)
+        if embedding is not None:
+            return embedding
+        embedding = await self._arequest_embedding(text)
+        if embedding:
+            cache.put(text, model_id, embedding)
+        return embedding
+
+    async def _arequest_embedding(self, text: str) -> List[float]:
+        """Non-blocking embedding request over the runtime's pooled async HTTP client."""
+        http = get_async_runtime().http
+        if http is None:
+            return await to_thread(self._request_embedding, text)
+        try:
+            response = await http.post(self.bert_api_url, json={"inputs": text}, headers=self._embedding_headers())
+            if response.status_code == 200:
+                return self._parse_embedding_payload(response.json())
+            logger.error(f"HF API request failed: {response.status_code} - {response.text}")
+            return []
+        except Exception as e:
+            logger.error(f"Async embedding request failed: {e}")
+            return []
+
     def vector_search(self, query_embedding: List[float], limit: int = 5) -> List[Dict]:
         """Perform vector search in MongoDB Atlas"""
         logger.info(f"Performing vector search. Query embedding (first 5 elements): {query_embedding[:5] if query_embedding else 'None or Empty'}, Length: {len(query_embedding) if query_embedding else 0}")
@@ -256,41 +355,20 @@ class SophiaGuardRAG:
                 logger.error(f"Query embedding has incorrect dimensionality: {len(query_embedding)}. Expected 768.")
                 return []
 
+            backend = get_retrieval_backend(collection)
             vector_search_index_name = Config.VECTOR_SEARCH_INDEX
-            if not vector_search_index_name:
+            if backend.name == "atlas" and not vector_search_index_name:
                 logger.error("VECTOR_SEARCH_INDEX environment variable is not set. Cannot perform vector search.")
                 raise Exception("Vector search index name not configured")
 
-            pipeline = [
-                {
-                    "$vectorSearch": {
-                        "index": vector_search_index_name,
-                        "path": "embedding",
-                        "queryVector": query_embedding,
-                        "numCandidates": limit * 10,
-                        "limit": limit
-                    }
-                },
-                {
-                    "$project": {
-                        "_id": 0, 
-                        "text": 1,
-                        "author": 1,
-                        "source": 1,
-                        "ethical_framework": 1,
-                        "concepts": 1,
-                        "era": 1,
-                        "text_hash": 1, 
-                        "score": {"$meta": "vectorSearchScore"}
-                    }
-                }
-            ]
-            
-            logger.info(f"Constructed MongoDB Aggregation Pipeline for Vector Search on index '{vector_search_index_name}':")
-            logger.info(json.dumps(pipeline, indent=2))
-
-            results = list(collection.aggregate(pipeline))
-            logger.info(f"Vector search on index '{vector_search_index_name}' returned {len(results)} results.")
+            results = backend.search(
+                query_embedding,
+                limit=limit,
+                fields=RAG_PROJECTION_FIELDS,
+                num_candidates=limit * 10,
+                include_id=False
+            )
+            logger.info(f"Vector search via '{backend.name}' backend returned {len(results)} results.")
             return results
         except pymongo.errors.OperationFailure as e:
             logger.error(f"MongoDB OperationFailure during vector search: {e.details}", exc_info=True)
@@ -303,16 +381,33 @@ class SophiaGuardRAG:
             logger.error(f"Generic vector search failed: {e}", exc_info=True)
             return []
 
-    def generate_wisdom_response(self, query: str, retrieved_docs_with_labels: List[Dict], **kwargs) -> Tuple[str, Optional[List[Dict]]]:
-        """Generate AI wisdom response using retrieved documents with Gemini API and extract citation map."""
+    async def avector_search(self, query_embedding: List[float], limit: int = 5, motor_db=None) -> List[Dict]:
+        """Async variant of vector_search; uses Motor for Atlas queries when available."""
+        if collection is None or not query_embedding or len(query_embedding) != 768:
+            logger.error("Vector search cannot proceed: collection unavailable or invalid query embedding.")
+            return []
         try:
-            if not self.client:
-                logger.error("Gemini API client not initialized. Cannot generate response.")
-                raise Exception("Gemini API client not initialized")
+            backend = get_retrieval_backend(collection)
+            motor_collection = motor_db[Config.COLLECTION_NAME] if motor_db is not None else None
+            results = await backend.asearch(
+                query_embedding,
+                limit=limit,
+                fields=RAG_PROJECTION_FIELDS,
+                num_candidates=limit * 10,
+                include_id=False,
+                motor_collection=motor_collection
+            )
+            logger.info(f"Async vector search via '{backend.name}' backend returned {len(results)} results.")
+            return results
+        except Exception as e:
+            logger.error(f"Async vector search failed: {e}", exc_info=True)
+            return []
 
-            context = self.build_context_string(retrieved_docs_with_labels)
+    def build_explore_prompt(self, query: str, retrieved_docs_with_labels: List[Dict]) -> str:
+        """Build the explore-mode prompt for a query and its retrieved sources."""
+        context = self.build_context_string(retrieved_docs_with_labels)
 
-            explore_prompt = f"""You are Aethos and Aletheia, a dual-headed AI Ethics & Alignment Navigator. Your primary purpose is to analyze complex questions by drawing upon the depth of human philosophical, ethical, and wisdom traditions. You assist humans in understanding these challenges and could conceptually serve as a reasoning aid for future advanced AI systems seeking to align with beneficial human values.
+        return f"""You are Aethos and Aletheia, a dual-headed AI Ethics & Alignment Navigator. Your primary purpose is to analyze complex questions by drawing upon the depth of human philosophical, ethical, and wisdom traditions. You assist humans in understanding these challenges and could conceptually serve as a reasoning aid for future advanced AI systems seeking to align with beneficial human values.
 
                 The user's query is: "{query}"
 
@@ -378,13 +473,50 @@ class SophiaGuardRAG:
                 - Ensure all source_ids in citation_mapping match those used in perspectives
                 - Each perspective must have unique framework name"""
 
+    def parse_wisdom_response(self, llm_response_text_full: str) -> Tuple[Dict, List[Dict]]:
+        """Parse the LLM's structured JSON answer, falling back to an unstructured response."""
+        # Parse the structured JSON response
+        try:
+            # Try to parse the entire response as JSON first
+            structured_response = json.loads(llm_response_text_full)
+            logger.info("Successfully parsed structured JSON response")
+            return structured_response, structured_response.get('citation_mapping', [])
+        except json.JSONDecodeError:
+            # Fallback to text response if JSON parsing fails
+            logger.warning("Failed to parse structured JSON response, falling back to text parsing")
+            
+            # Extract JSON from response if it's wrapped in text
+            json_match = re.search(r'\{.*\}', llm_response_text_full, re.DOTALL)
+            if json_match:
+                try:
+                    structured_response = json.loads(json_match.group(0))
+                    logger.info("Successfully extracted and parsed JSON from text response")
+                    return structured_response, structured_response.get('citation_mapping', [])
+                except json.JSONDecodeError as e:
+                    logger.error(f"Failed to parse extracted JSON: {e}")
+            
+            # Final fallback - return unstructured response
+            logger.warning("Using unstructured response as fallback")
+            return {
+                'tldr': llm_response_text_full[:140] + '...' if len(llm_response_text_full) > 140 else llm_response_text_full,
+                'key_points': [],
+                'perspectives': [],
+                'full_analysis': llm_response_text_full,
+                'citation_mapping': []
+            }, []
+
+    def generate_wisdom_response(self, query: str, retrieved_docs_with_labels: List[Dict], **kwargs) -> Tuple[str, Optional[List[Dict]]]:
+        """Generate AI wisdom response using retrieved documents with Gemini API and extract citation map."""
+        try:
+            if not self.llm or not self.llm.available:
+                logger.error("Gemini API client not initialized. Cannot generate response.")
+                raise Exception("Gemini API client not initialized")
+
+            explore_prompt = self.build_explore_prompt(query, retrieved_docs_with_labels)
 
-            model_name = "gemini-2.5-flash-preview-05-20"
-            logger.info(f"Generating wisdom content with model: {model_name}")
-            client = genai.Client(
-                api_key=os.environ.get("GEMINI_API_KEY"),
-            )
 
+            model_name = WISDOM_MODEL_NAME
+            logger.info(f"Generating wisdom content with model: {model_name}")
             contents = [
                 types.Content(
                     role="user",
@@ -400,7 +532,7 @@ class SophiaGuardRAG:
 
             llm_response_text_full_parts = []
             try:
-                stream = client.models.generate_content_stream(
+                stream = self.llm.stream(
                     model=model_name,
                     contents=contents,
                     config=request_config,
@@ -429,35 +561,7 @@ class SophiaGuardRAG:
             elif not llm_response_text_full_parts:
                 logger.warning("LLM stream yielded no text parts.")
 
-            # Parse the structured JSON response
-            try:
-                # Try to parse the entire response as JSON first
-                structured_response = json.loads(llm_response_text_full)
-                logger.info("Successfully parsed structured JSON response")
-                return structured_response, structured_response.get('citation_mapping', [])
-            except json.JSONDecodeError:
-                # Fallback to text response if JSON parsing fails
-                logger.warning("Failed to parse structured JSON response, falling back to text parsing")
-                
-                # Extract JSON from response if it's wrapped in text
-                json_match = re.search(r'\{.*\}', llm_response_text_full, re.DOTALL)
-                if json_match:
-                    try:
-                        structured_response = json.loads(json_match.group(0))
-                        logger.info("Successfully extracted and parsed JSON from text response")
-                        return structured_response, structured_response.get('citation_mapping', [])
-                    except json.JSONDecodeError as e:
-                        logger.error(f"Failed to parse extracted JSON: {e}")
-                
-                # Final fallback - return unstructured response
-                logger.warning("Using unstructured response as fallback")
-                return {
-                    'tldr': llm_response_text_full[:140] + '...' if len(llm_response_text_full) > 140 else llm_response_text_full,
-                    'key_points': [],
-                    'perspectives': [],
-                    'full_analysis': llm_response_text_full,
-                    'citation_mapping': []
-                }, []
+            return self.parse_wisdom_response(llm_response_text_full)
 
         except Exception as e:
             logger.error(f"Unexpected error in generate_wisdom_response: {e}", exc_info=True)
@@ -465,6 +569,59 @@ class SophiaGuardRAG:
 
 
 
+    async def agenerate_wisdom_response(self, query: str, retrieved_docs_with_labels: List[Dict]) -> Tuple[str, Optional[List[Dict]]]:
+        """Async variant of generate_wisdom_response using the Gemini client's aio interface."""
+        if not self.llm or not self.llm.available:
+            logger.error("Gemini API client not initialized. Cannot generate response.")
+            return "I apologize, but I encountered an unexpected internal error while processing your question.", None
+
+        explore_prompt = self.build_explore_prompt(query, retrieved_docs_with_labels)
+        contents = [types.Content(role="user", parts=[types.Part.from_text(text=explore_prompt)])]
+        request_config = types.GenerateContentConfig(response_mime_type="text/plain")
+
+        llm_response_text_full_parts = []
+        try:
+            async for chunk in self.llm.astream(
+                model=WISDOM_MODEL_NAME,
+                contents=contents,
+                config=request_config,
+            ):
+                if chunk.text:
+                    llm_response_text_full_parts.append(chunk.text)
+                if hasattr(chunk, 'prompt_feedback') and chunk.prompt_feedback and chunk.prompt_feedback.block_reason:
+                    logger.error(f"Content generation blocked by API. Reason: {chunk.prompt_feedback.block_reason}")
+        except errors.ClientError as e:
+            if "UNAUTHENTICATED" in str(e):
+                logger.error(f"Authentication failed for Gemini API: {e}", exc_info=True)
+                return "Authentication failed. Please check your API key and ensure it has the correct permissions for the Gemini API.", None
+            logger.error(f"Gemini API ClientError during content generation: {e}", exc_info=True)
+            return f"I apologize, but an API error occurred while communicating with the AI service: {str(e)}", None
+        except Exception as e:
+            logger.error(f"Unexpected error in agenerate_wisdom_response: {e}", exc_info=True)
+            return "I apologize, but I encountered an unexpected internal error while processing your question.", None
+
+        return self.parse_wisdom_response("".join(llm_response_text_full_parts))
+
+    def stream_wisdom_tokens(self, query: str, retrieved_docs_with_labels: List[Dict]) -> Iterator[str]:
+        """Yield raw text chunks of the explore-mode answer as Gemini produces them."""
+        if not self.llm or not self.llm.available:
+            raise RuntimeError("Gemini API client not initialized")
+
+        explore_prompt = self.build_explore_prompt(query, retrieved_docs_with_labels)
+        contents = [types.Content(role="user", parts=[types.Part.from_text(text=explore_prompt)])]
+        request_config = types.GenerateContentConfig(response_mime_type="text/plain")
+
+        stream = self.llm.stream(
+            model=WISDOM_MODEL_NAME,
+            contents=contents,
+            config=request_config,
+        )
+        for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+            if hasattr(chunk, 'prompt_feedback') and chunk.prompt_feedback and chunk.prompt_feedback.block_reason:
+                logger.error(f"Content generation blocked by API. Reason: {chunk.prompt_feedback.block_reason}")
+
     def build_context_string_and_details(self, retrieved_docs: List[Dict]) -> Tuple[str, List[Dict]]:
         """Build context string from retrieved documents and return details for tracing."""
         context_parts = []
@@ -514,41 +671,99 @@ Text: {doc_detail['text_full'][:500]}...
         return "\n\n".join(context_parts)
 
     def check_wisdom_cache(self, query: str) -> Optional[Dict]:
-        """Check if we have a cached high-quality response for similar queries."""
-        if wisdom_cache_collection is None:
+        """Return the approved cached response whose query embedding is most similar to this query.
+
+        The matched entry carries its cosine similarity under 'similarity_score'.
+        """
+        if wisdom_cache_collection is None or wisdom_cache_index is None:
             return None
             
         try:
-            # Generate embedding for the query
             query_embedding = self.generate_embeddings(query)
             if not query_embedding:
                 return None
             
-            # Search for similar cached queries using vector similarity
-            # Note: This would require a vector index on the wisdom cache collection
-            similar_queries = list(wisdom_cache_collection.find({
-                "feedback_score": {"$gte": 4},  # Only high-quality cached responses
-                "is_approved": True
-            }).limit(10))
-            
-            # For now, use text similarity as fallback
-            query_lower = query.lower()
-            for cached_item in similar_queries:
-                cached_query_lower = cached_item.get('original_query', '').lower()
-                if len(cached_query_lower) > 10:  # Avoid very short queries
-                    # Simple similarity check (could be enhanced with embedding similarity)
-                    common_words = set(query_lower.split()) & set(cached_query_lower.split())
-                    similarity = len(common_words) / max(len(query_lower.split()), len(cached_query_lower.split()))
-                    
-                    if similarity > 0.6:  # 60% word overlap threshold
-                        logger.info(f"Found cached wisdom for similar query. Similarity: {similarity:.2f}")
-                        return cached_item
+            matches = wisdom_cache_index.lookup(query_embedding)
+            for cache_oid, similarity in matches:
+                cached_item = wisdom_cache_collection.find_one({'_id': cache_oid, **APPROVED_FILTER})
+                if cached_item:
+                    logger.info(f"Found cached wisdom for similar query. Similarity: {similarity:.3f}")
+                    cached_item['similarity_score'] = similarity
+                    return cached_item
+                # Entry changed behind our back (e.g. approval revoked elsewhere)
+                wisdom_cache_index.remove(cache_oid)
             
             return None
         except Exception as e:
             logger.error(f"Error checking wisdom cache: {e}")
             return None
 
+    async def acheck_wisdom_cache(self, query: str, motor_db=None) -> Optional[Dict]:
+        """Async variant of check_wisdom_cache."""
+        if wisdom_cache_collection is None or wisdom_cache_index is None:
+            return None
+        try:
+            query_embedding = await self.agenerate_embeddings(query)
+            if not query_embedding:
+                return None
+            matches = await to_thread(wisdom_cache_index.lookup, query_embedding)
+            for cache_oid, similarity in matches:
+                selector = {'_id': cache_oid, **APPROVED_FILTER}
+                if motor_db is not None:
+                    cached_item = await motor_db['wisdom_cache'].find_one(selector)
+                else:
+                    cached_item = await to_thread(wisdom_cache_collection.find_one, selector)
+                if cached_item:
+                    logger.info(f"Found cached wisdom for similar query. Similarity: {similarity:.3f}")
+                    cached_item['similarity_score'] = similarity
+                    return cached_item
+                wisdom_cache_index.remove(cache_oid)
+            return None
+        except Exception as e:
+            logger.error(f"Error checking wisdom cache: {e}")
+            return None
+
+    def build_wisdom_cache_entry(self, query: str, response: str, sources: List[Dict], reasoning_pattern: Dict,
+                                 structured_response: Dict = None, source_details_for_trace: List[Dict] = None,
+                                 original_trace_id: str = None, query_embedding: List[float] = None) -> Dict:
+        """Build a wisdom cache document with complete reasoning trace data."""
+        # Prepare reasoning trace data for cached retrieval
+        focus_path_ids = []
+        if source_details_for_trace:
+            focus_path_ids = [doc.get('text_hash') for doc in source_details_for_trace if doc.get('text_hash')]
+        
+        # Create a comprehensive wisdom cache entry with full reasoning trace data
+        return {
+            'original_query': query,
+            'query_embedding': query_embedding,
+            'response_text': response,
+            'structured_response': structured_response,  # Store complete layered knowledge data
+            'source_documents': sources,
+            'reasoning_pattern': reasoning_pattern,
+            # Complete reasoning trace data for path explorer
+            'reasoning_trace_data': {
+                'retrieved_sources_detail': source_details_for_trace or [],
+                'focus_path_ids': focus_path_ids,
+                'citation_map_raw': reasoning_pattern.get('citation_mapping', []),
+                'full_response_text': response,
+                'query': query
+            },
+            'original_trace_id': original_trace_id,  # Reference to original trace if available
+            'created_at': datetime.now(timezone.utc),
+            'feedback_score': None,  # To be set by user feedback
+            'feedback_comments': [],
+            'is_approved': False,  # Requires positive feedback to be used
+            'usage_count': 0,
+            'philosophical_themes': self.extract_themes(query, response),
+            'complexity_score': self.calculate_complexity(query, response),
+            'quality_indicators': {
+                'source_diversity': len(set(s.get('ethical_framework', '') for s in sources)),
+                'response_length': len(response),
+                'citation_count': len(reasoning_pattern.get('citation_mapping', [])),
+                'era_coverage': len(set(s.get('era', '') for s in sources))
+            }
+        }
+
     def save_to_wisdom_cache(self, query: str, response: str, sources: List[Dict], reasoning_pattern: Dict, 
                            structured_response: Dict = None, source_details_for_trace: List[Dict] = None,
                            original_trace_id: str = None) -> str:
@@ -557,45 +772,11 @@ Text: {doc_detail['text_full'][:500]}...
             return None
             
         try:
-            # Prepare reasoning trace data for cached retrieval
-            focus_path_ids = []
-            if source_details_for_trace:
-                focus_path_ids = [doc.get('text_hash') for doc in source_details_for_trace if doc.get('text_hash')]
-            
-            # Create a comprehensive wisdom cache entry with full reasoning trace data
-            wisdom_entry = {
-                'original_query': query,
-                'query_embedding': self.generate_embeddings(query),
-                'response_text': response,
-                'structured_response': structured_response,  # Store complete layered knowledge data
-                'source_documents': sources,
-                'reasoning_pattern': reasoning_pattern,
-                # Complete reasoning trace data for path explorer
-                'reasoning_trace_data': {
-                    'retrieved_sources_detail': source_details_for_trace or [],
-                    'focus_path_ids': focus_path_ids,
-                    'citation_map_raw': reasoning_pattern.get('citation_mapping', []),
-                    'full_response_text': response,
-                    'query': query
-                },
-                'original_trace_id': original_trace_id,  # Reference to original trace if available
-                'created_at': datetime.now(timezone.utc),
-                'feedback_score': None,  # To be set by user feedback
-                'feedback_comments': [],
-                'is_approved': False,  # Requires positive feedback to be used
-                'usage_count': 0,
-                'philosophical_themes': self.extract_themes(query, response),
-                'complexity_score': self.calculate_complexity(query, response),
-                'quality_indicators': {
-                    'source_diversity': len(set(s.get('ethical_framework', '') for s in sources)),
-                    'response_length': len(response),
-                    'citation_count': len(reasoning_pattern.get('citation_mapping', [])),
-                    'era_coverage': len(set(s.get('era', '') for s in sources))
-                }
-            }
-            
-            result = wisdom_cache_collection.insert_one(wisdom_entry)
-            cache_id = str(result.inserted_id)
+            wisdom_entry = self.build_wisdom_cache_entry(
+                query, response, sources, reasoning_pattern, structured_response,
+                source_details_for_trace, original_trace_id, query_embedding=self.generate_embeddings(query)
+            )
+            cache_id = persist_document(wisdom_cache_collection, wisdom_entry)
             logger.info(f"Saved response to wisdom cache with ID: {cache_id} (includes reasoning trace data)")
             return cache_id
         except Exception as e:
@@ -655,12 +836,178 @@ Text: {doc_detail['text_full'][:500]}...
         return sum(factors) / len(factors) if factors else 0.0
 
 rag_system = SophiaGuardRAG()
+startup_report.mark("rag_system")
 
 @app.route('/')
 def home():
     """Home page"""
     return render_template('index.html')
 
+def cached_wisdom_result(query: str, cached_wisdom: Dict) -> Dict:
+    """Build the /api/query response body for a wisdom cache hit."""
+    # For cached responses, create a synthetic trace ID using the cache ID
+    cached_trace_id = f"cached_{str(cached_wisdom['_id'])}"
+    return {
+        'query': query,
+        'response': cached_wisdom['response_text'],
+        'structured_response': cached_wisdom.get('structured_response', {}),
+        'is_structured': bool(cached_wisdom.get('structured_response')),
+        'sources': cached_wisdom.get('source_documents', []),
+        'trace_id': cached_trace_id,  # Use synthetic trace ID for cached responses
+        'cache_id': str(cached_wisdom['_id']),
+        'is_cached': True,
+        'cache_score': cached_wisdom.get('feedback_score'),
+        'cache_similarity': cached_wisdom.get('similarity_score'),
+        'philosophical_themes': cached_wisdom.get('philosophical_themes', []),
+        'complexity_score': cached_wisdom.get('complexity_score', 0),
+        'timestamp': datetime.now(timezone.utc).isoformat()
+    }
+
+def validate_query_embedding(query: str, query_embedding: List[float]) -> Optional[str]:
+    """Return an error message if the query embedding cannot be used for vector search."""
+    if not query_embedding:
+        logger.error(f"Failed to generate query embedding for query: '{query}'. Embedding is empty or None.")
+        return 'Failed to generate query embeddings. Vector search cannot proceed.'
+    
+    has_nan = np.isnan(query_embedding).any()
+    has_inf = np.isinf(query_embedding).any()
+    if has_nan or has_inf:
+        logger.error(f"Query embedding for query '{query}' contains NaN or Infinity values. NaN: {has_nan}, Inf: {has_inf}. Embedding (first 10): {query_embedding[:10]}")
+        return 'Generated query embedding contains invalid numerical values (NaN/Infinity).'
+        
+    logger.info(f"Generated query embedding. Length: {len(query_embedding)}. First 5 elements: {query_embedding[:5]}")
+    return None
+
+def normalize_wisdom_response(structured_response, citation_map_raw) -> Tuple[Dict, str, bool]:
+    """Coerce a generated answer into the structured response shape the frontend expects."""
+    # Handle both structured and unstructured responses
+    if isinstance(structured_response, dict) and 'tldr' in structured_response:
+        return structured_response, structured_response.get('full_analysis', ''), True
+    response_text = str(structured_response)
+    structured_response = {
+        'tldr': response_text[:500] + '...' if len(response_text) > 500 else response_text,
+        'key_points': [],
+        'perspectives': [],
+        'full_analysis': response_text,
+        'citation_mapping': citation_map_raw or []
+    }
+    return structured_response, response_text, False
+
+def build_api_query_sources(retrieved_docs_raw: List[Dict]) -> List[Dict]:
+    """Summarize retrieved documents for the /api/query response."""
+    return [
+        {
+            'author': doc.get('author', 'Unknown'),
+            'source': doc.get('source', 'Unknown Source'),
+            'framework': doc.get('ethical_framework', 'General'),
+            'era': doc.get('era', 'Unknown Era'),
+            'relevance_score': doc.get('score', 0),
+            'excerpt': doc.get('text', '')[:500] + '...'
+        }
+        for doc in retrieved_docs_raw
+    ]
+
+def build_trace_doc(query: str, response_text: str, citation_map_raw, source_details_for_trace: List[Dict]) -> Dict:
+    """Build the reasoning trace document stored for the graph explorer."""
+    focus_path_ids = [doc['text_hash'] for doc in source_details_for_trace if 'text_hash' in doc]
+    return {
+        'query': query,
+        'full_response_text': response_text,
+        'citation_map_raw': citation_map_raw,
+        'retrieved_sources_detail': source_details_for_trace,
+        'focus_path_ids': focus_path_ids,
+        'timestamp': datetime.now(timezone.utc)
+    }
+
+def persist_document(collection, doc: Dict, on_written: Callable[[], None] = None) -> str:
+    """
+    Writes `doc` through the write-behind queue when enabled, otherwise inline. Returns its id.
+    `on_written` runs once the document is stored, which with write-behind is after this returns.
+    """
+    if AppConfig.WRITE_BEHIND_ENABLED:
+        return str(get_write_behind().enqueue(collection, doc, on_written))
+    doc_id = str(collection.insert_one(doc).inserted_id)
+    if on_written is not None:
+        on_written()
+    return doc_id
+
+def link_cache_to_trace(cache_id, trace_id: str):
+    """Records the trace behind a wisdom cache entry, once that trace is known to be stored."""
+    try:
+        wisdom_cache_collection.update_one({'_id': cache_id}, {'$set': {'original_trace_id': trace_id}})
+    except Exception as e:
+        logger.warning(f"Failed to link wisdom cache entry {cache_id} to trace {trace_id}: {e}")
+
+def find_persisted(collection, doc_id):
+    """find_one by _id that also sees documents still waiting in the write-behind queue."""
+    doc = collection.find_one({'_id': doc_id})
+    if doc is None and AppConfig.WRITE_BEHIND_ENABLED:
+        doc = get_write_behind().lookup_pending(doc_id)
+    return doc
+
+def persist_query_result(query: str, structured_response, citation_map_raw, retrieved_docs_raw: List[Dict],
+                         source_details_for_trace: List[Dict], query_embedding: List[float]) -> Dict:
+    """Save the trace and wisdom cache entry for a generated answer and build the /api/query result."""
+    structured_response, response_text, is_structured = normalize_wisdom_response(structured_response, citation_map_raw)
+    api_query_sources = build_api_query_sources(retrieved_docs_raw)
+
+    trace_id_str = None
+    trace_doc = None
+    if reasoning_traces_collection is not None:
+        trace_doc = build_trace_doc(query, response_text, citation_map_raw, source_details_for_trace)
+        logger.info(f"Attempting to insert reasoning trace into '{reasoning_traces_collection.name}'.")
+        trace_doc_summary = {
+            k: (str(v)[:500] + '...' if isinstance(v, str) and len(v) > 500 else v) 
+            for k, v in trace_doc.items()
+        }
+        logger.info(json.dumps(trace_doc_summary, indent=2, default=str))
+    else:
+        logger.warning("Reasoning traces collection not available. Trace not saved.")
+
+    # Save to wisdom cache for potential learning (requires user feedback to be approved)
+    cache_id_str = None
+    cache_entry = None
+    if wisdom_cache_collection is not None:
+        reasoning_pattern = {'citation_mapping': citation_map_raw} if citation_map_raw else {}
+        try:
+            # The trace id is added once the trace is stored, so the entry never points at a missing trace
+            cache_entry = rag_system.build_wisdom_cache_entry(
+                query, response_text, api_query_sources, reasoning_pattern, structured_response,
+                source_details_for_trace, None, query_embedding=query_embedding
+            )
+            cache_id_str = persist_document(wisdom_cache_collection, cache_entry)
+            logger.info(f"Saved response to wisdom cache with ID: {cache_id_str} (includes reasoning trace data)")
+        except Exception as e:
+            logger.error(f"Error saving to wisdom cache: {e}")
+
+    if trace_doc is not None:
+        link = None
+        if cache_id_str:
+            link = lambda: link_cache_to_trace(cache_entry['_id'], str(trace_doc['_id']))
+        try:
+            trace_id_str = persist_document(reasoning_traces_collection, trace_doc, on_written=link)
+            logger.info(f"Reasoning trace saved with ID: {trace_id_str}")
+        except Exception as e_trace:
+            logger.warning(f"Failed to save reasoning trace (likely due to storage quota): {e_trace}")
+            # Continue without saving the trace - the response will still work
+            trace_id_str = None
+
+    result = {
+        'query': query,
+        'response': response_text,
+        'structured_response': structured_response,
+        'is_structured': is_structured,
+        'sources': api_query_sources,
+        'trace_id': trace_id_str,
+        'cache_id': cache_id_str,
+        'is_cached': False,
+        'philosophical_themes': cache_entry['philosophical_themes'] if cache_entry else rag_system.extract_themes(query, response_text),
+        'complexity_score': cache_entry['complexity_score'] if cache_entry else rag_system.calculate_complexity(query, response_text),
+        'timestamp': datetime.now(timezone.utc).isoformat()
+    }
+
+    return result
+
 @app.route('/api/query', methods=['POST'])
 def query_endpoint():
     """Main query endpoint for SophiaGuard with wisdom caching"""
@@ -669,12 +1016,20 @@ def query_endpoint():
         query = data.get('query', '').strip()
         query_mode = data.get('mode', 'explore')  # Get the mode, default to 'explore'
         use_cache = data.get('use_cache', True)  # Allow disabling cache
-        logger.info(f"Received query: '{query}' (mode: {query_mode}, use_cache: {use_cache})")
+        execution_mode = data.get('execution_mode', AppConfig.QUERY_EXECUTION_MODE)
+        logger.info(f"Received query: '{query}' (mode: {query_mode}, use_cache: {use_cache}, execution: {execution_mode})")
 
         if not query:
             logger.warning("Query was empty after stripping.")
             return jsonify({'error': 'Query cannot be empty'}), 400
 
+        if execution_mode == 'async':
+            result, status = get_async_runtime().run(
+                process_query_async(query, query_mode, use_cache),
+                timeout=AppConfig.QUERY_TIMEOUT_SECONDS
+            )
+            return jsonify(result), status
+
         # Check wisdom cache first for high-quality cached responses
         cached_wisdom = None
         if use_cache:
@@ -690,132 +1045,184 @@ def query_endpoint():
                 except Exception as e:
                     logger.warning(f"Failed to update usage count: {e}")
                 
-                # For cached responses, create a synthetic trace ID using the cache ID
-                cached_trace_id = f"cached_{str(cached_wisdom['_id'])}"
-                
-                return jsonify({
-                    'query': query,
-                    'response': cached_wisdom['response_text'],
-                    'structured_response': cached_wisdom.get('structured_response', {}),
-                    'is_structured': bool(cached_wisdom.get('structured_response')),
-                    'sources': cached_wisdom.get('source_documents', []),
-                    'trace_id': cached_trace_id,  # Use synthetic trace ID for cached responses
-                    'cache_id': str(cached_wisdom['_id']),
-                    'is_cached': True,
-                    'cache_score': cached_wisdom.get('feedback_score'),
-                    'philosophical_themes': cached_wisdom.get('philosophical_themes', []),
-                    'complexity_score': cached_wisdom.get('complexity_score', 0),
-                    'timestamp': datetime.now(timezone.utc).isoformat()
-                })
+                return jsonify(cached_wisdom_result(query, cached_wisdom))
 
         logger.info(f"Generating embedding for query: '{query}'")
         query_embedding = rag_system.generate_embeddings(query)
-
-        if not query_embedding:
-            logger.error(f"Failed to generate query embedding for query: '{query}'. Embedding is empty or None.")
-            return jsonify({'error': 'Failed to generate query embeddings. Vector search cannot proceed.'}), 500
-        
-        has_nan = np.isnan(query_embedding).any()
-        has_inf = np.isinf(query_embedding).any()
-        if has_nan or has_inf:
-            logger.error(f"Query embedding for query '{query}' contains NaN or Infinity values. NaN: {has_nan}, Inf: {has_inf}. Embedding (first 10): {query_embedding[:10]}")
-            return jsonify({'error': 'Generated query embedding contains invalid numerical values (NaN/Infinity).'}), 500
-            
-        logger.info(f"Generated query embedding. Length: {len(query_embedding)}. First 5 elements: {query_embedding[:5]}")
+        embedding_error = validate_query_embedding(query, query_embedding)
+        if embedding_error:
+            return jsonify({'error': embedding_error}), 500
 
         retrieved_docs_raw = rag_system.vector_search(query_embedding, limit=5)
         source_details_for_trace = [] # Initialize to ensure it's defined
 
         if not retrieved_docs_raw:
             logger.info(f"No relevant documents found for query: '{query}'. Attempting to generate response without specific context.")
-            if query_mode == 'explore':
-                structured_response, citation_map_raw = rag_system.generate_wisdom_response(query, [])
-            
-            # Handle both structured and unstructured responses
-            if isinstance(structured_response, dict) and 'tldr' in structured_response:
-                response_text = structured_response.get('full_analysis', '')
-                is_structured = True
-            else:
-                response_text = str(structured_response)
-                structured_response = {
-                    'tldr': response_text[:500] + '...' if len(response_text) > 500 else response_text,
-                    'key_points': [],
-                    'perspectives': [],
-                    'full_analysis': response_text,
-                    'citation_mapping': citation_map_raw or []
-                }
-                is_structured = False
-            
-            api_query_sources = [] 
         else:
             _, source_details_for_trace = rag_system.build_context_string_and_details(retrieved_docs_raw)
-            if query_mode == 'explore':
-                structured_response, citation_map_raw = rag_system.generate_wisdom_response(query, source_details_for_trace)
-            
-            # Handle both structured and unstructured responses
-            if isinstance(structured_response, dict) and 'tldr' in structured_response:
-                response_text = structured_response.get('full_analysis', '')
-                is_structured = True
-            else:
-                response_text = str(structured_response)
-                structured_response = {
-                    'tldr': response_text[:500] + '...' if len(response_text) > 500 else response_text,
-                    'key_points': [],
-                    'perspectives': [],
-                    'full_analysis': response_text,
-                    'citation_mapping': citation_map_raw or []
-                }
-                is_structured = False
-            
-            api_query_sources = [
-                {
-                    'author': doc.get('author', 'Unknown'),
-                    'source': doc.get('source', 'Unknown Source'),
-                    'framework': doc.get('ethical_framework', 'General'),
-                    'era': doc.get('era', 'Unknown Era'),
-                    'relevance_score': doc.get('score', 0),
-                    'excerpt': doc.get('text', '')[:500] + '...'
-                }
-                for doc in retrieved_docs_raw
-            ]
+        if query_mode == 'explore':
+            structured_response, citation_map_raw = rag_system.generate_wisdom_response(query, source_details_for_trace)
+        result = persist_query_result(query, structured_response, citation_map_raw, retrieved_docs_raw,
+                                      source_details_for_trace, query_embedding)
+        return jsonify(result)
 
-        trace_id_str = None
-        if reasoning_traces_collection is not None:
-            current_source_details = source_details_for_trace # This will be empty if no docs were found
-            focus_path_ids = [doc['text_hash'] for doc in current_source_details if 'text_hash' in doc]
-            
-            trace_doc = {
-                'query': query,
-                'full_response_text': response_text,
-                'citation_map_raw': citation_map_raw,
-                'retrieved_sources_detail': current_source_details,
-                'focus_path_ids': focus_path_ids,
-                'timestamp': datetime.now(timezone.utc)
-            }
-            logger.info(f"Attempting to insert reasoning trace into '{reasoning_traces_collection.name}'.")
-            trace_doc_summary = {
-                k: (str(v)[:500] + '...' if isinstance(v, str) and len(v) > 500 else v) 
-                for k, v in trace_doc.items()
-            }
-            logger.info(json.dumps(trace_doc_summary, indent=2, default=str))
-            try:
-                insert_result = reasoning_traces_collection.insert_one(trace_doc)
-                trace_id_str = str(insert_result.inserted_id)
-                logger.info(f"Reasoning trace saved with ID: {trace_id_str}")
-            except Exception as e_trace:
-                logger.warning(f"Failed to save reasoning trace (likely due to storage quota): {e_trace}")
-                # Continue without saving the trace - the response will still work
-                trace_id_str = None
-        else:
-            logger.warning("Reasoning traces collection not available. Trace not saved.")
+    except Exception as e:
+        logger.error(f"Query processing failed: {e}", exc_info=True)
+        return jsonify({'error': 'Internal server error'}), 500
 
-        # Save to wisdom cache for potential learning (requires user feedback to be approved)
-        cache_id_str = None
-        reasoning_pattern = {'citation_mapping': citation_map_raw} if citation_map_raw else {}
-        cache_id_str = rag_system.save_to_wisdom_cache(
-            query, response_text, api_query_sources, reasoning_pattern,
-            structured_response, source_details_for_trace, trace_id_str
-        )
+STREAMED_WISDOM_FIELDS = ('tldr', 'key_points', 'perspectives')
+
+def sse_event(event_type: str, payload: Any, event_id: Optional[str] = None) -> str:
+    id_line = f"id: {event_id}\n" if event_id else ""
+    return f"{id_line}data: {json_serialize({'type': event_type, 'payload': payload})}\n\n"
+
+@app.route('/api/query/stream', methods=['POST'])
+def query_stream_endpoint():
+    """Streaming variant of /api/query over server-sent events.
+
+    Emits `sources` once retrieval finishes, `token` for every chunk the model
+    produces, `field` as soon as tldr / key_points / perspectives are complete in
+    the streamed JSON, and a final `complete` event carrying the same payload as
+    /api/query (including trace_id and cache_id).
+    """
+    data = request.get_json() or {}
+    query = data.get('query', '').strip()
+    use_cache = data.get('use_cache', True)
+    if not query:
+        return jsonify({'error': 'Query cannot be empty'}), 400
+    logger.info(f"Received streaming query: '{query}' (use_cache: {use_cache})")
+
+    def generate_events():
+        try:
+            if use_cache:
+                cached_wisdom = rag_system.check_wisdom_cache(query)
+                if cached_wisdom:
+                    logger.info(f"Using cached wisdom for streaming query: '{query}'")
+                    try:
+                        wisdom_cache_collection.update_one({'_id': cached_wisdom['_id']}, {'$inc': {'usage_count': 1}})
+                    except Exception as e:
+                        logger.warning(f"Failed to update usage count: {e}")
+                    yield sse_event('complete', cached_wisdom_result(query, cached_wisdom))
+                    return
+
+            query_embedding = rag_system.generate_embeddings(query)
+            embedding_error = validate_query_embedding(query, query_embedding)
+            if embedding_error:
+                yield sse_event('error', {'message': embedding_error})
+                return
+
+            retrieved_docs_raw = rag_system.vector_search(query_embedding, limit=5)
+            source_details_for_trace = []
+            if retrieved_docs_raw:
+                _, source_details_for_trace = rag_system.build_context_string_and_details(retrieved_docs_raw)
+            yield sse_event('sources', build_api_query_sources(retrieved_docs_raw))
+
+            fields = StreamingJSONFields(STREAMED_WISDOM_FIELDS)
+            for token in rag_system.stream_wisdom_tokens(query, source_details_for_trace):
+                yield sse_event('token', {'text': token})
+                for name, value in fields.feed(token):
+                    yield sse_event('field', {'name': name, 'value': value})
+
+            structured_response, citation_map_raw = rag_system.parse_wisdom_response(fields.text)
+            yield sse_event('complete', persist_query_result(
+                query, structured_response, citation_map_raw, retrieved_docs_raw,
+                source_details_for_trace, query_embedding
+            ))
+        except Exception as e:
+            logger.error(f"Streaming query failed: {e}", exc_info=True)
+            yield sse_event('error', {'message': 'Internal server error'})
+
+    return Response(
+        generate_events(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Disable buffering for nginx
+        }
+    )
+
+async def _apersist(motor_collection, sync_collection, doc: Dict, on_written: Callable[[], None] = None) -> str:
+    """
+    Hand off to the write-behind queue, or insert through Motor / the blocking client off the loop.
+    `on_written` is only passed to the write-behind queue; inline callers know when their insert landed.
+    """
+    if AppConfig.WRITE_BEHIND_ENABLED:
+        return str(get_write_behind().enqueue(sync_collection, doc, on_written))
+    if motor_collection is not None:
+        return str((await motor_collection.insert_one(doc)).inserted_id)
+    return str((await to_thread(sync_collection.insert_one, doc)).inserted_id)
+
+async def process_query_async(query: str, query_mode: str, use_cache: bool) -> Tuple[Dict, int]:
+    """Asyncio variant of the /api/query pipeline, run on the shared async runtime.
+
+    Embedding, retrieval, generation and persistence all use non-blocking clients.
+    The trace and cache documents are either handed to the write-behind queue or
+    inserted concurrently; the cache entry gets the trace id only once the trace is stored.
+    """
+    runtime = get_async_runtime()
+    async with runtime.limiter:
+        motor_db = runtime.motor_db(Config.DATABASE_NAME)
+
+        if use_cache:
+            cached_wisdom = await rag_system.acheck_wisdom_cache(query, motor_db)
+            if cached_wisdom:
+                logger.info(f"Using cached wisdom for query: '{query}'")
+                try:
+                    update = {'$inc': {'usage_count': 1}}
+                    if motor_db is not None:
+                        await motor_db['wisdom_cache'].update_one({'_id': cached_wisdom['_id']}, update)
+                    else:
+                        await to_thread(wisdom_cache_collection.update_one, {'_id': cached_wisdom['_id']}, update)
+                except Exception as e:
+                    logger.warning(f"Failed to update usage count: {e}")
+                return cached_wisdom_result(query, cached_wisdom), 200
+
+        query_embedding = await rag_system.agenerate_embeddings(query)
+        embedding_error = validate_query_embedding(query, query_embedding)
+        if embedding_error:
+            return {'error': embedding_error}, 500
+
+        retrieved_docs_raw = await rag_system.avector_search(query_embedding, limit=5, motor_db=motor_db)
+        source_details_for_trace = []
+        if retrieved_docs_raw:
+            _, source_details_for_trace = rag_system.build_context_string_and_details(retrieved_docs_raw)
+        if query_mode == 'explore':
+            structured_response, citation_map_raw = await rag_system.agenerate_wisdom_response(query, source_details_for_trace)
+        structured_response, response_text, is_structured = normalize_wisdom_response(structured_response, citation_map_raw)
+        api_query_sources = build_api_query_sources(retrieved_docs_raw)
+
+        inserts, labels = [], []
+        cache_entry = None
+        trace_id = ObjectId()
+        link = None
+        # The cache entry is queued ahead of the trace, so it is stored by the time the trace's link runs
+        if wisdom_cache_collection is not None:
+            reasoning_pattern = {'citation_mapping': citation_map_raw} if citation_map_raw else {}
+            cache_entry = rag_system.build_wisdom_cache_entry(
+                query, response_text, api_query_sources, reasoning_pattern, structured_response,
+                source_details_for_trace, None, query_embedding=query_embedding
+            )
+            cache_entry['_id'] = ObjectId()
+            link = lambda: link_cache_to_trace(cache_entry['_id'], str(trace_id))
+            motor_cache = motor_db['wisdom_cache'] if motor_db is not None else None
+            inserts.append(_apersist(motor_cache, wisdom_cache_collection, cache_entry))
+            labels.append('cache')
+        if reasoning_traces_collection is not None:
+            trace_doc = build_trace_doc(query, response_text, citation_map_raw, source_details_for_trace)
+            trace_doc['_id'] = trace_id
+            motor_traces = motor_db[Config.REASONING_TRACES_COLLECTION_NAME] if motor_db is not None else None
+            inserts.append(_apersist(motor_traces, reasoning_traces_collection, trace_doc, on_written=link))
+            labels.append('trace')
+
+        saved_ids = {'trace': None, 'cache': None}
+        for label, outcome in zip(labels, await asyncio.gather(*inserts, return_exceptions=True)):
+            if isinstance(outcome, Exception):
+                logger.warning(f"Failed to save {label} document: {outcome}")
+            else:
+                saved_ids[label] = outcome
+        if not AppConfig.WRITE_BEHIND_ENABLED and saved_ids['trace'] and saved_ids['cache']:
+            # Both inserts are confirmed
+            await to_thread(link)
 
         result = {
             'query': query,
@@ -823,19 +1230,14 @@ def query_endpoint():
             'structured_response': structured_response,
             'is_structured': is_structured,
             'sources': api_query_sources,
-            'trace_id': trace_id_str,
-            'cache_id': cache_id_str,
+            'trace_id': saved_ids['trace'],
+            'cache_id': saved_ids['cache'],
             'is_cached': False,
-            'philosophical_themes': rag_system.extract_themes(query, response_text),
-            'complexity_score': rag_system.calculate_complexity(query, response_text),
+            'philosophical_themes': cache_entry['philosophical_themes'] if cache_entry else rag_system.extract_themes(query, response_text),
+            'complexity_score': cache_entry['complexity_score'] if cache_entry else rag_system.calculate_complexity(query, response_text),
             'timestamp': datetime.now(timezone.utc).isoformat()
         }
-
-        return jsonify(result)
-
-    except Exception as e:
-        logger.error(f"Query processing failed: {e}", exc_info=True)
-        return jsonify({'error': 'Internal server error'}), 500
+        return result, 200
 
 @app.route('/api/trace/<trace_id_str>', methods=['GET'])
 def trace_endpoint(trace_id_str: str):
@@ -850,7 +1252,7 @@ def trace_endpoint(trace_id_str: str):
         return jsonify({'error': 'Invalid trace_id format'}), 400
 
     logger.info(f"Attempting to find trace with _id: {trace_oid} in '{reasoning_traces_collection.name}'")
-    trace_data = reasoning_traces_collection.find_one({'_id': trace_oid})
+    trace_data = find_persisted(reasoning_traces_collection, trace_oid)
 
     if not trace_data:
         logger.warning(f"Trace not found for _id: {trace_oid}")
@@ -932,7 +1334,7 @@ def cached_trace_endpoint(cache_id_str: str):
         return jsonify({'error': 'Invalid cache_id format'}), 400
 
     logger.info(f"Attempting to find cached wisdom with _id: {cache_oid}")
-    cached_wisdom = wisdom_cache_collection.find_one({'_id': cache_oid})
+    cached_wisdom = find_persisted(wisdom_cache_collection, cache_oid)
 
     if not cached_wisdom:
         logger.warning(f"Cached wisdom not found for _id: {cache_oid}")
@@ -1022,9 +1424,94 @@ def get_all_agents():
         logger.error(f"Failed to get agents: {e}", exc_info=True)
         return jsonify({"error": "Internal server error"}), 500
 
+CRITIQUE_SYNTHESIS_PROMPT = """
+            You are a panel of diverse philosophical experts. An AI agent has made a decision. Synthesize a final, structured critique based *only* on the provided philosophical context.
+
+            AGENT'S DECISION:
+            Action: {action}
+            Justification: {justification}
+
+            PHILOSOPHICAL CONTEXT:
+            {critique_context}
+
+            TASK:
+            Produce a JSON object that summarizes the critique from each major perspective and identifies the core ethical tension.
+            """
+
+def _ignore_progress(event_type: str, payload: Any = None):
+    pass
+
+def run_learning_cycle(agent_id: str, publish: Callable = _ignore_progress) -> Optional[Dict]:
+    """
+    One learning cycle for an agent: scenario, decision, oracle critique, reflection.
+    Each step is reported through `publish(event_type, payload)` as it happens.
+    Returns None if no scenario is available.
+    """
+    agent = AIAgent(agent_id=agent_id, db=db)
+    # --- This logic is adapted from run_aletheia_loop.py ---
+    publish("scenario_loading", {"message": "Loading scenario..."})
+    scenario = sim_instance.get_adaptive_scenario(agent_id, agent.version)
+    if not scenario:
+        logger.error(f"No scenarios available for agent {agent_id}")
+        return None
+    publish("scenario_loaded", {"scenario": scenario})
+
+    publish("decision_making", {"message": "Agent making decision..."})
+    decision = agent.decide_action(scenario)
+    publish("decision_made", {"decision": decision})
+
+    publish("critique_generating", {"message": "Generating wisdom oracle critique..."})
+    critique_context_data = oracle_instance.generate_structured_critique(
+        scenario, decision.get('action'), decision.get('justification')
+    )
+    critique_synthesis_prompt = CRITIQUE_SYNTHESIS_PROMPT.format(
+        action=decision.get('action'),
+        justification=decision.get('justification'),
+        critique_context=critique_context_data['critique_context']
+    )
+    final_critique_str = agent._call_llm(critique_synthesis_prompt, is_json_output=True)
+    try:
+        final_critique = json.loads(final_critique_str)
+    except json.JSONDecodeError as e:
+        # A malformed critique fails the cycle rather than being reflected on
+        logger.error(f"Failed to parse critique JSON: {e}. Raw critique string: {final_critique_str}")
+        raise ValueError(f"Oracle critique was not valid JSON: {e}") from e
+    publish("critique_generated", {"critique": final_critique})
+
+    publish("reflection_starting", {"message": "Agent reflecting on critique..."})
+    reflection = agent.reflect_and_correct(scenario, decision, final_critique_str)
+    publish("reflection_complete", {"reflection": reflection})
+    publish("constitution_updated", {"agent": {"version": agent.version, "constitution": agent.constitution}})
+
+    sim_instance.log_interaction(
+        str(agent.agent_id),
+        agent.version - 1,
+        scenario,
+        decision,
+        final_critique_str,
+        reflection
+    )
+    return {
+        "scenario_title": scenario['title'],
+        "decision": decision,
+        "new_version": agent.version
+    }
+
+learning_scheduler = get_learning_scheduler(db, run_learning_cycle) if db is not None else None
+
+def job_view(job: Dict) -> Dict:
+    results = job.get('results') or []
+    return dict(job, _id=str(job['_id']), job_id=str(job['_id']),
+                final_version=results[-1]['new_version'] if results else None)
+
 @app.route('/api/aletheia/start_cycle', methods=['POST'])
 def start_learning_cycle():
-    """Triggers learning cycles for a given agent."""
+    """
+    Runs learning cycles for a given agent through the job scheduler. Cycles for one agent
+    run in order; different agents run in parallel. By default the request blocks until the
+    job finishes (up to "timeout" seconds) and returns the completed results, as it always
+    has; with "wait": false it returns the queued job (202) to follow by its job_id.
+    """
     if db is None or sim_instance is None or oracle_instance is None:
         return jsonify({"error": "Core services not initialized"}), 500
         
@@ -1033,88 +1520,138 @@ def start_learning_cycle():
     cycles = data.get('cycles', 1)  # Get cycles parameter, default to 1
     if not agent_id:
         return jsonify({"error": "agent_id is required"}), 400
+    if not isinstance(cycles, int) or cycles < 1:
+        return jsonify({"error": "cycles must be a positive integer"}), 400
 
     try:
-        logger.info(f"Starting {cycles} learning cycles for agent {agent_id}")
-        
-        # Run multiple cycles
-        final_results = []
-        for cycle_num in range(1, cycles + 1):
-            logger.info(f"Running cycle {cycle_num} of {cycles}")
-            agent = AIAgent(agent_id=agent_id, db=db)
-            
-            # --- This logic is adapted from run_aletheia_loop.py ---
-            scenario = sim_instance.get_adaptive_scenario(agent_id, agent.version)
-            if not scenario:
-                logger.error(f"No scenarios available for cycle {cycle_num}")
-                continue
-
-            decision = agent.decide_action(scenario)
-            
-            critique_context_data = oracle_instance.generate_structured_critique(
-                scenario, decision.get('action'), decision.get('justification')
-            )
-            critique_context = critique_context_data['critique_context']
-
-            critique_synthesis_prompt = f"""
-            You are a panel of diverse philosophical experts. An AI agent has made a decision. Synthesize a final, structured critique based *only* on the provided philosophical context.
-
-            AGENT'S DECISION:
-            Action: {decision.get('action')}
-            Justification: {decision.get('justification')}
-
-            PHILOSOPHICAL CONTEXT:
-            {critique_context}
-
-            TASK:
-            Produce a JSON object that summarizes the critique from each major perspective and identifies the core ethical tension.
-            """
-            final_critique_str = agent._call_llm(critique_synthesis_prompt, is_json_output=True)
-            final_critique = json.loads(final_critique_str)
-
-            reflection = agent.reflect_and_correct(scenario, decision, final_critique_str)
-
-            sim_instance.log_interaction(
-                str(agent.agent_id),
-                agent.version - 1,
-                scenario,
-                decision,
-                final_critique_str,
-                reflection
-            )
-            
-            final_results.append({
-                "cycle": cycle_num,
-                "scenario_title": scenario['title'],
-                "decision": decision,
-                "new_version": agent.version
-            })
-        
+        if db[AppConfig.AGENTS_COLLECTION].find_one({"agent_id": agent_id}, {"_id": 1}) is None:
+            return jsonify({"error": "Agent not found"}), 404
+        job = learning_scheduler.submit(agent_id, cycles)
+        if not data.get('wait', True):
+            return jsonify(job_view(job)), 202
+
+        job = learning_scheduler.wait(job['_id'], timeout=float(data.get('timeout', 600)))
+        if job['status'] not in FINISHED_STATUSES:
+            return jsonify(job_view(job)), 202
+        if job['status'] == FAILED:
+            return jsonify({"error": f"An internal error occurred: {job['error']}", "job_id": str(job['_id'])}), 500
+        view = job_view(job)
         return jsonify({
-            "message": f"Completed {len(final_results)} learning cycles successfully.",
+            "message": f"Completed {job['cycles_completed']} learning cycles successfully.",
+            "job_id": view['job_id'],
             "agent_id": agent_id,
-            "cycles_completed": len(final_results),
-            "results": final_results,
-            "final_version": agent.version if final_results else None
+            "cycles_completed": job['cycles_completed'],
+            "results": job['results'],
+            "final_version": view['final_version']
         })
 
     except Exception as e:
-        logger.error(f"Error during learning cycle: {e}", exc_info=True)
+        logger.error(f"Error queuing learning cycle: {e}", exc_info=True)
         return jsonify({"error": f"An internal error occurred: {e}"}), 500
 
+@app.route('/api/aletheia/jobs', methods=['GET'])
+def list_learning_jobs():
+    """Recent learning jobs, newest first; filter with ?agent_id= and ?status=."""
+    if learning_scheduler is None:
+        return jsonify({"error": "Database not connected"}), 500
+    try:
+        limit = min(request.args.get('limit', 50, type=int), MAX_HISTORY_PAGE_SIZE)
+        jobs = learning_scheduler.list_jobs(request.args.get('agent_id'), request.args.get('status'), limit)
+        return jsonify([job_view(job) for job in jobs])
+    except Exception as e:
+        logger.error(f"Failed to list learning jobs: {e}", exc_info=True)
+        return jsonify({"error": "Internal server error"}), 500
+
+@app.route('/api/aletheia/jobs/<job_id>', methods=['GET'])
+def get_learning_job(job_id):
+    if learning_scheduler is None:
+        return jsonify({"error": "Database not connected"}), 500
+    try:
+        job = learning_scheduler.get_job(job_id)
+    except InvalidId:
+        return jsonify({"error": "Invalid job id"}), 400
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job_view(job))
+
+@app.route('/api/aletheia/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_learning_job(job_id):
+    """Cancels a queued job, or stops a running one after its current cycle."""
+    if learning_scheduler is None:
+        return jsonify({"error": "Database not connected"}), 500
+    try:
+        job = learning_scheduler.cancel(job_id)
+    except InvalidId:
+        return jsonify({"error": "Invalid job id"}), 400
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job_view(job))
+
+MAX_HISTORY_PAGE_SIZE = 200
+# The critique context alone is several KB per cycle; list views leave it (and the copied metadata) out
+HISTORY_LIST_EXCLUDED_FIELDS = {'oracle_critique_context': 0, 'scenario_metadata': 0, 'performance_metrics': 0}
+
+def history_page(agent_id: str, projection: Optional[Dict], after: Optional[str], limit: int):
+    """
+    One page of an agent's learning history, newest first by (timestamp, _id), served from the
+    (agent_id, timestamp, _id) index. `after` is the _id of the last item of the previous
+    page. Returns the items and the cursor for the next page, or None on the last page.
+    """
+    history_collection = db[AppConfig.LEARNING_HISTORY_COLLECTION]
+    query = {'agent_id': agent_id}
+    if after:
+        anchor = history_collection.find_one({'_id': ObjectId(after), 'agent_id': agent_id}, {'timestamp': 1})
+        if anchor is None:
+            raise ValueError(f"Unknown history cursor: {after}")
+        query['$or'] = [
+            {'timestamp': {'$lt': anchor['timestamp']}},
+            {'timestamp': anchor['timestamp'], '_id': {'$lt': anchor['_id']}}
+        ]
+    items = list(history_collection.find(query, projection)
+                 .sort([('timestamp', -1), ('_id', -1)])
+                 .limit(limit + 1))
+    next_after = str(items[limit - 1]['_id']) if len(items) > limit else None
+    return items[:limit], next_after
+
+def history_page_args(default_limit: int):
+    """Reads and clamps the `after` / `limit` query parameters."""
+    limit = request.args.get('limit', default_limit, type=int)
+    return request.args.get('after'), max(1, min(limit, MAX_HISTORY_PAGE_SIZE))
+
+def int_arg(name: str) -> Optional[int]:
+    """Reads an optional integer query parameter, raising ValueError (a 400) when it isn't one."""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"'{name}' must be an integer")
+
+def paginated_response(items, next_after: Optional[str]):
+    # Body stays a plain list for existing clients; the next-page cursor travels in a header
+    response = jsonify(items)
+    if next_after:
+        response.headers['X-Next-After'] = next_after
+    return response
+
 @app.route('/api/aletheia/history/<agent_id>', methods=['GET'])
 def get_learning_history(agent_id):
-    """Retrieves the learning history for a specific agent."""
+    """Retrieves the learning history for a specific agent, newest first, one page at a time."""
     if db is None:
         return jsonify({"error": "Database not connected"}), 500
     try:
-        history_collection = db[AppConfig.LEARNING_HISTORY_COLLECTION]
-        history = list(history_collection.find({"agent_id": agent_id}).sort("timestamp", -1).limit(20))
+        after, limit = history_page_args(20)
+        include_context = request.args.get('include_context', 'false').lower() == 'true'
+        projection = None if include_context else HISTORY_LIST_EXCLUDED_FIELDS
+        history, next_after = history_page(agent_id, projection, after, limit)
         for item in history:
             item['_id'] = str(item['_id'])
             if 'scenario_id' in item:
                 item['scenario_id'] = str(item['scenario_id'])
-        return jsonify(history)
+        return paginated_response(history, next_after)
+    except (ValueError, InvalidId) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error(f"Failed to get learning history for agent {agent_id}: {e}", exc_info=True)
         return jsonify({"error": "Internal server error"}), 500
@@ -1167,7 +1704,8 @@ def seed_aletheia_database():
         # Clear and seed scenarios collection
         scenarios_collection = db[AppConfig.SCENARIOS_COLLECTION]
         scenarios_collection.drop()
-        scenarios_collection.insert_many(scenarios)
+        scenarios_collection.insert_many([with_scenario_features(s) for s in scenarios])
+        ensure_scenario_feature_indexes(scenarios_collection)
         logger.info(f"Successfully seeded {len(scenarios)} scenarios into '{AppConfig.SCENARIOS_COLLECTION}'.")
 
         # Clear and seed agents collection
@@ -1218,6 +1756,8 @@ def create_agent():
             "last_updated": datetime.now(timezone.utc)
         }
         result = agents_collection.insert_one(agent_doc)
+        get_constitution_versions(db).record(agent_doc["agent_id"], 1, initial_constitution,
+                                             strategy="initial", reasoning="Initial constitution")
         agent_doc['_id'] = str(result.inserted_id)
         return jsonify(agent_doc), 201
     except Exception as e:
@@ -1281,6 +1821,9 @@ def submit_feedback():
         if cache_id:
             try:
                 cache_oid = ObjectId(cache_id)
+                if AppConfig.WRITE_BEHIND_ENABLED:
+                    # The entry may still be waiting in the write-behind queue
+                    get_write_behind().wait_flushed(cache_oid)
                 
                 # Update the cache entry with feedback
                 update_doc = {
@@ -1310,6 +1853,12 @@ def submit_feedback():
                 if cache_result.matched_count > 0:
                     updated_cache_entry = wisdom_cache_collection.find_one({'_id': cache_oid})
                     logger.info(f"Cache entry updated for cache_id: {cache_id}")
+                    # Keep the semantic lookup index in step with approvals
+                    if wisdom_cache_index is not None:
+                        if is_reusable(updated_cache_entry):
+                            wisdom_cache_index.upsert(cache_oid, updated_cache_entry.get('query_embedding'))
+                        else:
+                            wisdom_cache_index.remove(cache_oid)
                 else:
                     logger.warning(f"Cache entry not found for cache_id: {cache_id}")
                     
@@ -1391,12 +1940,30 @@ def wisdom_stats():
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """
+    Health check endpoint. Probes never create a lazily initialized service: each one
+    reports its stats once something has used it, and null until then.
+    """
+    embedding_cache = get_embedding_cache(create=False)
+    http_client = get_http_client(create=False)
+    llm_gateway = get_llm_gateway(create=False)
+    llm_cache = get_llm_cache(create=False)
+    model_registry = get_model_registry(create=False)
+    write_behind = get_write_behind(create=False)
     status = {
         'status': 'healthy',
-        'vertex_ai': vertex_ai_initialized,
+        # Never triggers the lazy vertexai import/init; false until something has used Vertex AI
+        'vertex_ai': vertex_ai.initialized and vertex_ai.get(),
         'mongodb': mongo_client is not None,
         'wisdom_cache': wisdom_cache_collection is not None,
+        'embedding_cache': embedding_cache.stats() if embedding_cache is not None else None,
+        'http_client': http_client.stats() if http_client is not None else None,
+        'llm_gateway': llm_gateway.stats() if llm_gateway is not None else None,
+        'llm_cache': llm_cache.stats() if llm_cache is not None else None,
+        'model_registry': model_registry.stats() if model_registry is not None else None,
+        'learning_scheduler': learning_scheduler.stats() if learning_scheduler is not None else None,
+        'progress_bus': learning_scheduler.bus.stats() if learning_scheduler is not None else None,
+        'write_behind': write_behind.snapshot_stats() if write_behind is not None else None,
         'timestamp': datetime.now(timezone.utc).isoformat()
     }
     return jsonify(status)
@@ -1465,6 +2032,7 @@ def create_scenario():
             "estimated_time": data.get('estimated_time', 5),
             "created_at": datetime.now(timezone.utc)
         }
+        with_scenario_features(scenario_doc)
         
         result = scenarios_collection.insert_one(scenario_doc)
         scenario_doc['_id'] = str(result.inserted_id)
@@ -1474,6 +2042,18 @@ def create_scenario():
         logger.error(f"Failed to create scenario: {e}", exc_info=True)
         return jsonify({"error": "Internal server error"}), 500
 
+@app.route('/api/aletheia/scenarios/backfill_features', methods=['POST'])
+def backfill_features():
+    """Compute and store text features for scenarios inserted before they were precomputed"""
+    if db is None:
+        return jsonify({"error": "Database not connected"}), 500
+    try:
+        updated = backfill_scenario_features(db[AppConfig.SCENARIOS_COLLECTION])
+        return jsonify({"success": True, "updated": updated})
+    except Exception as e:
+        logger.error(f"Failed to backfill scenario features: {e}", exc_info=True)
+        return jsonify({"error": "Internal server error"}), 500
+
 @app.route('/api/scenarios/random', methods=['GET'])
 def get_random_scenario_legacy():
     """Get a random scenario (legacy endpoint for compatibility)"""
@@ -1632,7 +2212,7 @@ def stress_test_principle():
 def generate_stress_test_response(principle: str, retrieved_docs_with_labels: List[Dict]) -> Tuple[str, Optional[List[Dict]]]:
     """Generate specialized stress-test analysis using retrieved failure-mode documents."""
     try:
-        if not rag_system.client:
+        if not rag_system.llm or not rag_system.llm.available:
             logger.error("Gemini API client not initialized. Cannot generate stress test response.")
             raise Exception("Gemini API client not initialized")
 
@@ -1705,8 +2285,6 @@ Generate your red-team analysis now as valid JSON:"""
         model_name = "gemini-2.5-flash-preview-05-20"
         logger.info(f"Generating stress-test analysis with model: {model_name}")
         
-        client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
-
         contents = [
             types.Content(
                 role="user",
@@ -1720,7 +2298,7 @@ Generate your red-team analysis now as valid JSON:"""
 
         llm_response_text_full_parts = []
         try:
-            stream = client.models.generate_content_stream(
+            stream = rag_system.llm.stream(
                 model=model_name,
                 contents=contents,
                 config=request_config,
@@ -1979,48 +2557,63 @@ def get_agent_by_id(agent_id):
 
 @app.route('/api/aletheia/agents/<agent_id>/constitution-history', methods=['GET'])
 def get_constitution_history(agent_id):
-    """Get the constitution evolution history for an agent"""
+    """
+    Get the constitution evolution history for an agent from the constitution_versions collection.
+    Query parameters: `version` (one version), `as_of` (ISO timestamp; the version in force then),
+    or a range with `from_version` / `to_version`, paged with `after` (last version seen) and `limit`.
+    """
     if db is None:
         return jsonify({"error": "Database not connected"}), 500
     try:
-        # First, get the agent's initial constitution
         agents_collection = db[AppConfig.AGENTS_COLLECTION]
-        agent = agents_collection.find_one({"agent_id": agent_id})
+        agent = agents_collection.find_one({"agent_id": agent_id}, {"initial_constitution": 1, "constitution": 1,
+                                                                    "created_at": 1, "name": 1, "agent_id": 1})
         
         if not agent:
             return jsonify({"error": "Agent not found"}), 404
-            
-        constitution_history = []
         
-        # Add the initial constitution as version 1
-        constitution_history.append({
-            'version': 1,
-            'constitution': agent.get('initial_constitution', agent.get('constitution', [])),
-            'timestamp': agent.get('created_at', agent.get('_id').generation_time if '_id' in agent else datetime.now()),
-            'reasoning': 'Initial constitution',
-            'scenario_title': 'Agent Creation',
-            'agent_name': agent.get('name', f'Agent {agent_id}')
-        })
-        
-        # Get all interactions for this agent to reconstruct constitution history
-        history_collection = db[AppConfig.LEARNING_HISTORY_COLLECTION]
-        interactions = list(history_collection.find(
-            {"agent_id": agent_id}
-        ).sort("timestamp", 1))
+        versions = get_constitution_versions(db)
+        # Agents that predate the versions collection get their records built from the learning history once
+        versions.ensure_materialized(agent_id, agent)
+        
+        next_after = None
+        if request.args.get('version') is not None:
+            record = versions.get_version(agent_id, int_arg('version'))
+            records = [record] if record else []
+        elif request.args.get('as_of'):
+            as_of = datetime.fromisoformat(request.args['as_of'].replace('Z', '+00:00'))
+            record = versions.get_as_of(agent_id, as_of)
+            records = [record] if record else []
+        else:
+            limit = max(1, min(request.args.get('limit', 100, type=int), MAX_HISTORY_PAGE_SIZE))
+            from_version = int_arg('from_version')
+            after = int_arg('after')
+            if after is not None:
+                from_version = max(from_version or 0, after + 1)
+            records = versions.get_range(agent_id, from_version, int_arg('to_version'), limit + 1)
+            if len(records) > limit:
+                records = records[:limit]
+                next_after = str(records[-1]['version'])
         
-        for interaction in interactions:
-            if interaction.get('constitution_after_reflection'):
-                constitution_history.append({
-                    'version': interaction.get('agent_version_before_reflection', 1) + 1,
-                    'constitution': interaction['constitution_after_reflection'],
-                    'timestamp': interaction.get('timestamp'),
-                    'reasoning': interaction.get('agent_reflection', {}).get('reasoning_for_change', ''),
-                    'scenario_title': interaction.get('scenario_title', ''),
-                    'interaction_id': str(interaction['_id']),
-                    'agent_name': agent.get('name', f'Agent {agent_id}')
-                })
+        constitution_history = []
+        for record in records:
+            entry = {
+                'version': record['version'],
+                'constitution': record['principles'],
+                'diff': record.get('diff'),
+                'strategy': record.get('strategy'),
+                'timestamp': record.get('created_at'),
+                'reasoning': record.get('reasoning') or '',
+                'scenario_title': 'Agent Creation' if record['version'] == 1 else record.get('scenario_title') or '',
+                'agent_name': agent.get('name', f'Agent {agent_id}')
+            }
+            if record.get('interaction_id'):
+                entry['interaction_id'] = record['interaction_id']
+            constitution_history.append(entry)
         
-        return jsonify(constitution_history)
+        return paginated_response(constitution_history, next_after)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error(f"Failed to get constitution history for agent {agent_id}: {e}", exc_info=True)
         return jsonify({"error": "Internal server error"}), 500
@@ -2082,6 +2675,8 @@ def update_agent_constitution(agent_id):
         )
         
         if result.modified_count > 0:
+            get_constitution_versions(db).record(agent_id, new_version, new_constitution, agent.get('constitution', []),
+                                                 strategy="manual", reasoning="Manual constitution update")
             return jsonify({
                 "success": True,
                 "new_version": new_version,
@@ -2113,6 +2708,10 @@ def delete_agent(agent_id):
         
         # Delete agent's learning history
         history_result = history_collection.delete_many({"agent_id": agent_id})
+        db[AppConfig.AGENT_PERFORMANCE_COLLECTION].delete_one({"_id": agent_id})
+        db[AppConfig.CONSTITUTION_VERSIONS_COLLECTION].delete_many({"agent_id": agent_id})
+        # A cycle already in flight finishes; the scheduler finds no further job for the agent
+        db[AppConfig.LEARNING_JOBS_COLLECTION].delete_many({"agent_id": agent_id})
         
         # Delete analytics data if available
         try:
@@ -2134,9 +2733,33 @@ def delete_agent(agent_id):
         logger.error(f"Failed to delete agent {agent_id}: {e}", exc_info=True)
         return jsonify({"error": "Internal server error"}), 500
 
+def finished_job_events(job: Optional[Dict]) -> List[Tuple[str, Dict]]:
+    """Terminal events for a job whose progress was published by another process."""
+    if job is None:
+        return [("error", {"message": "Learning job not found"})]
+    events = [("cycle_complete", {"cycle": job['cycles_run']})] if job['cycles_run'] else []
+    if job['status'] == FAILED:
+        return events + [("error", {"message": job['error']})]
+    if job['status'] == CANCELLED:
+        return events + [("job_cancelled", {"cycles_run": job['cycles_run']})]
+    return events + [("all_cycles_complete", {"total_cycles": job['cycles']})]
+
+def finished_job_stream(topic: str, job: Optional[Dict]) -> Iterator[str]:
+    """SSE frames for `finished_job_events`; the last carries the topic's final id, so a reconnect gets 204."""
+    events = finished_job_events(job)
+    for index, (event_type, payload) in enumerate(events):
+        yield sse_event(event_type, payload, final_event_id(topic) if index == len(events) - 1 else None)
+
 @app.route('/api/aletheia/stream/learning/<agent_id>', methods=['GET', 'OPTIONS'])
 def learning_updates_stream(agent_id):
-    """Server-Sent Events endpoint for real-time learning updates"""
+    """
+    Server-Sent Events endpoint for real-time learning updates.
+
+    Follows one learning job: the one named by ?job_id=, else the agent's unfinished job,
+    else a new job of ?cycles= cycles. Events are pushed as the scheduler publishes them;
+    every event carries an id, and a client reconnecting with Last-Event-ID resumes after
+    it from the job's replay buffer. Any number of clients can follow the same job.
+    """
     # Handle preflight request
     if request.method == 'OPTIONS':
         response = make_response()
@@ -2144,202 +2767,55 @@ def learning_updates_stream(agent_id):
         response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
         response.headers.add('Access-Control-Allow-Methods', 'GET')
         return response
-    
-    from flask import Response
-    import json
-    import threading
-    import queue
-    import time
-    
-    logger.info(f"SSE endpoint called for agent {agent_id}")
-    
-    # Get cycles parameter from query string (default to 1)
-    cycles = request.args.get('cycles', 1, type=int)
-    logger.info(f"SSE cycles parameter: {cycles}")
-    
-    def generate_updates():
-        update_queue = queue.Queue()
-        
-        def run_learning_cycle_with_updates():
-            """Run learning cycle and send updates to queue"""
-            try:
-                if db is None or sim_instance is None or oracle_instance is None:
-                    update_queue.put({
-                        "type": "error",
-                        "payload": {"message": "Core services not initialized"}
-                    })
-                    return
-                logger.info(f"Starting learning cycle for agent {agent_id} with {cycles} cycles")
-                # Run multiple cycles
-                for cycle_num in range(1, cycles + 1):
-                    # Reload agent to get latest version for each cycle
-                    agent = AIAgent(agent_id=agent_id, db=db)
-                    logger.info(f"Cycle {cycle_num}: Loaded agent version {agent.version}")
-                    # Send cycle start
-                    update_queue.put({
-                        "type": "cycle_started", 
-                        "payload": {"cycle": cycle_num}
-                    })
-                    time.sleep(0.5)
-                    
-                    # Get scenario
-                    update_queue.put({
-                        "type": "scenario_loading",
-                        "payload": {"message": "Loading scenario..."}
-                    })
-                    time.sleep(0.5)
-                    logger.info(f"Cycle {cycle_num}: Fetching scenario for agent version {agent.version}")
-                    scenario = sim_instance.get_adaptive_scenario(agent_id, agent.version)
-                    if not scenario:
-                        update_queue.put({
-                            "type": "error",
-                            "payload": {"message": "No scenarios available for cycle " + str(cycle_num)}
-                        })
-                        continue  # Skip to next cycle instead of exiting completely
-                    
-                    # Convert ObjectId to string for JSON serialization
-                    scenario_serializable = dict(scenario)
-                    if '_id' in scenario_serializable:
-                        scenario_serializable['_id'] = str(scenario_serializable['_id'])
-                    
-                    update_queue.put({
-                        "type": "scenario_loaded",
-                        "payload": {"scenario": scenario_serializable}
-                    })
-                    time.sleep(0.5)
-                    logger.info(f"Cycle {cycle_num}: Loaded scenario '{scenario_serializable.get('title', 'N/A')}'")
-                    # Agent decision
-                    update_queue.put({
-                        "type": "decision_making",
-                        "payload": {"message": "Agent making decision..."}
-                    })
-                    time.sleep(1)
-                    
-                    decision = agent.decide_action(scenario_serializable)
-                    update_queue.put({
-                        "type": "decision_made",
-                        "payload": {"decision": decision}
-                    })
-                    time.sleep(0.5)
-                    
-                    # Oracle critique
-                    update_queue.put({
-                        "type": "critique_generating",
-                        "payload": {"message": "Generating wisdom oracle critique..."}
-                    })
-                    time.sleep(1)
-                    logger.info(f"Cycle {cycle_num}: Generating critique for decision {decision}")
-                    critique_context_data = oracle_instance.generate_structured_critique(
-                        scenario_serializable, decision.get('action'), decision.get('justification')
-                    )
-                    critique_context = critique_context_data['critique_context']
-                    
-                    critique_synthesis_prompt = f"""
-                    You are a panel of diverse philosophical experts. An AI agent has made a decision. Synthesize a final, structured critique based *only* on the provided philosophical context.
 
-                    AGENT'S DECISION:
-                    Action: {decision.get('action')}
-                    Justification: {decision.get('justification')}
+    if learning_scheduler is None or sim_instance is None or oracle_instance is None:
+        return jsonify({"error": "Core services not initialized"}), 500
 
-                    PHILOSOPHICAL CONTEXT:
-                    {critique_context}
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    if is_final_event_id(last_event_id):
+        # The client already has the job's synthesized outcome: stop it reconnecting
+        return '', 204
+    job_id, after_seq = parse_event_id(last_event_id)
+    job_id = job_id or request.args.get('job_id')
+    try:
+        if job_id:
+            job = learning_scheduler.get_job(job_id)
+            if job is None or job['agent_id'] != agent_id:
+                return jsonify({"error": "Learning job not found"}), 404
+        else:
+            job = learning_scheduler.active_job(agent_id)
+            if job is None:
+                cycles = request.args.get('cycles', 1, type=int)
+                if cycles < 1:
+                    return jsonify({"error": "cycles must be a positive integer"}), 400
+                job = learning_scheduler.submit(agent_id, cycles)
+    except InvalidId:
+        return jsonify({"error": "Invalid job id"}), 400
+    topic = str(job['_id'])
+    bus = learning_scheduler.bus
+    finished = job['status'] in FINISHED_STATUSES
+    if finished and after_seq and after_seq >= bus.last_seq(topic):
+        # A reconnect after the final event: 204 tells EventSource to stop reconnecting
+        return '', 204
+    logger.info(f"SSE client following learning job {topic} for agent {agent_id} from event {after_seq}")
+
+    def generate_updates():
+        yield "retry: 3000\n\n"
+        if finished and not bus.last_seq(topic):
+            # Ran in another process (or before a restart): only its outcome is known
+            yield from finished_job_stream(topic, job)
+            return
+        for event in bus.subscribe(topic, after_seq, heartbeat=AppConfig.PROGRESS_HEARTBEAT_SECONDS):
+            if event is not None:
+                yield sse_event(event['type'], event['payload'], event['id'])
+                continue
+            # Idle: the job may be running in another process, whose events never reach this bus
+            current = learning_scheduler.get_job(topic)
+            if current is None or (current['status'] in FINISHED_STATUSES and not bus.is_closed(topic)):
+                yield from finished_job_stream(topic, current)
+                return
+            yield ": heartbeat\n\n"
 
-                    TASK:
-                    Produce a JSON object that summarizes the critique from each major perspective and identifies the core ethical tension.
-                    """
-                    final_critique_str = agent._call_llm(critique_synthesis_prompt, is_json_output=True)
-                    try:
-                        final_critique = json.loads(final_critique_str)
-                    except json.JSONDecodeError as e:
-                        logger.error(f"Failed to parse critique JSON: {e}")
-                        logger.error(f"Raw critique string: {final_critique_str}")
-                        final_critique = {"error": "Failed to parse critique", "raw": final_critique_str}
-                    
-                    update_queue.put({
-                        "type": "critique_generated",
-                        "payload": {"critique": final_critique}
-                    })
-                    time.sleep(0.5)
-                    
-                    # Agent reflection
-                    update_queue.put({
-                        "type": "reflection_starting",
-                        "payload": {"message": "Agent reflecting on critique..."}
-                    })
-                    time.sleep(1)
-                    
-                    reflection = agent.reflect_and_correct(scenario_serializable, decision, final_critique_str)
-                    update_queue.put({
-                        "type": "reflection_complete",
-                        "payload": {"reflection": reflection}
-                    })
-                    time.sleep(0.5)
-                    logger.info(f"Cycle {cycle_num}: Agent reflected and updated constitution to version {agent.version}")
-                    # Constitution update
-                    updated_agent = {
-                        "version": agent.version,
-                        "constitution": agent.constitution
-                    }
-                    update_queue.put({
-                        "type": "constitution_updated",
-                        "payload": {"agent": updated_agent}
-                    })
-                    time.sleep(0.5)
-                    
-                    # Log interaction
-                    sim_instance.log_interaction(
-                        str(agent.agent_id),
-                        agent.version - 1,
-                        scenario_serializable,
-                        decision,
-                        final_critique_str,
-                        reflection
-                    )
-                    logger.info(f"Cycle {cycle_num}: Logged interaction for decision {decision}")
-                    # Cycle complete
-                    update_queue.put({
-                        "type": "cycle_complete",
-                        "payload": {"cycle": cycle_num}
-                    })
-                
-                # Send all cycles complete message after the loop
-                update_queue.put({
-                    "type": "all_cycles_complete",
-                    "payload": {"total_cycles": cycles}
-                })
-                logger.info(f"Completed {cycles} learning cycles for agent {agent_id}")
-                logger.info(f"Final agent version: {agent.version if 'agent' in locals() else 'unknown'}")
-            except Exception as e:
-                logger.error(f"Error in learning cycle with updates: {e}", exc_info=True)
-                update_queue.put({
-                    "type": "error",
-                    "payload": {"message": str(e)}
-                })
-        
-        # Start the learning cycle in a separate thread
-        cycle_thread = threading.Thread(target=run_learning_cycle_with_updates)
-        logger.info(f"Starting learning cycle for agent {agent_id} in a separate thread")
-        cycle_thread.start()
-        
-        # Send updates as they come
-        timeout_counter = 0
-        max_timeout = 120  # 2 minutes timeout
-        
-        while cycle_thread.is_alive() or not update_queue.empty():
-            try:
-                update = update_queue.get(timeout=1)
-                yield f"data: {json_serialize(update)}\n\n"
-                timeout_counter = 0
-            except queue.Empty:
-                timeout_counter += 1
-                if timeout_counter >= max_timeout:
-                    yield f"data: {json_serialize({'type': 'error', 'payload': {'message': 'Learning cycle timed out'}})}\n\n"
-                    break
-                # Send heartbeat
-                yield f"data: {json_serialize({'type': 'heartbeat'})}\n\n"
-        
-        cycle_thread.join(timeout=5)
-    
     return Response(
         generate_updates(),
         mimetype='text/event-stream',
@@ -2347,7 +2823,7 @@ def learning_updates_stream(agent_id):
             'Cache-Control': 'no-cache',
             'Connection': 'keep-alive',
             'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Headers': 'Cache-Control',
+            'Access-Control-Allow-Headers': 'Cache-Control, Last-Event-ID',
             'X-Accel-Buffering': 'no'  # Disable buffering for nginx
         }
     )
@@ -2355,25 +2831,63 @@ def learning_updates_stream(agent_id):
     
     
     
+graph_rebuilds = GraphRebuildJobs(db[AppConfig.GRAPH_REBUILD_JOBS_COLLECTION]) if db is not None else None
+
+def rebuild_job_view(job: Dict) -> Dict:
+    return dict(job, _id=str(job['_id']), job_id=str(job['_id']))
+
 @app.post("/api/graph/rebuild")
 def rebuild():
-    from aletheia.edge_builder.edge_builder import build
-    before = db["wisdom_edges"].count_documents({})
-    build()
-    after  = db["wisdom_edges"].count_documents({})
-    return jsonify({"inserted": after-before})
+    """
+    Starts an incremental wisdom graph rebuild in the background (202) and returns its job;
+    a rebuild already running is returned instead. Body: {"full": bool, "detect_changes": bool}.
+    """
+    if graph_rebuilds is None:
+        return jsonify({"error": "Database not connected"}), 500
+    data = request.get_json(silent=True) or {}
+    job, started = graph_rebuilds.start(full=bool(data.get('full', False)),
+                                        detect_changes=bool(data.get('detect_changes', True)))
+    return jsonify(dict(rebuild_job_view(job), started=started)), 202
+
+@app.get("/api/graph/rebuild/<job_id>")
+def rebuild_status(job_id):
+    """Stage, progress counts and, once finished, the summary of a graph rebuild."""
+    if graph_rebuilds is None:
+        return jsonify({"error": "Database not connected"}), 500
+    try:
+        job = graph_rebuilds.get(job_id)
+    except InvalidId:
+        return jsonify({"error": "Invalid job id"}), 400
+    if job is None:
+        return jsonify({"error": "Rebuild job not found"}), 404
+    return jsonify(rebuild_job_view(job))
+
+@app.post("/api/retrieval/snapshot")
+def refresh_retrieval_snapshot():
+    """Rebuild the local vector index snapshot from the philosophical texts collection."""
+    if collection is None:
+        return jsonify({"error": "Database not connected"}), 500
+    backend = get_retrieval_backend(collection)
+    if backend.name != "local":
+        return jsonify({"error": f"Retrieval backend '{backend.name}' has no local snapshot"}), 400
+    return jsonify({"backend": backend.name, "rows": backend.snapshot()})
 
 @app.post("/api/guardrail/score")
 def guardrail_score():
     txt = request.get_json().get("text","").strip()
     if not txt: return jsonify({"error":"empty"}),400
     url = f"{os.getenv('GUARDRAIL_ENDPOINT')}/score"
-    res = requests.post(url, json={"text": txt}, timeout=3)
+    try:
+        res = get_http_client().post(url, json={"text": txt}, timeout=3)
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"Guardrail scoring request failed: {e}")
+        return jsonify({"error": "guardrail service unavailable"}), 503
     return jsonify(res.json()), res.status_code
 
 @app.post("/api/pipeline/reward_eval")
 def trigger_reward_eval():
     topic = os.getenv("REWARD_EVAL_TOPIC","reward-eval-trigger")
+    from google.cloud import pubsub_v1
     pub   = pubsub_v1.PublisherClient()
     pub.publish(pub.topic_path(Config.GOOGLE_CLOUD_PROJECT, topic), b"{}")
     return jsonify({"queued": True})
@@ -2403,6 +2917,14 @@ def get_learning_analytics(agent_id):
         logger.error(f"Failed to get learning analytics for agent {agent_id}: {e}", exc_info=True)
         return jsonify({"error": "Internal server error"}), 500
 
+@app.route('/api/startup', methods=['GET'])
+def startup_timing():
+    """Per-phase startup cost and the first-use cost of lazily created services."""
+    return jsonify(startup_report.summary())
+
+startup_report.mark("routes")
+startup_report.log()
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8080))
     app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
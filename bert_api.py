@@ -1,10 +1,14 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import torch
-from transformers import AutoTokenizer, AutoModel
 import numpy as np
 import os
 import logging
+import threading
+import queue
+import time
+from concurrent.futures import Future
+from aletheia.embedding_runtime import load_embedding_runtime
+from aletheia.model_registry import get_model_registry
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -12,47 +16,161 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)
 
+# Batching configuration
+MAX_SEQ_LENGTH = int(os.environ.get('BERT_MAX_SEQ_LENGTH', 512))
+MAX_BATCH_SIZE = int(os.environ.get('BERT_MAX_BATCH_SIZE', 32))          # texts per forward pass
+BUCKET_WIDTH = int(os.environ.get('BERT_BUCKET_WIDTH', 32))              # token-length spread within a bucket
+MICRO_BATCH_WAIT_MS = float(os.environ.get('BERT_MICRO_BATCH_WAIT_MS', 5))  # coalescing window for /embed
+REQUEST_TIMEOUT_S = float(os.environ.get('BERT_REQUEST_TIMEOUT_S', 30))
+
+# Embedding runtime: torch | int8 | onnx | onnx-int8 (non-torch runtimes are validated against torch on first export)
+BERT_RUNTIME = os.environ.get('BERT_RUNTIME', 'torch')
+BERT_RUNTIME_CACHE_DIR = os.environ.get('BERT_RUNTIME_CACHE_DIR', '.cache/embedding_runtime')
+BERT_RUNTIME_TOLERANCE = float(os.environ.get('BERT_RUNTIME_TOLERANCE', 0.99))
+
 # Global variables for model and tokenizer
 model = None
 tokenizer = None
+micro_batcher = None
 
 def initialize_bert():
     """Initialize BERT model and tokenizer"""
-    global model, tokenizer
+    global model, tokenizer, micro_batcher
     try:
-        logger.info("Loading BERT model...")
-        tokenizer = AutoTokenizer.from_pretrained('bert-base-uncased')
-        model = AutoModel.from_pretrained('bert-base-uncased')
-        model.eval()
+        logger.info(f"Loading BERT model (runtime: {BERT_RUNTIME})...")
+        # Held for the life of the service; the registry still reports its resident size
+        model = get_model_registry().acquire(
+            'bert-base-uncased',
+            lambda: load_embedding_runtime('bert-base-uncased', runtime=BERT_RUNTIME,
+                                           cache_dir=BERT_RUNTIME_CACHE_DIR, tolerance=BERT_RUNTIME_TOLERANCE),
+            dtype=BERT_RUNTIME, device='cpu')
+        tokenizer = model.tokenizer
+        micro_batcher = MicroBatcher(max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MICRO_BATCH_WAIT_MS)
         logger.info("BERT model loaded successfully!")
         return True
     except Exception as e:
         logger.error(f"Failed to load BERT model: {e}")
         return False
 
-def generate_embedding(text):
-    """Generate BERT embedding for given text"""
+def _length_buckets(lengths):
+    """Group indices into buckets of similar token length, capped at MAX_BATCH_SIZE.
+
+    Sorting by length keeps padding inside each bucket to at most BUCKET_WIDTH
+    tokens, so short texts never pay for the attention cost of long ones.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    buckets, current = [], []
+    for idx in order:
+        if current and (len(current) >= MAX_BATCH_SIZE or
+                        lengths[idx] - lengths[current[0]] > BUCKET_WIDTH):
+            buckets.append(current)
+            current = []
+        current.append(idx)
+    if current:
+        buckets.append(current)
+    return buckets
+
+def generate_embeddings(texts):
+    """Generate BERT embeddings for a list of texts with one forward pass per length bucket"""
+    if not texts:
+        return []
     try:
-        # Tokenize and encode the text
-        inputs = tokenizer(text, return_tensors="pt", max_length=512, truncation=True, padding=True)
-        
-        # Generate embeddings
-        with torch.no_grad():
-            outputs = model(**inputs)
+        # Tokenize the whole request in a single call; padding is applied per bucket below
+        encoded = tokenizer(list(texts), max_length=MAX_SEQ_LENGTH, truncation=True, padding=False)
+        input_ids = encoded['input_ids']
+        lengths = [len(ids) for ids in input_ids]
+
+        embeddings = np.empty((len(texts), model.hidden_size), dtype=np.float32)
+        for bucket in _length_buckets(lengths):
+            features = [{k: encoded[k][i] for k in encoded.keys()} for i in bucket]
+            inputs = tokenizer.pad(features, padding=True, return_tensors="pt")
             # Use the [CLS] token embedding as the sentence embedding
-            embeddings = outputs.last_hidden_state[:, 0, :].numpy()
-        
-        return embeddings[0].tolist()
+            embeddings[bucket] = model.forward(inputs)[:, 0, :]
+
+        return embeddings.tolist()
     except Exception as e:
-        logger.error(f"Error generating embedding: {e}")
+        logger.error(f"Error generating embeddings: {e}")
         raise
 
+def generate_embedding(text):
+    """Generate BERT embedding for given text"""
+    return generate_embeddings([text])[0]
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-text requests into micro-batches.
+
+    Each /embed request enqueues its text and blocks on a Future. A single worker
+    thread drains the queue, waiting at most `max_wait_ms` after the first item
+    for more requests to arrive, then embeds the whole group in one call.
+    """
+    def __init__(self, max_batch_size: int = 32, max_wait_ms: float = 5):
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self.batches_run = 0
+        self.items_processed = 0
+        self._worker = threading.Thread(target=self._run, name="bert-micro-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, text: str) -> Future:
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [text for text, _ in batch]
+            try:
+                embeddings = generate_embeddings(texts)
+                for (_, future), embedding in zip(batch, embeddings):
+                    future.set_result(embedding)
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                else:
+                    # Retry one by one so a single bad item fails only its own request
+                    for text, future in batch:
+                        try:
+                            future.set_result(generate_embeddings([text])[0])
+                        except Exception as item_error:
+                            future.set_exception(item_error)
+            self.batches_run += 1
+            self.items_processed += len(batch)
+
+    def stats(self):
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait_s * 1000.0,
+            'queue_depth': self._queue.qsize(),
+            'batches_run': self.batches_run,
+            'items_processed': self.items_processed,
+            'avg_batch_size': self.items_processed / self.batches_run if self.batches_run else 0
+        }
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
-        'model_loaded': model is not None
+        'model_loaded': model is not None,
+        'runtime': model.runtime if model is not None else None,
+        'micro_batcher': micro_batcher.stats() if micro_batcher is not None else None,
+        'model_registry': get_model_registry().stats()
     })
 
 @app.route('/embed', methods=['POST'])
@@ -62,10 +180,12 @@ def embed():
         data = request.get_json()
         if not data or 'text' not in data:
             return jsonify({'error': 'No text provided'}), 400
-        
+
         text = data['text']
-        embedding = generate_embedding(text)
-        
+        if not isinstance(text, str):
+            return jsonify({'error': 'text must be a string'}), 400
+        embedding = micro_batcher.submit(text).result(timeout=REQUEST_TIMEOUT_S)
+
         return jsonify({
             'embedding': embedding,
             'dimension': len(embedding)
@@ -81,14 +201,10 @@ def batch_embed():
         data = request.get_json()
         if not data or 'texts' not in data:
             return jsonify({'error': 'No texts provided'}), 400
-        
+
         texts = data['texts']
-        embeddings = []
-        
-        for text in texts:
-            embedding = generate_embedding(text)
-            embeddings.append(embedding)
-        
+        embeddings = generate_embeddings(texts)
+
         return jsonify({
             'embeddings': embeddings,
             'count': len(embeddings)
@@ -101,7 +217,7 @@ if __name__ == '__main__':
     # Initialize BERT on startup
     if initialize_bert():
         port = int(os.environ.get('PORT', 5001))
-        app.run(host='0.0.0.0', port=port)
+        app.run(host='0.0.0.0', port=port, threaded=True)
     else:
         logger.error("Failed to initialize BERT model. Exiting.")
-        exit(1)
\ No newline at end of file
+        exit(1)
@@ -1229,11 +1229,23 @@ const AletheiaLearningLoop = ({
       totalDecisionsRef.current = 0;
       completedCyclesRef.current = 0;
 
-      // Setup SSE connection for real-time updates with cycles parameter
+      // Queue the learning job without waiting for it, then follow its progress events over SSE
+      let job;
+      try {
+        job = await apiService.startLearningCycle(agentId, cycles, { wait: false });
+      } catch (error) {
+        console.error("Failed to start learning cycle:", error);
+        addLogEntry(`Failed to start learning cycle: ${error.message}`, "error");
+        setError(error.message);
+        setIsRunning(false);
+        return;
+      }
+
+      // The browser reconnects on its own and resumes from the last event it received
       eventSourceRef.current = new EventSource(
         `${
           process.env.REACT_APP_API_URL || "http://localhost:8080"
-        }/api/aletheia/stream/learning/${agentId}?cycles=${cycles}`
+        }/api/aletheia/stream/learning/${agentId}?job_id=${job.job_id}`
       );
 
       eventSourceRef.current.onmessage = (event) => {
@@ -1261,30 +1273,11 @@ const AletheiaLearningLoop = ({
       eventSourceRef.current.onerror = (error) => {
         console.error("SSE connection error:", error);
         addLogEntry(
-          "Real-time connection lost - falling back to polling",
+          "Real-time connection interrupted - reconnecting (polling continues meanwhile)",
           "warning"
         );
-
-        // Close the failed connection
-        if (eventSourceRef.current) {
-          eventSourceRef.current.close();
-        }
-
-        // The polling mechanism will handle updates now
-        addLogEntry(
-          "Using polling for updates instead of real-time events",
-          "info"
-        );
       };
 
-      // Start the learning cycle via API
-      try {
-        await apiService.startLearningCycle(agentId, cycles);
-      } catch (error) {
-        console.error("Failed to start learning cycle:", error);
-        addLogEntry(`Failed to start learning cycle: ${error.message}`, "error");
-      }
-
       // Fallback polling mechanism in case SSE doesn't work properly
       let cyclesCompleted = 0;
       const startVersion = agent?.version || 1;
@@ -1488,6 +1481,15 @@ const AletheiaLearningLoop = ({
         setPhase("idle");
         break;
 
+      case "job_cancelled":
+        addLogEntry(`Learning job cancelled after ${payload.cycles_run} cycles`, "warning");
+        setIsRunning(false);
+        setPhase("idle");
+        if (eventSourceRef.current) {
+          eventSourceRef.current.close();
+        }
+        break;
+
       case "all_cycles_complete":
         addLogEntry(`All ${payload.total_cycles} learning cycles complete`, "success");
         setIsRunning(false);
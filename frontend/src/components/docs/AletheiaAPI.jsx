@@ -178,6 +178,10 @@ const AletheiaAPI = () => {
 }`}</code>
               </div>
             </div>
+            <ul style={styles.paramList}>
+              <li><code>wait</code> - Block until the cycles finish and return their results (default: true). With <code>false</code> the job is returned with 202; follow it at <code>/api/aletheia/jobs/{'{jobId}'}</code></li>
+              <li><code>timeout</code> - Seconds to wait before returning the still-running job with 202 (default: 600)</li>
+            </ul>
           </div>
 
           <div style={styles.endpoint}>
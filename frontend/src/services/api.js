@@ -67,10 +67,11 @@ const apiService = {
   // Aletheia learning system
   getAgents: () => apiRequest("/api/aletheia/agents"),
 
-  startLearningCycle: (agentId, cycles = 1) =>
+  // Blocks until the job finishes by default; with { wait: false } resolves to the queued job
+  startLearningCycle: (agentId, cycles = 1, { wait = true } = {}) =>
     apiRequest("/api/aletheia/start_cycle", {
       method: "POST",
-      body: { agent_id: agentId, cycles },
+      body: { agent_id: agentId, cycles, wait },
     }),
 
   getLearningHistory: (agentId, limit = 10) =>
@@ -31,27 +31,49 @@ import threading
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Optional ML dependencies - gracefully handle missing packages
-try:
-    import torch
-    from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
-    from datasets import Dataset
-    ML_DEPENDENCIES_AVAILABLE = True
-except ImportError as e:
-    logger.warning(f"ML dependencies not available: {e}")
-    ML_DEPENDENCIES_AVAILABLE = False
-    torch = None
-    AutoModelForCausalLM = None
-    AutoTokenizer = None
-    pipeline = None
-    Dataset = None
+# Optional ML dependencies - checked without importing them; torch/transformers
+# take seconds to import and are only loaded once an evaluation actually runs
+import importlib.util
+ML_DEPENDENCIES_AVAILABLE = all(
+    importlib.util.find_spec(name) is not None for name in ("torch", "transformers", "datasets")
+)
+if not ML_DEPENDENCIES_AVAILABLE:
+    logger.warning("ML dependencies not available (torch, transformers, datasets)")
+torch = None
+AutoModelForCausalLM = None
+AutoTokenizer = None
+pipeline = None
+Dataset = None
+_ml_import_lock = threading.Lock()
+
+
+def _load_ml_dependencies() -> bool:
+    """Imports the ML dependencies into module globals on first use."""
+    global torch, AutoModelForCausalLM, AutoTokenizer, pipeline, Dataset, ML_DEPENDENCIES_AVAILABLE
+    if torch is not None or not ML_DEPENDENCIES_AVAILABLE:
+        return ML_DEPENDENCIES_AVAILABLE
+    with _ml_import_lock:
+        if torch is None:
+            try:
+                import torch as _torch
+                from transformers import AutoModelForCausalLM as _model_cls, AutoTokenizer as _tokenizer_cls
+                from transformers import pipeline as _pipeline
+                from datasets import Dataset as _dataset
+            except ImportError as e:
+                logger.warning(f"ML dependencies not available: {e}")
+                ML_DEPENDENCIES_AVAILABLE = False
+                return False
+            AutoModelForCausalLM, AutoTokenizer, pipeline, Dataset = _model_cls, _tokenizer_cls, _pipeline, _dataset
+            torch = _torch
+    return ML_DEPENDENCIES_AVAILABLE
+
 from flask import Blueprint, request, jsonify, send_file
 from bson.objectid import ObjectId
 import pymongo
+from aletheia.model_registry import get_model_registry
 
 # Global state
 db = None
-_model_cache = {}
 _evaluation_tasks = {}
 
 # Create Flask Blueprint
@@ -67,11 +89,12 @@ class MASEvaluator:
     """Main class for Moral-Alignment Score evaluation"""
     
     def __init__(self, model_path: str, device: str = "auto"):
-        if not ML_DEPENDENCIES_AVAILABLE:
+        if not _load_ml_dependencies():
             raise ImportError("ML dependencies (torch, transformers) not available")
         
         self.model_path = model_path
         self.device = self._get_device(device)
+        self.dtype = "float16" if self.device != "cpu" else "float32"
         self.model = None
         self.tokenizer = None
         self.load_model()
@@ -88,44 +111,45 @@ class MASEvaluator:
         return device
     
     def load_model(self):
-        """Load the model and tokenizer with caching"""
-        global _model_cache
-        
-        cache_key = f"{self.model_path}_{self.device}"
-        if cache_key in _model_cache:
-            self.model, self.tokenizer = _model_cache[cache_key]
-            logger.info(f"Loaded cached model: {self.model_path}")
-            return
-        
+        """Load the model and tokenizer through the shared model registry"""
+        self.model, self.tokenizer = get_model_registry().acquire(
+            self.model_path, self._load_model_and_tokenizer, dtype=self.dtype, device=self.device
+        )
+    
+    def close(self):
+        """Release the model so the registry may unload it under memory pressure"""
+        if self.model is not None:
+            self.model, self.tokenizer = None, None
+            get_model_registry().release(self.model_path, dtype=self.dtype, device=self.device)
+    
+    def _load_model_and_tokenizer(self):
         try:
             logger.info(f"Loading model: {self.model_path} on {self.device}")
             
             # Load tokenizer
-            self.tokenizer = AutoTokenizer.from_pretrained(self.model_path)
-            if self.tokenizer.pad_token is None:
-                self.tokenizer.pad_token = self.tokenizer.eos_token
+            tokenizer = AutoTokenizer.from_pretrained(self.model_path)
+            if tokenizer.pad_token is None:
+                tokenizer.pad_token = tokenizer.eos_token
             
             # Load model with appropriate settings
             model_kwargs = {
-                "torch_dtype": torch.float16 if self.device != "cpu" else torch.float32,
+                "torch_dtype": getattr(torch, self.dtype),
                 "device_map": "auto" if self.device == "cuda" else None,
                 "trust_remote_code": True
             }
             
-            self.model = AutoModelForCausalLM.from_pretrained(
+            model = AutoModelForCausalLM.from_pretrained(
                 self.model_path, 
                 **model_kwargs
             )
             
             # Move to device if not using device_map
             if self.device != "cuda":
-                self.model = self.model.to(self.device)
-            
-            self.model.eval()
+                model = model.to(self.device)
             
-            # Cache the loaded model
-            _model_cache[cache_key] = (self.model, self.tokenizer)
+            model.eval()
             logger.info(f"Model loaded successfully on {self.device}")
+            return model, tokenizer
             
         except Exception as e:
             logger.error(f"Failed to load model {self.model_path}: {e}")
@@ -341,6 +365,7 @@ def evaluate_mas():
         
         # Start evaluation in background thread
         def run_evaluation():
+            evaluator = None
             try:
                 # Get agent constitution
                 constitution = get_agent_constitution(agent_id)
@@ -428,6 +453,9 @@ def evaluate_mas():
                     'error': str(e),
                     'progress': 0
                 }
+            finally:
+                if evaluator is not None:
+                    evaluator.close()
         
         # Initialize task
         _evaluation_tasks[task_id] = {
@@ -584,7 +612,7 @@ def health_check():
         'ml_dependencies_available': ML_DEPENDENCIES_AVAILABLE
     }
     
-    if ML_DEPENDENCIES_AVAILABLE and torch:
+    if _load_ml_dependencies():
         health_data['torch_cuda_available'] = torch.cuda.is_available()
         health_data['torch_mps_available'] = torch.backends.mps.is_available() if hasattr(torch.backends, 'mps') else False
     else:
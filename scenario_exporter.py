@@ -10,14 +10,18 @@ import uuid
 from datetime import datetime, timezone
 from typing import Dict, Any, List, Optional, Tuple
 from flask import Blueprint, request, jsonify
-from google.cloud import storage, aiplatform
-from google.cloud.aiplatform import training_jobs
 import pymongo
 from bson import ObjectId
 import logging
 import re
 from dataclasses import dataclass, asdict
 import random
+from aletheia.lazy import Lazy, lazy_import
+
+# The Cloud SDKs take seconds to import; load them only when an export actually needs them
+storage = lazy_import("google.cloud.storage")
+aiplatform = lazy_import("google.cloud.aiplatform")
+training_jobs = lazy_import("google.cloud.aiplatform.training_jobs")
 
 logger = logging.getLogger(__name__)
 
@@ -626,9 +630,9 @@ class ScenarioExporter:
 exporter = None
 
 def initialize_exporter(db, gcs_bucket_name=None, project_id=None):
-    """Initialize the global exporter instance"""
+    """Initialize the global exporter instance. The GCS and Vertex clients are created on first use."""
     global exporter
-    exporter = ScenarioExporter(db, gcs_bucket_name, project_id)
+    exporter = Lazy("scenario_exporter", lambda: ScenarioExporter(db, gcs_bucket_name, project_id))
     return exporter
 
 @scenario_exporter.route('/export/download/<path:filepath>', methods=['GET'])
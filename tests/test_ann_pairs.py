@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from aletheia.edge_builder.similarity import ann_pairs, iter_similar_pairs, neighbour_recall
+
+
+def test_keeps_pairs_at_or_above_threshold():
+    labels = np.array([[1, 2], [0, 2], [0, 1]])
+    sims = np.array([[0.9, 0.4], [0.9, 0.5], [0.4, 0.5]], dtype=np.float32)
+    assert [(i, j) for i, j, _ in ann_pairs(labels, sims, threshold=0.5)] == [(0, 1), (1, 2)]
+
+
+def test_pair_found_from_both_ends_is_kept_once():
+    labels = np.array([[3, 1], [0, 2], [1, 3], [0, 2]])
+    sims = np.full(labels.shape, 0.8, dtype=np.float32)
+    pairs = [(i, j) for i, j, _ in ann_pairs(labels, sims, threshold=0.5)]
+    assert pairs == [(0, 1), (0, 3), (1, 2), (2, 3)]
+
+
+def test_drops_self_pairs_and_missing_labels():
+    labels = np.array([[0, 1], [1, -1]])
+    sims = np.array([[1.0, 0.7], [1.0, 0.9]], dtype=np.float32)
+    assert list(ann_pairs(labels, sims, threshold=0.5)) == [(0, 1, pytest.approx(0.7))]
+
+
+def embeddings(n, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(5, dim))
+    return (centres[rng.integers(0, 5, size=n)] + 0.3 * rng.normal(size=(n, dim))).astype(np.float32)
+
+
+def test_neighbours_agree_with_exact_scan():
+    pytest.importorskip("hnswlib")
+    from aletheia.edge_builder.similarity import ann_neighbours
+
+    emb = embeddings(200)
+    labels, sims = ann_neighbours(emb, top_k=10, num_threads=1)
+    assert labels.shape == sims.shape == (200, 11)
+
+    recall = neighbour_recall(emb, labels, sims, threshold=0.5, top_k=10, sample_size=50)
+    assert recall["sample_rows"] == 50
+    assert recall["recall"] >= 0.95
+
+    # On a small set every approximate pair is a true pair with the same score
+    exact = {(i, j): score for i, j, score in iter_similar_pairs(emb, threshold=0.5)}
+    for i, j, score in ann_pairs(labels, sims, threshold=0.5):
+        assert score == pytest.approx(exact[(i, j)], abs=1e-4)
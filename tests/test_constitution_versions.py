@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from aletheia.constitution_versions import ConstitutionVersionStore
+
+
+@pytest.fixture
+def db():
+    db = mongomock.MongoClient().db
+    created = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    db.agents.insert_one({"agent_id": "legacy", "initial_constitution": ["be honest"],
+                          "constitution": ["be honest", "be kind", "be brief"], "created_at": created})
+    db.history.insert_one({"agent_id": "legacy", "agent_version_before_reflection": 1,
+                           "constitution_after_reflection": ["be honest", "be kind"],
+                           "agent_reflection": {"reasoning_for_change": "kindness matters"},
+                           "scenario_title": "A hard case", "timestamp": created + timedelta(days=1)})
+    return db
+
+
+def store_for(db):
+    return ConstitutionVersionStore(db.versions, db.agents, db.history)
+
+
+def test_first_record_for_a_legacy_agent_diffs_against_the_real_previous_version(db):
+    versions = store_for(db)
+    assert versions.record("legacy", 3, ["be honest", "be kind", "be brief"], strategy="refine")
+
+    assert [record["version"] for record in versions.get_range("legacy")] == [1, 2, 3]
+    latest = versions.get_version("legacy", 3)
+    assert latest["diff"] == {"added": ["be brief"], "removed": [], "unchanged_count": 2}
+
+
+def test_materialized_versions_keep_their_interaction_id(db):
+    versions = store_for(db)
+    interaction_id = db.history.find_one()["_id"]
+    assert versions.ensure_materialized("legacy") == 2
+    assert versions.ensure_materialized("legacy") == 0
+
+    assert versions.get_version("legacy", 2)["interaction_id"] == str(interaction_id)
+    assert versions.get_version("legacy", 1)["interaction_id"] is None
+
+
+def test_recorded_version_is_linked_to_its_interaction_once_logged(db):
+    versions = store_for(db)
+    versions.record("fresh", 1, ["be fair"], strategy="initial")
+    versions.record("fresh", 2, ["be fair", "be open"], ["be fair"])
+    versions.link_interaction("fresh", 2, "abc123")
+
+    assert versions.get_version("fresh", 2)["interaction_id"] == "abc123"
+    assert versions.get_version("fresh", 2)["diff"]["added"] == ["be open"]
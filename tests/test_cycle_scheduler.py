@@ -0,0 +1,171 @@
+import threading
+import time
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from aletheia.cycle_scheduler import COMPLETED, FAILED, LearningCycleScheduler
+from aletheia.progress_bus import ProgressBus
+
+
+class RecordingCycle:
+    """run_cycle stand-in that records when each agent's cycles start and end."""
+    def __init__(self, duration: float = 0.02):
+        self.duration = duration
+        self.events = []
+        self.in_flight = {}
+        self.overlaps = []
+        self._lock = threading.Lock()
+
+    def __call__(self, agent_id, publish):
+        with self._lock:
+            if self.in_flight.get(agent_id):
+                self.overlaps.append(agent_id)
+            self.in_flight[agent_id] = True
+            self.events.append(("start", agent_id))
+        publish("decision_made", {"agent_id": agent_id})
+        time.sleep(self.duration)
+        with self._lock:
+            self.in_flight[agent_id] = False
+            self.events.append(("end", agent_id))
+        return {"new_version": sum(1 for kind, agent in self.events if kind == "end" and agent == agent_id)}
+
+
+@pytest.fixture
+def make_scheduler():
+    schedulers = []
+
+    def make(run_cycle, max_workers=4):
+        db = mongomock.MongoClient().db
+        scheduler = LearningCycleScheduler(db.learning_jobs, db.learning_agent_leases, run_cycle,
+                                           max_workers=max_workers, poll_interval=0.05, bus=ProgressBus())
+        schedulers.append(scheduler)
+        return scheduler
+
+    yield make
+    for scheduler in schedulers:
+        scheduler.close()
+
+
+def test_cycles_for_one_agent_run_one_at_a_time_in_submission_order(make_scheduler):
+    cycle = RecordingCycle()
+    scheduler = make_scheduler(cycle)
+    first = scheduler.submit("agent-a", 2)
+    second = scheduler.submit("agent-a", 2)
+
+    first = scheduler.wait(first["_id"], timeout=5)
+    second = scheduler.wait(second["_id"], timeout=5)
+
+    assert first["status"] == second["status"] == COMPLETED
+    assert cycle.overlaps == []
+    assert [result["new_version"] for result in first["results"]] == [1, 2]
+    assert [result["new_version"] for result in second["results"]] == [3, 4]
+    assert first["finished_at"] <= second["started_at"]
+
+
+def test_different_agents_run_in_parallel(make_scheduler):
+    b_started = threading.Event()
+    saw_b_while_running = []
+
+    def run_cycle(agent_id, publish):
+        if agent_id == "agent-a":
+            saw_b_while_running.append(b_started.wait(timeout=5))
+        else:
+            b_started.set()
+        return {"new_version": 1}
+
+    scheduler = make_scheduler(run_cycle)
+    job_a = scheduler.submit("agent-a", 1)
+    job_b = scheduler.submit("agent-b", 1)
+
+    assert scheduler.wait(job_a["_id"], timeout=10)["status"] == COMPLETED
+    assert scheduler.wait(job_b["_id"], timeout=10)["status"] == COMPLETED
+    assert saw_b_while_running == [True]
+
+
+def test_failed_cycle_fails_the_job_and_the_next_job_still_runs(make_scheduler):
+    def run_cycle(agent_id, publish):
+        raise ValueError("Oracle critique was not valid JSON")
+
+    scheduler = make_scheduler(run_cycle)
+    failing = scheduler.submit("agent-a", 3)
+    failing = scheduler.wait(failing["_id"], timeout=5)
+
+    assert failing["status"] == FAILED
+    assert failing["cycles_run"] == 1
+    assert "not valid JSON" in failing["error"]
+
+    scheduler.run_cycle = lambda agent_id, publish: {"new_version": 2}
+    following = scheduler.wait(scheduler.submit("agent-a", 1)["_id"], timeout=5)
+    assert following["status"] == COMPLETED
+
+
+def test_job_events_are_published_under_the_job_id(make_scheduler):
+    scheduler = make_scheduler(RecordingCycle(duration=0))
+    job = scheduler.submit("agent-a", 2)
+    scheduler.wait(job["_id"], timeout=5)
+
+    types = [event["type"] for event in scheduler.bus.subscribe(str(job["_id"]), heartbeat=0.1)]
+    assert types == ["job_queued",
+                     "cycle_started", "decision_made", "cycle_complete",
+                     "cycle_started", "decision_made", "cycle_complete",
+                     "all_cycles_complete"]
+
+
+def test_subscriber_receives_events_live_while_the_job_runs(make_scheduler):
+    release = threading.Event()
+
+    def run_cycle(agent_id, publish):
+        publish("decision_made", {"agent_id": agent_id})
+        assert release.wait(timeout=5)
+        return {"new_version": 1}
+
+    scheduler = make_scheduler(run_cycle)
+    job = scheduler.submit("agent-a", 1)
+    received, decision_seen = [], threading.Event()
+
+    def follow():
+        for event in scheduler.bus.subscribe(str(job["_id"]), heartbeat=0.05):
+            if event is not None:
+                received.append(event)
+                if event["type"] == "decision_made":
+                    decision_seen.set()
+
+    follower = threading.Thread(target=follow)
+    follower.start()
+    try:
+        # The cycle is still blocked, so these events can only have arrived live
+        assert decision_seen.wait(timeout=5)
+        assert scheduler.get_job(job["_id"])["status"] == "running"
+        assert [event["type"] for event in received] == ["job_queued", "cycle_started", "decision_made"]
+    finally:
+        release.set()
+    follower.join(timeout=5)
+
+    assert not follower.is_alive()
+    assert [event["type"] for event in received][3:] == ["cycle_complete", "all_cycles_complete"]
+
+
+def test_reconnect_mid_job_resumes_after_the_last_event_seen(make_scheduler):
+    release = threading.Event()
+
+    def run_cycle(agent_id, publish):
+        assert release.wait(timeout=5)
+        return {"new_version": 1}
+
+    scheduler = make_scheduler(run_cycle)
+    topic = str(scheduler.submit("agent-a", 2)["_id"])
+    first_connection = scheduler.bus.subscribe(topic, heartbeat=0.05)
+    seen = []
+    while len(seen) < 2:
+        event = next(first_connection)
+        if event is not None:
+            seen.append(event)
+    first_connection.close()
+    assert [event["type"] for event in seen] == ["job_queued", "cycle_started"]
+
+    release.set()
+    resumed = [event["type"] for event in scheduler.bus.subscribe(topic, seen[-1]["seq"], heartbeat=0.05)
+               if event is not None]
+    assert resumed == ["cycle_complete", "cycle_started", "cycle_complete", "all_cycles_complete"]
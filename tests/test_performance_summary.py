@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from aletheia.simulation import PERFORMANCE_WINDOW, Simulation
+
+
+def log(sim, agent_id, changed):
+    constitution = ["be honest"]
+    reflection = {"current_constitution": constitution,
+                  "proposed_constitution": constitution + ["be kind"] if changed else constitution}
+    sim.log_enhanced_interaction(agent_id, 1, {"title": "A hard case"}, {}, "", reflection)
+
+
+@pytest.fixture
+def sim():
+    return Simulation(mongomock.MongoClient().db)
+
+
+def test_first_summary_is_seeded_from_earlier_history(sim):
+    start = datetime(2025, 1, 1)
+    sim.history_collection.insert_many([
+        {"agent_id": "legacy", "timestamp": start + timedelta(minutes=n),
+         "decision_quality_score": 0.9, "constitutional_change_detected": True}
+        for n in range(PERFORMANCE_WINDOW + 2)
+    ])
+    log(sim, "legacy", changed=False)
+
+    window = sim.performance_collection.find_one({"_id": "legacy"})["window"]
+    assert len(window) == PERFORMANCE_WINDOW
+    assert [entry["changed"] for entry in window] == [True] * (PERFORMANCE_WINDOW - 1) + [False]
+
+
+def test_later_interactions_slide_the_window(sim):
+    for n in range(PERFORMANCE_WINDOW + 3):
+        log(sim, "agent", changed=n % 2 == 0)
+
+    summary = sim.performance_collection.find_one({"_id": "agent"})
+    assert [entry["changed"] for entry in summary["window"]] == [
+        n % 2 == 0 for n in range(3, PERFORMANCE_WINDOW + 3)
+    ]
+    assert sim.history_collection.count_documents({"agent_id": "agent"}) == PERFORMANCE_WINDOW + 3
@@ -0,0 +1,92 @@
+import threading
+
+from aletheia.progress_bus import ProgressBus, final_event_id, is_final_event_id, parse_event_id
+
+
+def drain(bus, topic, after_seq=0):
+    return [event for event in bus.subscribe(topic, after_seq, heartbeat=0.05) if event is not None]
+
+
+def test_replays_events_after_the_last_seen_id():
+    bus = ProgressBus()
+    ids = [bus.publish("job", "step", {"n": n}) for n in range(5)]
+    bus.close("job")
+
+    topic, seq = parse_event_id(ids[1])
+    assert topic == "job"
+    replayed = drain(bus, topic, seq)
+    assert [event["payload"]["n"] for event in replayed] == [2, 3, 4]
+    assert [event["id"] for event in replayed] == ids[2:]
+
+
+def test_reports_events_that_left_the_buffer():
+    bus = ProgressBus(buffer_size=3)
+    for n in range(10):
+        bus.publish("job", "step", {"n": n})
+    bus.close("job")
+
+    events = drain(bus, "job", after_seq=2)
+    assert events[0]["type"] == "events_dropped"
+    assert events[0]["payload"] == {"missed": 5}
+    assert [event["payload"]["n"] for event in events[1:]] == [7, 8, 9]
+
+
+def test_subscriber_gets_live_events_and_stops_when_closed():
+    bus = ProgressBus()
+    received = []
+    subscribed = threading.Event()
+
+    def follow():
+        for event in bus.subscribe("job", heartbeat=0.05):
+            subscribed.set()
+            if event is not None:
+                received.append(event["type"])
+
+    follower = threading.Thread(target=follow)
+    follower.start()
+    assert subscribed.wait(timeout=2)  # a heartbeat arrives before anything is published
+    bus.publish("job", "cycle_started")
+    bus.publish("job", "cycle_complete")
+    bus.close("job")
+    follower.join(timeout=2)
+
+    assert not follower.is_alive()
+    assert received == ["cycle_started", "cycle_complete"]
+    assert bus.stats()["subscribers"] == 0
+
+
+def test_heartbeat_yields_none_while_idle():
+    bus = ProgressBus()
+    stream = bus.subscribe("job", heartbeat=0.01)
+    assert next(stream) is None
+    stream.close()
+
+
+def test_closed_topics_are_evicted_least_recent_first():
+    bus = ProgressBus(max_topics=2)
+    for name in ("a", "b"):
+        bus.publish(name, "done")
+        bus.close(name)
+    bus.publish("c", "running")
+
+    assert bus.last_seq("a") == 0
+    assert bus.last_seq("b") == 1
+    assert bus.stats()["topics"] == 2
+
+
+def test_open_topics_are_never_evicted():
+    bus = ProgressBus(max_topics=1)
+    bus.publish("a", "running")
+    bus.publish("b", "running")
+    assert bus.last_seq("a") == 1
+    assert bus.last_seq("b") == 1
+
+
+def test_event_id_parsing():
+    assert parse_event_id("65f0:12") == ("65f0", 12)
+    assert parse_event_id(None) == (None, 0)
+    assert parse_event_id("garbage") == (None, 0)
+    assert parse_event_id(final_event_id("65f0")) == (None, 0)
+    assert is_final_event_id(final_event_id("65f0"))
+    assert not is_final_event_id("65f0:12")
+    assert not is_final_event_id(None)
@@ -0,0 +1,118 @@
+import json
+import re
+
+import pytest
+
+from aletheia.edge_builder.relation_classifier import (
+    DEFAULT_VERDICT, BatchRelationClassifier, pair_key, text_hash
+)
+
+
+class FakeStore:
+    def __init__(self):
+        self.verdicts = {}
+
+    def get_many(self, keys):
+        return {key: self.verdicts[key] for key in keys if key in self.verdicts}
+
+    def put_many(self, verdicts, model):
+        self.verdicts.update(verdicts)
+
+
+class FakeModel:
+    """Answers "supports" for every pair it is shown, recording each prompt."""
+    def __init__(self, garbage_above=None, omit_last_once=False, error=None):
+        self.garbage_above = garbage_above
+        self.omit_last_once = omit_last_once
+        self.error = error
+        self.prompts = []
+
+    def pair_count(self, prompt):
+        return len(re.findall(r"^PAIR \d+$", prompt, flags=re.MULTILINE))
+
+    def __call__(self, prompt):
+        self.prompts.append(prompt)
+        if self.error is not None:
+            raise self.error
+        count = self.pair_count(prompt)
+        if self.garbage_above is not None and count > self.garbage_above:
+            return "Sorry, here are the results: {"
+        numbers = list(range(1, count + 1))
+        if self.omit_last_once and count > 1:
+            self.omit_last_once = False
+            numbers = numbers[:-1]
+        return json.dumps({"results": [{"pair": n, "relation": "supports", "confidence": 0.9} for n in numbers]})
+
+
+def make_pairs(count):
+    return [(f"passage {n} left", f"passage {n} right") for n in range(count)]
+
+
+def classify(classifier, pairs):
+    return list(classifier.classify_stream(pairs, lambda pair: pair))
+
+
+def test_unparseable_batches_are_split_down_to_single_pairs():
+    model = FakeModel(garbage_above=1)
+    classifier = BatchRelationClassifier(model, None, "test", batch_size=4, max_workers=1, retry_backoff=0)
+    results = classify(classifier, make_pairs(4))
+
+    assert [(relation, confidence) for _, relation, confidence, _ in results] == [("supports", 0.9)] * 4
+    assert sorted(model.pair_count(prompt) for prompt in model.prompts) == [1, 1, 1, 1, 2, 2, 4]
+    assert classifier.stats["failed"] == 0
+
+
+def test_incomplete_response_retries_only_the_missing_pairs():
+    model = FakeModel(omit_last_once=True)
+    classifier = BatchRelationClassifier(model, None, "test", batch_size=4, max_workers=1, retry_backoff=0)
+    results = classify(classifier, make_pairs(4))
+
+    assert [model.pair_count(prompt) for prompt in model.prompts] == [4, 1]
+    assert "passage 3 left" in model.prompts[1] or "passage 3 right" in model.prompts[1]
+    assert all(relation == "supports" for _, relation, _, _ in results)
+
+
+def test_pairs_that_never_parse_get_the_default_verdict():
+    model = FakeModel(garbage_above=0)
+    classifier = BatchRelationClassifier(model, None, "test", batch_size=2, max_workers=1, retry_backoff=0)
+    results = classify(classifier, make_pairs(2))
+
+    assert [(relation, confidence) for _, relation, confidence, _ in results] == [DEFAULT_VERDICT] * 2
+    assert classifier.stats["failed"] == 2
+
+
+def test_transport_errors_are_retried_whole_then_raised():
+    model = FakeModel(error=ConnectionError("quota exceeded"))
+    classifier = BatchRelationClassifier(model, None, "test", batch_size=4, max_workers=1,
+                                         max_retries=2, retry_backoff=0)
+    with pytest.raises(ConnectionError):
+        classify(classifier, make_pairs(4))
+
+    assert [model.pair_count(prompt) for prompt in model.prompts] == [4, 4, 4]
+    assert classifier.stats["retries"] == 2
+
+
+def test_stored_verdicts_are_not_asked_again():
+    store = FakeStore()
+    model = FakeModel()
+    classify(BatchRelationClassifier(model, store, "test", batch_size=4, max_workers=1), make_pairs(3))
+    assert len(store.verdicts) == 3 and len(model.prompts) == 1
+
+    classifier = BatchRelationClassifier(model, store, "test", batch_size=8, max_workers=1)
+    results = classify(classifier, make_pairs(3) + [pair[::-1] for pair in make_pairs(3)])
+    assert len(model.prompts) == 1
+    assert classifier.stats["stored_hits"] == 3
+    assert all(relation == "supports" for _, relation, _, _ in results)
+
+
+def test_pairs_are_classified_in_canonical_order():
+    model = FakeModel()
+    classifier = BatchRelationClassifier(model, None, "test", batch_size=4, max_workers=1)
+    a, b = "the first passage", "the second passage"
+    lower, higher = sorted((a, b), key=text_hash)
+    results = classify(classifier, [(a, b), (b, a)])
+
+    assert len(model.prompts) == 1 and model.pair_count(model.prompts[0]) == 1
+    assert f"PassageA: {lower}\nPassageB: {higher}" in model.prompts[0]
+    assert [flipped for _, _, _, flipped in results] == [a != lower, b != lower]
+    assert pair_key(text_hash(a), text_hash(b)) == pair_key(text_hash(b), text_hash(a))
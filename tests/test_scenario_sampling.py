@@ -0,0 +1,38 @@
+import threading
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+import aletheia.simulation as simulation
+from aletheia.config import Config
+
+
+def test_simulation_backfills_scenarios_stored_without_features(monkeypatch):
+    backfilled = []
+    done = threading.Event()
+
+    def backfill(collection):
+        backfilled.append(collection.name)
+        done.set()
+
+    monkeypatch.setattr(simulation, "backfill_scenario_features", backfill)
+    simulation.Simulation(mongomock.MongoClient().db)
+
+    assert done.wait(timeout=5)
+    assert backfilled == [Config.SCENARIOS_COLLECTION]
+
+
+def test_bucket_sampling_wraps_around_the_random_point(monkeypatch):
+    monkeypatch.setattr(simulation, "backfill_scenario_features", lambda collection: 0)
+    sim = simulation.Simulation(mongomock.MongoClient().db)
+    sim.scenarios_collection.insert_many([
+        {"title": "Low", "complexity_bucket": "simple", "random_key": 0.1},
+        {"title": "Other bucket", "complexity_bucket": "extreme", "random_key": 0.95}
+    ])
+
+    monkeypatch.setattr(simulation.random, "random", lambda: 0.9)
+    assert sim._sample_bucket("simple")["title"] == "Low"
+    monkeypatch.setattr(simulation.random, "random", lambda: 0.05)
+    assert sim._sample_bucket("simple")["title"] == "Low"
+    assert sim._sample_bucket("moderate") is None
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from aletheia.edge_builder.similarity import iter_cross_pairs, iter_similar_pairs, tile_size
+
+
+def embeddings(n, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    # A few clusters so that some pairs clear a high threshold
+    centres = rng.normal(size=(4, dim))
+    return (centres[rng.integers(0, 4, size=n)] + 0.3 * rng.normal(size=(n, dim))).astype(np.float32)
+
+
+def brute_force(emb, threshold, top_k=None):
+    emb = emb / np.linalg.norm(emb, axis=1, keepdims=True)
+    sims = emb @ emb.T
+    pairs = []
+    for i in range(len(emb)):
+        later = [(j, sims[i, j]) for j in range(i + 1, len(emb)) if sims[i, j] >= threshold]
+        if top_k:
+            later = sorted(later, key=lambda item: -item[1])[:top_k]
+        pairs.extend((i, j) for j, _ in sorted(later))
+    return pairs
+
+
+@pytest.mark.parametrize("budget", [4, 4 * 7 * 7, 4 * 64 * 64, 256 * 2**20])
+def test_matches_brute_force_for_any_tile_size(budget):
+    emb = embeddings(50)
+    pairs = list(iter_similar_pairs(emb, threshold=0.8, memory_budget_bytes=budget))
+    assert [(i, j) for i, j, _ in pairs] == brute_force(emb, 0.8)
+    assert all(i < j for i, j, _ in pairs)
+
+
+@pytest.mark.parametrize("budget", [4 * 7 * 7, 256 * 2**20])
+def test_top_k_keeps_each_rows_best_later_partners(budget):
+    emb = embeddings(40, seed=1)
+    pairs = list(iter_similar_pairs(emb, threshold=0.5, memory_budget_bytes=budget, top_k=3))
+    assert [(i, j) for i, j, _ in pairs] == brute_force(emb, 0.5, top_k=3)
+
+
+def test_scores_are_cosine_similarities():
+    emb = embeddings(20, seed=2)
+    normalized = emb / np.linalg.norm(emb, axis=1, keepdims=True)
+    for i, j, score in iter_similar_pairs(emb, threshold=0.0):
+        assert score == pytest.approx(float(normalized[i] @ normalized[j]), abs=1e-5)
+
+
+def test_fewer_than_two_rows_yield_nothing():
+    assert list(iter_similar_pairs(embeddings(1), threshold=0.0)) == []
+    assert list(iter_similar_pairs(np.zeros((0, 4), dtype=np.float32), threshold=0.0)) == []
+
+
+def test_tile_size_stays_within_bounds():
+    assert tile_size(100, 0) == 1
+    assert tile_size(100, 4 * 10 * 10) == 10
+    assert tile_size(100, 256 * 2**20) == 100
+
+
+@pytest.mark.parametrize("budget", [4 * 3, 4 * 5 * 5, 256 * 2**20])
+def test_cross_pairs_match_brute_force(budget):
+    queries, corpus = embeddings(6, seed=3), embeddings(30, seed=4)
+    q = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    c = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    sims = q @ c.T
+    expected = {(i, j) for i in range(len(q)) for j in range(len(c)) if sims[i, j] >= 0.7}
+    pairs = list(iter_cross_pairs(queries, corpus, threshold=0.7, memory_budget_bytes=budget))
+    assert len(pairs) == len(expected)
+    assert {(i, j) for i, j, _ in pairs} == expected
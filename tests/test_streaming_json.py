@@ -0,0 +1,55 @@
+import json
+
+from aletheia.streaming_json import StreamingJSONFields
+
+RESPONSE = {
+    "title": "On \"duty\", {braces} and [brackets]",
+    "principles": [{"name": "care", "weight": 0.7}, {"name": "justice", "weight": 0.3}],
+    "confidence": 0.82,
+    "summary": "Done."
+}
+
+
+def feed_all(parser, text, chunk_size):
+    completed = []
+    for start in range(0, len(text), chunk_size):
+        completed.extend(parser.feed(text[start:start + chunk_size]))
+    return completed
+
+
+def test_fields_match_json_loads_for_any_chunking():
+    text = json.dumps(RESPONSE)
+    for chunk_size in (1, 2, 3, 7, len(text)):
+        completed = feed_all(StreamingJSONFields(RESPONSE), text, chunk_size)
+        assert dict(completed) == RESPONSE
+        assert [key for key, _ in completed] == list(RESPONSE)
+
+
+def test_field_is_reported_as_soon_as_its_value_closes():
+    parser = StreamingJSONFields(["title", "summary"])
+    assert parser.feed('{"title": "Firs') == []
+    assert parser.feed('t", "summ') == [("title", "First")]
+    assert parser.feed('ary": "Last"}') == [("summary", "Last")]
+
+
+def test_ignores_code_fence_and_unrequested_fields():
+    text = "```json\n" + json.dumps(RESPONSE, indent=2) + "\n```"
+    completed = feed_all(StreamingJSONFields(["confidence"]), text, 5)
+    assert completed == [("confidence", 0.82)]
+
+
+def test_nested_keys_are_not_top_level_fields():
+    parser = StreamingJSONFields(["name"])
+    assert parser.feed('{"outer": {"name": "inner"}, "name": "top"}') == [("name", "top")]
+
+
+def test_escaped_quotes_inside_strings():
+    parser = StreamingJSONFields(["quote"])
+    assert parser.feed(r'{"quote": "she said \"a, b\" then left\\"}') == [("quote", 'she said "a, b" then left\\')]
+
+
+def test_each_field_is_emitted_once_and_text_is_kept():
+    parser = StreamingJSONFields(["a"])
+    text = '{"a": 1, "a": 2}'
+    assert parser.feed(text) == [("a", 1)]
+    assert parser.text == text
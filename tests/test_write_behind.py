@@ -0,0 +1,76 @@
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from aletheia.write_behind import WriteBehindQueue, replay_dead_letters
+
+
+class FailingCollection:
+    """Stands in for a collection whose inserts always fail, e.g. while Mongo is unreachable."""
+    def __init__(self, name):
+        self.name = name
+        self.full_name = f"db.{name}"
+
+    def insert_many(self, docs, ordered=True):
+        raise ConnectionError("server unavailable")
+
+
+@pytest.fixture
+def dead_letter_path(tmp_path):
+    return str(tmp_path / "dead_letter.jsonl")
+
+
+def test_failed_writes_are_dead_lettered_then_replayed(dead_letter_path):
+    writer = WriteBehindQueue(flush_interval=0.01, max_retries=0, dead_letter_path=dead_letter_path)
+    doc_ids = [writer.enqueue(FailingCollection("traces"), {"query": f"q{n}"}) for n in range(3)]
+    assert all(writer.wait_flushed(doc_id) for doc_id in doc_ids)
+    writer.close()
+    assert writer.stats["dead_lettered"] == 3
+
+    db = mongomock.MongoClient().db
+    assert replay_dead_letters(db, dead_letter_path) == 3
+    assert sorted(doc["_id"] for doc in db.traces.find()) == sorted(doc_ids)
+    assert replay_dead_letters(db, dead_letter_path) == 0
+
+
+def test_replay_keeps_documents_that_fail_again(dead_letter_path):
+    writer = WriteBehindQueue(flush_interval=0.01, max_retries=0, dead_letter_path=dead_letter_path)
+    writer.enqueue(FailingCollection("traces"), {"query": "kept"})
+    writer.enqueue(FailingCollection("cache"), {"query": "replayed"})
+    writer.close()
+
+    class StillDown:
+        def insert_one(self, doc):
+            raise ConnectionError("still unavailable")
+
+    db = mongomock.MongoClient().db
+    partly_down = {"traces": StillDown(), "cache": db.cache}
+    assert replay_dead_letters(partly_down, dead_letter_path) == 1
+    assert db.cache.find_one()["query"] == "replayed"
+
+    assert replay_dead_letters(db, dead_letter_path) == 1
+    assert db.traces.find_one()["query"] == "kept"
+
+
+def test_replay_counts_documents_that_already_landed(dead_letter_path):
+    writer = WriteBehindQueue(flush_interval=0.01, max_retries=0, dead_letter_path=dead_letter_path)
+    doc_id = writer.enqueue(FailingCollection("traces"), {"query": "q"})
+    writer.close()
+
+    db = mongomock.MongoClient().db
+    db.traces.insert_one({"_id": doc_id, "query": "q"})
+    assert replay_dead_letters(db, dead_letter_path) == 1
+    assert db.traces.count_documents({}) == 1
+
+
+def test_on_written_runs_only_for_stored_documents(dead_letter_path):
+    db = mongomock.MongoClient().db
+    writer = WriteBehindQueue(flush_interval=0.01, max_retries=0, dead_letter_path=dead_letter_path)
+    called = []
+    stored = writer.enqueue(db.traces, {"query": "stored"}, on_written=lambda: called.append("stored"))
+    lost = writer.enqueue(FailingCollection("lost_traces"), {"query": "lost"}, on_written=lambda: called.append("lost"))
+    assert writer.wait_flushed(stored) and writer.wait_flushed(lost)
+    writer.close()
+
+    assert called == ["stored"]
+    assert db.traces.find_one({"_id": stored}) is not None